@@ -3,6 +3,9 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Servir por ASGI (p. ej. ``uvicorn backend.asgi:application``) es necesario
+para el canal SSE ``/api/gps/posiciones/stream/{ruta_id}/``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
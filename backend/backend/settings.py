@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     "rutas.apps.RutasConfig",
     "gps.apps.GpsConfig",
     "paradas.apps.ParadasConfig",
+    "sincronizacion.apps.SincronizacionConfig",
 ]
 
 MIDDLEWARE = [
@@ -81,6 +82,31 @@ else:
         }
     }
 
+# Caché compartida por todos los workers: los índices en memoria (paradas,
+# rutas, horarios, grafo del planificador) y las capas del mapa se invalidan
+# con versiones guardadas en la caché (ver `rutas.versiones`), y una caché
+# por proceso (LocMem) dejaría a los demás workers con datos viejos. Por
+# defecto, archivos en el mismo directorio de trabajo que los datos GPS (un
+# solo servidor); con varios servidores use p. ej.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache y
+# CACHE_LOCATION=redis://host:6379 (y lo mismo en CACHE_VERSIONES_*).
+# Las versiones van en su propio alias, sin límite práctico de entradas,
+# para que las teselas y demás contenidos no las desalojen.
+CACHE_DIR = Path(os.getenv("CACHE_DIR", BASE_DIR / "var" / "cache"))
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", str(CACHE_DIR / "general")),
+        # Fuera de OPTIONS: los backends de red pasan OPTIONS a su cliente
+        "max_entries": int(os.getenv("CACHE_MAX_ENTRADAS", "5000")),
+    },
+    "versiones": {
+        "BACKEND": os.getenv("CACHE_VERSIONES_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("CACHE_VERSIONES_LOCATION", str(CACHE_DIR / "versiones")),
+        "max_entries": 10 ** 9,
+    },
+}
+
 AUTH_USER_MODEL = "accounts.User"  # usamos AbstractUser extendido
 
 LANGUAGE_CODE = "es-es"
@@ -228,4 +254,70 @@ SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = "DENY"
 
-PASSWORD_RESET_COOKIE_MAX_AGE = int(os.getenv("PASSWORD_RESET_COOKIE_MAX_AGE", "1800"))
\ No newline at end of file
+PASSWORD_RESET_COOKIE_MAX_AGE = int(os.getenv("PASSWORD_RESET_COOKIE_MAX_AGE", "1800"))
+# GPS: ingesta masiva de posiciones
+GPS_LOTE_TAMANO = int(os.getenv("GPS_LOTE_TAMANO", "500"))
+GPS_LOTE_MAX_ITEMS = int(os.getenv("GPS_LOTE_MAX_ITEMS", "5000"))
+
+# GPS: datos de trabajo en disco (última posición, archivo histórico...)
+GPS_DATA_DIR = Path(os.getenv("GPS_DATA_DIR", BASE_DIR / "var" / "gps"))
+GPS_ULTIMAS_BACKEND = os.getenv("GPS_ULTIMAS_BACKEND", "gps.ultimas.ArchivoBackend")
+
+# GPS: retención del histórico (ver `python manage.py archivar_gps`)
+GPS_RETENCION_DIAS = int(os.getenv("GPS_RETENCION_DIAS", "30"))
+GPS_RESUMEN_MINUTOS = int(os.getenv("GPS_RESUMEN_MINUTOS", "5"))
+
+# GPS: difusión en vivo (SSE). GPS_BROKER="gps.broker.PostgresBroker" para varios workers
+GPS_BROKER = os.getenv("GPS_BROKER", "gps.broker.MemoriaBroker")
+GPS_STREAM_COLA_MAXIMA = int(os.getenv("GPS_STREAM_COLA_MAXIMA", "100"))
+GPS_STREAM_LATIDO = int(os.getenv("GPS_STREAM_LATIDO", "15"))
+GPS_STREAM_REINTENTO_MS = int(os.getenv("GPS_STREAM_REINTENTO_MS", "3000"))
+GPS_TRACK_MAX_DIAS = int(os.getenv("GPS_TRACK_MAX_DIAS", "31"))
+GPS_TRACK_CACHE_SEGUNDOS = int(os.getenv("GPS_TRACK_CACHE_SEGUNDOS", str(60 * 60 * 24)))
+GPS_TRACK_CACHE_HOY_SEGUNDOS = int(os.getenv("GPS_TRACK_CACHE_HOY_SEGUNDOS", "60"))
+
+# GPS: detección de desvíos respecto al corredor de paradas de la ruta
+GPS_DESVIO_UMBRAL_M = float(os.getenv("GPS_DESVIO_UMBRAL_M", "150"))
+GPS_DESVIO_TIEMPO_MIN_S = int(os.getenv("GPS_DESVIO_TIEMPO_MIN_S", "60"))
+GPS_CORREDOR_CACHE_SEGUNDOS = int(os.getenv("GPS_CORREDOR_CACHE_SEGUNDOS", "3600"))
+
+# Paradas: geometría de rutas y estimación de llegada (ETA)
+PARADAS_GEOMETRIA_CACHE_SEGUNDOS = int(os.getenv("PARADAS_GEOMETRIA_CACHE_SEGUNDOS", "3600"))
+ETA_SUAVIZADO = float(os.getenv("ETA_SUAVIZADO", "0.3"))
+ETA_VELOCIDAD_MINIMA_KMH = float(os.getenv("ETA_VELOCIDAD_MINIMA_KMH", "8"))
+ETA_MAX_ANTIGUEDAD_S = int(os.getenv("ETA_MAX_ANTIGUEDAD_S", "300"))
+ETA_TOLERANCIA_M = float(os.getenv("ETA_TOLERANCIA_M", "30"))
+SEGMENTOS_MAX_HUECO_S = int(os.getenv("SEGMENTOS_MAX_HUECO_S", "300"))
+SEGMENTOS_RETROCESO_M = float(os.getenv("SEGMENTOS_RETROCESO_M", "200"))
+SEGMENTOS_MIN_MUESTRAS = int(os.getenv("SEGMENTOS_MIN_MUESTRAS", "3"))
+SEGMENTOS_ESPERA_HUECOS_S = int(os.getenv("SEGMENTOS_ESPERA_HUECOS_S", "900"))
+PARADAS_CERCANAS_RADIO_INICIAL_M = float(os.getenv("PARADAS_CERCANAS_RADIO_INICIAL_M", "500"))
+PARADAS_CERCANAS_RADIO_MAX_M = float(os.getenv("PARADAS_CERCANAS_RADIO_MAX_M", "50000"))
+PARADAS_INDICE_EN_MEMORIA = os.getenv("PARADAS_INDICE_EN_MEMORIA", "True") == "True"
+PARADAS_IMPORTACION_MAX_FILAS = int(os.getenv("PARADAS_IMPORTACION_MAX_FILAS", "5000"))
+PARADAS_MAPA_CACHE_SEGUNDOS = int(os.getenv("PARADAS_MAPA_CACHE_SEGUNDOS", "86400"))
+PARADAS_MVT_ZOOM_MAXIMO = int(os.getenv("PARADAS_MVT_ZOOM_MAXIMO", "22"))
+PARADAS_MVT_MARGEN = int(os.getenv("PARADAS_MVT_MARGEN", "64"))
+PLANIFICADOR_VELOCIDAD_BUS_KMH = float(os.getenv("PLANIFICADOR_VELOCIDAD_BUS_KMH", "20"))
+PLANIFICADOR_VELOCIDAD_CAMINATA_KMH = float(os.getenv("PLANIFICADOR_VELOCIDAD_CAMINATA_KMH", "4.5"))
+PLANIFICADOR_CAMINATA_MAX_M = float(os.getenv("PLANIFICADOR_CAMINATA_MAX_M", "500"))
+PLANIFICADOR_PENALIZACION_ABORDAJE_S = float(os.getenv("PLANIFICADOR_PENALIZACION_ABORDAJE_S", "300"))
+PLANIFICADOR_MAX_VECINOS = int(os.getenv("PLANIFICADOR_MAX_VECINOS", "20"))
+PARADAS_OPTIMIZACION_TIEMPO_MAX_S = float(os.getenv("PARADAS_OPTIMIZACION_TIEMPO_MAX_S", "0.8"))
+
+# Rutas: búsqueda por trazado y vista completa (snapshot)
+RUTAS_CERCANAS_RADIO_KM = float(os.getenv("RUTAS_CERCANAS_RADIO_KM", "0.5"))
+RUTAS_CERCANAS_RADIO_MAX_KM = float(os.getenv("RUTAS_CERCANAS_RADIO_MAX_KM", "50"))
+RUTAS_SNAPSHOT_CACHE_SEGUNDOS = int(os.getenv("RUTAS_SNAPSHOT_CACHE_SEGUNDOS", "86400"))
+
+# Rutas: asignación de buses según la demanda de reservas
+RUTAS_ASIGNACION_ESTADOS_BUS = os.getenv("RUTAS_ASIGNACION_ESTADOS_BUS", "activo").split(",")
+RUTAS_ASIGNACION_TIEMPO_MAX_S = float(os.getenv("RUTAS_ASIGNACION_TIEMPO_MAX_S", "2"))
+
+# Rutas: horarios (hora de paso por parada derivada de la secuencia)
+RUTAS_HORARIOS_VELOCIDAD_KMH = float(os.getenv("RUTAS_HORARIOS_VELOCIDAD_KMH", "20"))
+RUTAS_HORARIOS_DETENCION_S = int(os.getenv("RUTAS_HORARIOS_DETENCION_S", "30"))
+
+# Sincronización incremental de clientes móviles
+SYNC_LIMITE = int(os.getenv("SYNC_LIMITE", "1000"))
+SYNC_LIMITE_MAXIMO = int(os.getenv("SYNC_LIMITE_MAXIMO", "5000"))
@@ -22,6 +22,7 @@ urlpatterns = [
     path('api/rutas/', include("rutas.urls")),
     path('api/gps/', include('gps.urls')),
     path("api/paradas/", include("paradas.urls")),
+    path("api/sync/", include("sincronizacion.urls")),
 
     # Documentación OpenAPI
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
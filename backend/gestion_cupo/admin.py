@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ReservaCupo
+from .models import OcupacionRuta, ReservaCupo
 
 
 @admin.register(ReservaCupo)
@@ -8,3 +8,14 @@ class ReservaCupoAdmin(admin.ModelAdmin):
     list_filter = ('estado', 'ruta')
     search_fields = ('usuario__username', 'ruta__nombre_ruta')
     ordering = ('-fecha_reserva',)
+
+
+@admin.register(OcupacionRuta)
+class OcupacionRutaAdmin(admin.ModelAdmin):
+    list_display = ('ruta', 'reservados', 'en_espera', 'cancelados', 'completados', 'actualizado')
+    list_select_related = ('ruta',)
+    search_fields = ('ruta__nombre_ruta',)
+    readonly_fields = ('ruta', 'reservados', 'en_espera', 'cancelados', 'completados', 'actualizado')
+
+    def has_add_permission(self, request):
+        return False
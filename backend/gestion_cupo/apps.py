@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GestionCupoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_cupo'
+
+    def ready(self):
+        import gestion_cupo.signals
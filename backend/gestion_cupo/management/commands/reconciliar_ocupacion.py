@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from gestion_cupo.ocupacion import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los contadores de ocupación de las rutas a partir de las reservas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("rutas", nargs="*", type=int, help="IDs de las rutas (por defecto, todas)")
+
+    def handle(self, *args, **options):
+        corregidas = reconstruir(options["rutas"] or None)
+        self.stdout.write(self.style.SUCCESS(f"Contadores corregidos: {corregidas}"))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+CAMPOS = {"RESERVADO": "reservados", "EN_ESPERA": "en_espera", "CANCELADO": "cancelados", "COMPLETADO": "completados"}
+
+
+def contar_existentes(apps, schema_editor):
+    ReservaCupo = apps.get_model("gestion_cupo", "ReservaCupo")
+    OcupacionRuta = apps.get_model("gestion_cupo", "OcupacionRuta")
+    conteos = {}
+    filas = (
+        ReservaCupo.objects.order_by().values("ruta_id", "estado")
+        .annotate(total=Count("pk")).values_list("ruta_id", "estado", "total")
+    )
+    for ruta_id, estado, total in filas:
+        if estado in CAMPOS:
+            conteos.setdefault(ruta_id, {})[CAMPOS[estado]] = total
+    OcupacionRuta.objects.bulk_create(
+        [OcupacionRuta(ruta_id=ruta_id, **valores) for ruta_id, valores in conteos.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_cupo', '0001_initial'),
+        ('rutas', '0006_ruta_trazado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacionRuta',
+            fields=[
+                ('ruta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ocupacion', serialize=False, to='rutas.ruta')),
+                ('reservados', models.PositiveIntegerField(default=0)),
+                ('en_espera', models.PositiveIntegerField(default=0)),
+                ('cancelados', models.PositiveIntegerField(default=0)),
+                ('completados', models.PositiveIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Ocupación de ruta',
+                'verbose_name_plural': 'Ocupación de rutas',
+            },
+        ),
+        migrations.RunPython(contar_existentes, migrations.RunPython.noop),
+    ]
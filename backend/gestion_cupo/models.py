@@ -50,3 +50,29 @@ class ReservaCupo(models.Model):
                 name='unique_reserva_cupo_por_usuario_y_ruta'
             )
         ]
+
+
+class OcupacionRuta(models.Model):
+    """
+    Conteo de reservas por estado de una ruta. Lo mantienen las señales de
+    ReservaCupo en la misma transacción que el cambio de estado; el comando
+    `reconciliar_ocupacion` lo reconstruye desde las reservas.
+    """
+    ruta = models.OneToOneField(
+        Ruta,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ocupacion'
+    )
+    reservados = models.PositiveIntegerField(default=0)
+    en_espera = models.PositiveIntegerField(default=0)
+    cancelados = models.PositiveIntegerField(default=0)
+    completados = models.PositiveIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.ruta_id}: {self.reservados} reservados, {self.en_espera} en espera"
+
+    class Meta:
+        verbose_name = "Ocupación de ruta"
+        verbose_name_plural = "Ocupación de rutas"
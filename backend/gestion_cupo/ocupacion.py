@@ -0,0 +1,100 @@
+"""Contadores de ocupación por ruta (tabla OcupacionRuta).
+
+Cada cambio de estado de una reserva ajusta los contadores de su ruta con
+un UPDATE condicional de una sola fila (`F()`), en la misma transacción
+que guarda la reserva; así el aforo se decide leyendo esa fila en lugar
+de contar las reservas. Los descuentos exigen `campo > 0` para que una
+escritura masiva que no pase por las señales no deje el contador en
+negativo; `reconstruir` corrige cualquier deriva desde las reservas.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from rutas.models import Ruta
+
+from .models import OcupacionRuta, ReservaCupo
+
+
+RESERVADO = "RESERVADO"
+EN_ESPERA = "EN_ESPERA"
+
+CAMPOS = {
+    "RESERVADO": "reservados",
+    "EN_ESPERA": "en_espera",
+    "CANCELADO": "cancelados",
+    "COMPLETADO": "completados",
+}
+
+
+def ajustar(ruta_id, anterior=None, nuevo=None):
+    """Pasa una reserva del estado `anterior` al `nuevo` (`None`: no contaba / deja de contar)."""
+    if anterior == nuevo:
+        return
+    ahora = timezone.now()
+    if anterior in CAMPOS:
+        campo = CAMPOS[anterior]
+        OcupacionRuta.objects.filter(ruta_id=ruta_id, **{f"{campo}__gt": 0}).update(
+            **{campo: F(campo) - 1, "actualizado": ahora}
+        )
+    if nuevo in CAMPOS:
+        campo = CAMPOS[nuevo]
+        actualizadas = OcupacionRuta.objects.filter(ruta_id=ruta_id).update(
+            **{campo: F(campo) + 1, "actualizado": ahora}
+        )
+        if not actualizadas:
+            # Primera reserva de la ruta: la fila nace con el conteo real
+            reconstruir([ruta_id])
+
+
+def estado_inicial(ruta, estado=RESERVADO):
+    """
+    `(estado, posicion_espera)` con el que entra una reserva nueva en la ruta:
+    si la ruta ya llenó su capacidad activa, pasa a lista de espera.
+
+    Debe llamarse dentro de una transacción: bloquea la fila de contadores
+    de la ruta hasta que termine, para que dos reservas simultáneas no se
+    queden con el mismo cupo ni con la misma posición. La posición sigue a
+    la última asignada en la ruta y no al contador `en_espera`, que baja
+    cuando alguien sale de la lista sin renumerar a los demás.
+    """
+    ocupacion, _ = OcupacionRuta.objects.select_for_update().get_or_create(ruta=ruta)
+    if estado == RESERVADO and ruta.capacidad_activa and ocupacion.reservados >= ruta.capacidad_activa:
+        estado = EN_ESPERA
+    if estado != EN_ESPERA:
+        return estado, None
+    ultima = ReservaCupo.objects.filter(ruta=ruta, estado=EN_ESPERA).aggregate(ultima=Max("posicion_espera"))["ultima"]
+    return estado, (ultima or 0) + 1
+
+
+def reconstruir(ruta_ids=None):
+    """Recalcula los contadores desde las reservas; devuelve cuántas filas cambiaron."""
+    with transaction.atomic():
+        rutas = Ruta.objects.all() if ruta_ids is None else Ruta.objects.filter(pk__in=ruta_ids)
+        existentes = {
+            ocupacion.ruta_id: ocupacion
+            for ocupacion in OcupacionRuta.objects.select_for_update().filter(ruta__in=rutas)
+        }
+        conteos = {pk: dict.fromkeys(CAMPOS.values(), 0) for pk in rutas.values_list("pk", flat=True)}
+        filas = (
+            ReservaCupo.objects.filter(ruta__in=rutas).order_by().values("ruta_id", "estado")
+            .annotate(total=Count("pk")).values_list("ruta_id", "estado", "total")
+        )
+        for ruta_id, estado, total in filas:
+            if estado in CAMPOS:
+                conteos[ruta_id][CAMPOS[estado]] = total
+
+        ahora = timezone.now()
+        nuevas, cambiadas = [], []
+        for ruta_id, valores in conteos.items():
+            ocupacion = existentes.get(ruta_id)
+            if ocupacion is None:
+                nuevas.append(OcupacionRuta(ruta_id=ruta_id, actualizado=ahora, **valores))
+            elif any(getattr(ocupacion, campo) != valor for campo, valor in valores.items()):
+                for campo, valor in valores.items():
+                    setattr(ocupacion, campo, valor)
+                ocupacion.actualizado = ahora
+                cambiadas.append(ocupacion)
+        OcupacionRuta.objects.bulk_create(nuevas)
+        OcupacionRuta.objects.bulk_update(cambiadas, [*CAMPOS.values(), "actualizado"])
+    return len(nuevas) + len(cambiadas)
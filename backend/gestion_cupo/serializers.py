@@ -1,11 +1,14 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import ReservaCupo
+
+from .models import OcupacionRuta, ReservaCupo
+from .ocupacion import estado_inicial
 
 
 class ReservaCupoSerializer(serializers.ModelSerializer):
     """
     Serializador para el modelo ReservaCupo con validación automática
-    de capacidad. Si se supera la capacidad del bus o ruta, el estado
+    de capacidad. Si se supera la capacidad activa de la ruta, el estado
     pasa a 'EN_ESPERA'.
     """
 
@@ -14,16 +17,28 @@ class ReservaCupoSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def create(self, validated_data):
-        ruta = validated_data.get('ruta')
-        estado = validated_data.get('estado', 'ACTIVA')
+        # La capacidad se decide con la fila de contadores de la ruta,
+        # bloqueada hasta que la reserva queda guardada
+        with transaction.atomic():
+            estado, posicion = estado_inicial(validated_data['ruta'], validated_data.get('estado', 'RESERVADO'))
+            validated_data['estado'] = estado
+            if posicion is not None:
+                validated_data['posicion_espera'] = posicion
+            return super().create(validated_data)
 
-        # Contar cuántas reservas activas existen actualmente
-        reservas_activas = ReservaCupo.objects.filter(ruta=ruta, estado='ACTIVA').count()
 
-        if ruta and ruta.capacidad_activa and reservas_activas >= ruta.capacidad_activa:
-            # Si la capacidad se supera, poner en lista de espera
-            validated_data['estado'] = 'EN_ESPERA'
-        else:
-            validated_data['estado'] = estado
+class OcupacionRutaSerializer(serializers.ModelSerializer):
+    capacidad_activa = serializers.IntegerField(source='ruta.capacidad_activa', read_only=True)
+    disponibles = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OcupacionRuta
+        fields = [
+            'ruta', 'capacidad_activa', 'reservados', 'en_espera',
+            'cancelados', 'completados', 'disponibles', 'actualizado',
+        ]
 
-        return super().create(validated_data)
+    def get_disponibles(self, obj):
+        if not obj.ruta.capacidad_activa:
+            return None
+        return max(obj.ruta.capacidad_activa - obj.reservados, 0)
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import ReservaCupo
+from .ocupacion import ajustar
+
+
+@receiver(pre_save, sender=ReservaCupo)
+def recordar_estado_anterior(sender, instance, raw=False, **kwargs):
+    """Ruta y estado con que la reserva está guardada, para mover sus contadores."""
+    instance._ocupacion_anterior = None
+    if not raw and not instance._state.adding:
+        instance._ocupacion_anterior = (
+            ReservaCupo.objects.filter(pk=instance.pk).values_list("ruta_id", "estado").first()
+        )
+
+
+@receiver(post_save, sender=ReservaCupo)
+def actualizar_ocupacion(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, "_ocupacion_anterior", None)
+    if anterior is None:
+        ajustar(instance.ruta_id, None, instance.estado)
+    elif anterior[0] == instance.ruta_id:
+        ajustar(instance.ruta_id, anterior[1], instance.estado)
+    else:
+        ajustar(anterior[0], anterior[1], None)
+        ajustar(instance.ruta_id, None, instance.estado)
+    instance._ocupacion_anterior = (instance.ruta_id, instance.estado)
+
+
+@receiver(post_delete, sender=ReservaCupo)
+def descontar_ocupacion(sender, instance, **kwargs):
+    ajustar(instance.ruta_id, instance.estado, None)
@@ -1,3 +1,108 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from rutas.models import Ruta
+
+from .models import OcupacionRuta, ReservaCupo
+
+
+User = get_user_model()
+
+# Caché en memoria para las pruebas: `cache.clear()` no debe tocar la caché en disco
+CACHES_PRUEBA = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas"},
+    "versiones": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas-versiones"},
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class OcupacionRutaTests(APITestCase):
+    def setUp(self):
+        self.ruta = Ruta.objects.create(nombre_ruta="Centro", capacidad_activa=2)
+        self.usuarios = [
+            User.objects.create(username=f"u{i}", email=f"u{i}@example.com") for i in range(4)
+        ]
+        self.client.force_authenticate(self.usuarios[0])
+
+    def contadores(self, ruta=None):
+        ocupacion = OcupacionRuta.objects.get(ruta=ruta or self.ruta)
+        return ocupacion.reservados, ocupacion.en_espera, ocupacion.cancelados, ocupacion.completados
+
+    def reservar(self, usuario):
+        respuesta = self.client.post(
+            "/api/gestion-cupo/", {"usuario": usuario.pk, "ruta": self.ruta.pk}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        return respuesta.data
+
+    def test_reservas_pasan_a_espera_al_llenar_la_ruta(self):
+        estados = [self.reservar(usuario) for usuario in self.usuarios]
+        self.assertEqual([r["estado"] for r in estados], ["RESERVADO", "RESERVADO", "EN_ESPERA", "EN_ESPERA"])
+        self.assertEqual([r["posicion_espera"] for r in estados[2:]], [1, 2])
+        self.assertEqual(self.contadores(), (2, 2, 0, 0))
+
+    def test_posicion_no_se_repite_si_sale_alguien_de_la_espera(self):
+        estados = [self.reservar(usuario) for usuario in self.usuarios]
+        self.client.delete(f"/api/gestion-cupo/{estados[2]['id']}/")
+        otro = User.objects.create(username="u4", email="u4@example.com")
+        self.assertEqual(self.reservar(otro)["posicion_espera"], 3)
+
+    def test_cambios_de_estado_y_borrado_mueven_contadores(self):
+        reservas = [self.reservar(usuario) for usuario in self.usuarios[:3]]
+        respuesta = self.client.patch(f"/api/gestion-cupo/{reservas[0]['id']}/", {"estado": "CANCELADO"}, format="json")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.contadores(), (1, 1, 1, 0))
+
+        reserva = ReservaCupo.objects.get(pk=reservas[1]["id"])
+        reserva.estado = "COMPLETADO"
+        reserva.save()
+        self.assertEqual(self.contadores(), (0, 1, 1, 1))
+
+        self.client.delete(f"/api/gestion-cupo/{reservas[2]['id']}/")
+        self.assertEqual(self.contadores(), (0, 0, 1, 1))
+
+    def test_cambio_de_ruta(self):
+        otra = Ruta.objects.create(nombre_ruta="Norte")
+        reserva = ReservaCupo.objects.create(usuario=self.usuarios[0], ruta=self.ruta)
+        reserva.ruta = otra
+        reserva.save()
+        self.assertEqual(self.contadores(), (0, 0, 0, 0))
+        self.assertEqual(self.contadores(otra), (1, 0, 0, 0))
+
+    def test_capacidad_se_decide_sin_contar_reservas(self):
+        self.reservar(self.usuarios[0])
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.reservar(self.usuarios[1])["estado"], "RESERVADO")
+        self.assertFalse([c["sql"] for c in consultas if "COUNT(" in c["sql"].upper()])
+        self.assertEqual(self.reservar(self.usuarios[2])["estado"], "EN_ESPERA")
+
+    def test_reconciliar_corrige_deriva(self):
+        for usuario in self.usuarios[:3]:
+            self.reservar(usuario)
+        # Las escrituras masivas no pasan por las señales
+        ReservaCupo.objects.filter(estado="EN_ESPERA").update(estado="CANCELADO")
+        OcupacionRuta.objects.filter(ruta=self.ruta).update(reservados=7)
+        sin_fila = Ruta.objects.create(nombre_ruta="Sur")
+        salida = StringIO()
+        call_command("reconciliar_ocupacion", stdout=salida)
+        self.assertIn("Contadores corregidos: 2", salida.getvalue())
+        self.assertEqual(self.contadores(), (2, 0, 1, 0))
+        self.assertEqual(self.contadores(sin_fila), (0, 0, 0, 0))
+
+    def test_endpoint_de_ocupacion(self):
+        self.reservar(self.usuarios[0])
+        respuesta = self.client.get(f"/api/gestion-cupo/ocupacion/{self.ruta.pk}/")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data["reservados"], 1)
+        self.assertEqual(respuesta.data["disponibles"], 1)
+
+        vacia = Ruta.objects.create(nombre_ruta="Vacía")
+        respuesta = self.client.get(f"/api/gestion-cupo/ocupacion/{vacia.pk}/")
+        self.assertEqual((respuesta.data["reservados"], respuesta.data["disponibles"]), (0, None))
+        self.assertEqual(self.client.get("/api/gestion-cupo/ocupacion/999999/").status_code, 404)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import ReservaCupoListCreateView, ReservaCupoDetailView
+from .views import OcupacionRutaView, ReservaCupoListCreateView, ReservaCupoDetailView
 
 urlpatterns = [
     # Listar todas las reservas o crear una nueva
@@ -7,4 +7,7 @@ urlpatterns = [
 
     # Obtener, actualizar o eliminar una reserva específica por su UUID
     path('<uuid:pk>/', ReservaCupoDetailView.as_view(), name='reserva-detail'),
+
+    # Contadores de ocupación de una ruta
+    path('ocupacion/<int:ruta_id>/', OcupacionRutaView.as_view(), name='ocupacion-ruta'),
 ]
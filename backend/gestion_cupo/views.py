@@ -1,25 +1,41 @@
+from django.db import transaction
 from rest_framework import generics
-from .models import ReservaCupo
-from .serializers import ReservaCupoSerializer
-from rest_framework.response import Response
-from rest_framework import status
+from rest_framework.generics import get_object_or_404
+
+from rutas.models import Ruta
+
+from .models import OcupacionRuta, ReservaCupo
+from .serializers import OcupacionRutaSerializer, ReservaCupoSerializer
+
 
 class ReservaCupoListCreateView(generics.ListCreateAPIView):
+    # El serializador decide RESERVADO / EN_ESPERA con los contadores de la ruta
     queryset = ReservaCupo.objects.all()
     serializer_class = ReservaCupoSerializer
 
-    def perform_create(self, serializer):
-        # Lógica: si el bus está lleno, asignar estado "EN_ESPERA"
-        bus = serializer.validated_data.get('bus')
-        reservas_activas = ReservaCupo.objects.filter(bus=bus, estado='RESERVADO').count()
-        capacidad = bus.capacidad  # Asegúrate que el modelo Bus tenga el campo "capacidad"
-
-        if reservas_activas >= capacidad:
-            serializer.save(estado='EN_ESPERA')
-        else:
-            serializer.save(estado='RESERVADO')
-
 
 class ReservaCupoDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = ReservaCupo.objects.all()
     serializer_class = ReservaCupoSerializer
+
+    # Los contadores de ocupación se ajustan en la misma transacción que la reserva
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+
+
+class OcupacionRutaView(generics.RetrieveAPIView):
+    """GET /api/gestion-cupo/ocupacion/{ruta_id}/ - Contadores de reservas de la ruta."""
+    serializer_class = OcupacionRutaSerializer
+
+    def get_object(self):
+        ruta = get_object_or_404(Ruta, pk=self.kwargs['ruta_id'])
+        try:
+            return ruta.ocupacion
+        except OcupacionRuta.DoesNotExist:
+            # Ruta sin reservas todavía
+            return OcupacionRuta(ruta=ruta)
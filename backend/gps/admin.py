@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import GPSPosicion, EventoDesvio
+from .models import GPSPosicion, EventoDesvio, GPSPosicionResumen
 
 
 @admin.register(GPSPosicion)
@@ -16,3 +16,10 @@ class EventoDesvioAdmin(admin.ModelAdmin):
 	list_filter = ("tipo_desvio", "estado", "ruta")
 	search_fields = ("descripcion",)
 
+
+
+@admin.register(GPSPosicionResumen)
+class GPSPosicionResumenAdmin(admin.ModelAdmin):
+	list_display = ("id", "ruta", "usuario", "inicio", "minutos", "muestras", "velocidad_media")
+	list_filter = ("ruta",)
+	search_fields = ("usuario__username",)
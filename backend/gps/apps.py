@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GpsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gps'
+
+    def ready(self):
+        import gps.signals
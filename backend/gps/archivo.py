@@ -0,0 +1,102 @@
+"""Archivo comprimido de posiciones GPS por ruta y día.
+
+Cada archivo `GPS_DATA_DIR/archivo/<ruta>/<AAAA-MM-DD>.gpz` guarda las
+posiciones de un día en columnas (id, marca temporal en ms, usuario,
+latitud y longitud en micro-grados, velocidad en centésimas de km/h),
+codificadas como deltas varint y comprimidas con zlib.
+"""
+import os
+import tempfile
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+
+from .codificacion import codificar_deltas, decodificar_deltas, escribir_varint, leer_varint
+
+
+MAGIA = b"GPZ1"
+SIN_RUTA = "sin_ruta"
+
+Fila = namedtuple("Fila", "id fecha_hora usuario latitud longitud velocidad")
+
+
+def directorio_ruta(ruta_id):
+	return Path(settings.GPS_DATA_DIR) / "archivo" / (str(ruta_id) if ruta_id is not None else SIN_RUTA)
+
+
+def ruta_archivo(ruta_id, dia):
+	return directorio_ruta(ruta_id) / f"{dia.isoformat()}.gpz"
+
+
+def dia_de(fecha_hora):
+	"""Día (UTC) al que pertenece una marca temporal."""
+	return fecha_hora.astimezone(dt_timezone.utc).date()
+
+
+def codificar(filas):
+	filas = sorted(filas, key=lambda f: (f.fecha_hora, f.id))
+	buf = bytearray(MAGIA)
+	escribir_varint(buf, len(filas))
+	codificar_deltas(buf, [f.id for f in filas])
+	codificar_deltas(buf, [round(f.fecha_hora.timestamp() * 1000) for f in filas])
+	codificar_deltas(buf, [(f.usuario or 0) for f in filas])
+	codificar_deltas(buf, [round(f.latitud * 1e6) for f in filas])
+	codificar_deltas(buf, [round(f.longitud * 1e6) for f in filas])
+	# La velocidad nula se guarda como 0 y las demás desplazadas en +1
+	codificar_deltas(buf, [0 if f.velocidad is None else round(f.velocidad * 100) + 1 for f in filas])
+	return zlib.compress(bytes(buf), 9)
+
+
+def decodificar(contenido):
+	data = zlib.decompress(contenido)
+	if data[:4] != MAGIA:
+		raise ValueError("Archivo GPS con formato desconocido.")
+	cantidad, pos = leer_varint(data, 4)
+	ids, pos = decodificar_deltas(data, pos, cantidad)
+	marcas, pos = decodificar_deltas(data, pos, cantidad)
+	usuarios, pos = decodificar_deltas(data, pos, cantidad)
+	latitudes, pos = decodificar_deltas(data, pos, cantidad)
+	longitudes, pos = decodificar_deltas(data, pos, cantidad)
+	velocidades, pos = decodificar_deltas(data, pos, cantidad)
+	return [
+		Fila(
+			id=ids[i],
+			fecha_hora=datetime.fromtimestamp(marcas[i] / 1000, tz=dt_timezone.utc),
+			usuario=usuarios[i] or None,
+			latitud=latitudes[i] / 1e6,
+			longitud=longitudes[i] / 1e6,
+			velocidad=(velocidades[i] - 1) / 100 if velocidades[i] else None,
+		)
+		for i in range(cantidad)
+	]
+
+
+def existe_dia(ruta_id, dia):
+	return ruta_archivo(ruta_id, dia).exists()
+
+
+def leer_dia(ruta_id, dia):
+	"""Filas archivadas de una ruta en un día, ordenadas por fecha; [] si no hay archivo."""
+	try:
+		with open(ruta_archivo(ruta_id, dia), "rb") as f:
+			return decodificar(f.read())
+	except FileNotFoundError:
+		return []
+
+
+def escribir_dia(ruta_id, dia, filas):
+	"""Añade `filas` al archivo del día, fusionando (por id) con lo ya archivado."""
+	combinadas = {f.id: f for f in leer_dia(ruta_id, dia)}
+	combinadas.update((f.id, f) for f in filas)
+	destino = ruta_archivo(ruta_id, dia)
+	destino.parent.mkdir(parents=True, exist_ok=True)
+	fd, temporal = tempfile.mkstemp(dir=destino.parent, suffix=".tmp")
+	with os.fdopen(fd, "wb") as f:
+		f.write(codificar(combinadas.values()))
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(temporal, destino)
+	return len(combinadas)
@@ -0,0 +1,186 @@
+"""Difusión en vivo de posiciones GPS a suscriptores por ruta.
+
+Cada proceso mantiene un `Difusor` que entrega mensajes a colas asyncio
+(una por suscriptor, sin hilos por conexión). El broker configurado en
+`GPS_BROKER` decide cómo llegan los mensajes a los difusores:
+
+- `MemoriaBroker`: solo dentro del proceso actual.
+- `PostgresBroker`: usa LISTEN/NOTIFY de PostgreSQL para que una posición
+  ingerida en un worker llegue a los suscriptores de todos los workers.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .ultimas import registro_desde_posicion
+
+
+logger = logging.getLogger(__name__)
+
+CANAL_POSTGRES = "gps_posiciones"
+POSICIONES_POR_NOTIFY = 20
+
+
+class Suscripcion:
+	"""Cola de mensajes de un cliente suscrito a una ruta."""
+
+	def __init__(self, difusor, ruta_id, loop, maximo):
+		self.difusor = difusor
+		self.ruta_id = ruta_id
+		self.loop = loop
+		self.cola = asyncio.Queue(maxsize=maximo)
+
+	def _encolar(self, mensaje):
+		# Un cliente lento pierde los mensajes más antiguos, nunca bloquea al resto
+		if self.cola.full():
+			self.cola.get_nowait()
+		self.cola.put_nowait(mensaje)
+
+	async def siguiente(self):
+		return await self.cola.get()
+
+	def cerrar(self):
+		self.difusor.retirar(self)
+
+
+class Difusor:
+	"""Registro de suscripciones del proceso y entrega de mensajes."""
+
+	def __init__(self):
+		self._suscripciones = defaultdict(set)
+		self._lock = threading.Lock()
+
+	def agregar(self, ruta_id, maximo):
+		suscripcion = Suscripcion(self, ruta_id, asyncio.get_running_loop(), maximo)
+		with self._lock:
+			self._suscripciones[ruta_id].add(suscripcion)
+		return suscripcion
+
+	def retirar(self, suscripcion):
+		with self._lock:
+			de_ruta = self._suscripciones.get(suscripcion.ruta_id)
+			if de_ruta is not None:
+				de_ruta.discard(suscripcion)
+				if not de_ruta:
+					del self._suscripciones[suscripcion.ruta_id]
+
+	def cantidad(self, ruta_id=None):
+		if ruta_id is not None:
+			return len(self._suscripciones.get(ruta_id, ()))
+		return sum(len(s) for s in self._suscripciones.values())
+
+	def entregar(self, ruta_id, mensaje):
+		"""Entrega `mensaje` a los suscriptores de la ruta. Seguro desde cualquier hilo."""
+		with self._lock:
+			destinatarios = list(self._suscripciones.get(ruta_id, ()))
+		for suscripcion in destinatarios:
+			try:
+				suscripcion.loop.call_soon_threadsafe(suscripcion._encolar, mensaje)
+			except RuntimeError:
+				# El loop del cliente ya se cerró
+				self.retirar(suscripcion)
+
+
+class BaseBroker:
+	def __init__(self):
+		self.difusor = Difusor()
+
+	def publicar(self, ruta_id, registros):
+		"""Publica una lista de registros de posición de una ruta."""
+		raise NotImplementedError
+
+	def suscribir(self, ruta_id):
+		"""Crea una suscripción en el loop asyncio actual."""
+		return self.difusor.agregar(ruta_id, settings.GPS_STREAM_COLA_MAXIMA)
+
+
+class MemoriaBroker(BaseBroker):
+	def publicar(self, ruta_id, registros):
+		for registro in registros:
+			self.difusor.entregar(ruta_id, registro)
+
+
+class PostgresBroker(BaseBroker):
+	"""Broker entre procesos basado en `pg_notify`.
+
+	La publicación se hace en la conexión de Django, por lo que el aviso
+	sale al confirmar la transacción. Cada proceso abre una única conexión
+	adicional en modo LISTEN, en un hilo que se inicia con la primera
+	suscripción.
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self._escucha = None
+		self._lock = threading.Lock()
+
+	def publicar(self, ruta_id, registros):
+		with connection.cursor() as cursor:
+			for i in range(0, len(registros), POSICIONES_POR_NOTIFY):
+				payload = json.dumps({"ruta": ruta_id, "posiciones": registros[i:i + POSICIONES_POR_NOTIFY]})
+				cursor.execute("SELECT pg_notify(%s, %s)", [CANAL_POSTGRES, payload])
+
+	def suscribir(self, ruta_id):
+		with self._lock:
+			if self._escucha is None or not self._escucha.is_alive():
+				self._escucha = threading.Thread(target=self._escuchar, name="gps-broker", daemon=True)
+				self._escucha.start()
+		return super().suscribir(ruta_id)
+
+	def _escuchar(self):
+		import psycopg2
+
+		conexion = psycopg2.connect(**connection.get_connection_params())
+		conexion.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+		with conexion.cursor() as cursor:
+			cursor.execute(f"LISTEN {CANAL_POSTGRES}")
+		try:
+			while True:
+				if select.select([conexion], [], [], 30) == ([], [], []):
+					continue
+				conexion.poll()
+				while conexion.notifies:
+					aviso = conexion.notifies.pop(0)
+					try:
+						datos = json.loads(aviso.payload)
+					except ValueError:
+						logger.warning("Aviso GPS inválido: %r", aviso.payload)
+						continue
+					for registro in datos["posiciones"]:
+						self.difusor.entregar(datos["ruta"], registro)
+		finally:
+			conexion.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def obtener_broker():
+	"""Broker único del proceso, según `GPS_BROKER`."""
+	global _broker
+	with _broker_lock:
+		if _broker is None:
+			_broker = import_string(settings.GPS_BROKER)()
+		return _broker
+
+
+def publicar_posiciones(posiciones):
+	"""Agrupa `posiciones` por ruta y las publica en el broker."""
+	por_ruta = defaultdict(list)
+	for posicion in posiciones:
+		if posicion.ruta_id is not None:
+			por_ruta[posicion.ruta_id].append(registro_desde_posicion(posicion))
+	if not por_ruta:
+		return
+	broker = obtener_broker()
+	for ruta_id, registros in por_ruta.items():
+		registros.sort(key=lambda r: r["ts"])
+		broker.publicar(ruta_id, registros)
@@ -0,0 +1,108 @@
+"""Codificación compacta de series numéricas (varints zigzag con deltas)."""
+
+
+def zigzag(n):
+	return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def deszigzag(n):
+	return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def escribir_varint(buf, n):
+	"""Añade a `buf` (bytearray) el entero no negativo `n` como varint LEB128."""
+	while n >= 0x80:
+		buf.append((n & 0x7F) | 0x80)
+		n >>= 7
+	buf.append(n)
+
+
+def leer_varint(data, pos):
+	"""Lee un varint de `data` desde `pos`. Retorna `(valor, nueva_pos)`."""
+	resultado = 0
+	desplazamiento = 0
+	while True:
+		byte = data[pos]
+		pos += 1
+		resultado |= (byte & 0x7F) << desplazamiento
+		if not byte & 0x80:
+			return resultado, pos
+		desplazamiento += 7
+
+
+def codificar_deltas(buf, valores):
+	"""Escribe la serie de enteros `valores` como diferencias sucesivas zigzag."""
+	anterior = 0
+	for valor in valores:
+		escribir_varint(buf, zigzag(valor - anterior))
+		anterior = valor
+
+
+def decodificar_deltas(data, pos, cantidad):
+	"""Inverso de `codificar_deltas`. Retorna `(valores, nueva_pos)`."""
+	valores = []
+	actual = 0
+	for _ in range(cantidad):
+		delta, pos = leer_varint(data, pos)
+		actual += deszigzag(delta)
+		valores.append(actual)
+	return valores, pos
+
+
+def _polyline_valor(delta):
+	valor = ~(delta << 1) if delta < 0 else delta << 1
+	caracteres = []
+	while valor >= 0x20:
+		caracteres.append(chr((0x20 | (valor & 0x1F)) + 63))
+		valor >>= 5
+	caracteres.append(chr(valor + 63))
+	return "".join(caracteres)
+
+
+class CodificadorPolyline:
+	"""Codificador incremental del formato "encoded polyline" de Google.
+
+	`agregar` recibe los valores de un punto (p. ej. lat, lng) y devuelve el
+	fragmento de texto correspondiente, de modo que una polilínea larga
+	puede generarse sin tener todos los puntos en memoria.
+	"""
+
+	def __init__(self, dimensiones=2, precision=5):
+		self.factor = 10 ** precision
+		self.anteriores = [0] * dimensiones
+
+	def agregar(self, *valores):
+		fragmentos = []
+		for i, valor in enumerate(valores):
+			entero = round(valor * self.factor)
+			fragmentos.append(_polyline_valor(entero - self.anteriores[i]))
+			self.anteriores[i] = entero
+		return "".join(fragmentos)
+
+
+def codificar_polyline(puntos, precision=5):
+	"""Codifica una secuencia de tuplas (lat, lng) como polilínea de Google."""
+	codificador = CodificadorPolyline(precision=precision)
+	return "".join(codificador.agregar(*punto) for punto in puntos)
+
+
+def decodificar_polyline(texto, dimensiones=2, precision=5):
+	"""Inverso de `codificar_polyline`. Retorna una lista de tuplas."""
+	factor = 10 ** precision
+	puntos = []
+	actuales = [0] * dimensiones
+	pos = 0
+	while pos < len(texto):
+		for i in range(dimensiones):
+			resultado = 0
+			desplazamiento = 0
+			while True:
+				byte = ord(texto[pos]) - 63
+				pos += 1
+				resultado |= (byte & 0x1F) << desplazamiento
+				desplazamiento += 5
+				if byte < 0x20:
+					break
+			actuales[i] += ~(resultado >> 1) if resultado & 1 else resultado >> 1
+		puntos.append(tuple(v / factor for v in actuales))
+	return puntos
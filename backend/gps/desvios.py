@@ -0,0 +1,148 @@
+"""Detección automática de desvíos de ruta.
+
+Cada lote ingerido se compara con el corredor de su ruta: la polilínea de
+las paradas activas ordenadas por `orden`. Si un bus permanece a más de
+`GPS_DESVIO_UMBRAL_M` metros durante al menos `GPS_DESVIO_TIEMPO_MIN_S`
+segundos se abre un `EventoDesvio`; se cierra cuando vuelve al corredor.
+
+El estado intermedio (desde cuándo está fuera, evento abierto) se guarda
+por (ruta, usuario) en el almacén de `gps.ultimas`, compartido entre
+procesos. Cada lote lee, actualiza y guarda ese estado con el bloqueo de
+la clave tomado, para que dos lotes simultáneos del mismo bus no abran
+dos eventos.
+
+Los lotes pueden llegar desordenados. Las posiciones anteriores al último
+dato del estado se combinan por marca temporal en lugar de descartar el
+lote: fuera del corredor adelantan `fuera_desde` (y pueden abrir el evento
+si el tramo ya supera el mínimo); dentro del corredor no cierran un desvío
+que datos más nuevos siguen viendo.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from paradas.models import Parada
+
+from . import ultimas
+from .models import EventoDesvio
+from .simplificacion import escalas
+
+
+TIPO_FUERA_CORREDOR = "fuera_de_corredor"
+ESTADO_ABIERTO = "abierto"
+ESTADO_CERRADO = "cerrado"
+
+
+def clave_corredor(ruta_id):
+	return f"gps:corredor:{ruta_id}"
+
+
+class Corredor:
+	"""Segmentos de la ruta proyectados a metros alrededor de su latitud media."""
+
+	def __init__(self, puntos):
+		self.lat0 = sum(lat for lat, _ in puntos) / len(puntos)
+		self.escala_x, self.escala_y = escalas(self.lat0)
+		xs = [lng * self.escala_x for _, lng in puntos]
+		ys = [lat * self.escala_y for lat, _ in puntos]
+		self.segmentos = []
+		for i in range(len(puntos) - 1):
+			dx, dy = xs[i + 1] - xs[i], ys[i + 1] - ys[i]
+			self.segmentos.append((xs[i], ys[i], dx, dy, dx * dx + dy * dy))
+
+	def distancias(self, latitudes, longitudes):
+		"""Distancia mínima (m) de cada punto a la polilínea."""
+		resultado = []
+		for lat, lng in zip(latitudes, longitudes):
+			px, py = lng * self.escala_x, lat * self.escala_y
+			minima = float("inf")
+			for ax, ay, dx, dy, largo2 in self.segmentos:
+				rx, ry = px - ax, py - ay
+				t = 0.0 if largo2 == 0 else max(0.0, min(1.0, (rx * dx + ry * dy) / largo2))
+				ex, ey = rx - t * dx, ry - t * dy
+				d2 = ex * ex + ey * ey
+				if d2 < minima:
+					minima = d2
+			resultado.append(minima ** 0.5)
+		return resultado
+
+
+def obtener_corredor(ruta_id):
+	"""Corredor cacheado de la ruta, o None si tiene menos de dos paradas activas."""
+	clave = clave_corredor(ruta_id)
+	corredor = cache.get(clave)
+	if corredor is None:
+		puntos = [
+			(float(lat), float(lng))
+			for lat, lng in Parada.objects.filter(ruta_id=ruta_id, activa=True)
+			.order_by("orden", "id").values_list("coordenada_lat", "coordenada_lng")
+		]
+		corredor = Corredor(puntos) if len(puntos) >= 2 else False
+		cache.set(clave, corredor, settings.GPS_CORREDOR_CACHE_SEGUNDOS)
+	return corredor or None
+
+
+def invalidar_corredor(ruta_id):
+	cache.delete(clave_corredor(ruta_id))
+
+
+def detectar(posiciones):
+	"""Actualiza el estado de desvío con un lote de posiciones recién guardadas."""
+	grupos = defaultdict(list)
+	for posicion in posiciones:
+		if posicion.ruta_id is not None:
+			grupos[(posicion.ruta_id, posicion.usuario_id)].append(posicion)
+	if not grupos:
+		return
+
+	umbral = settings.GPS_DESVIO_UMBRAL_M
+	tiempo_minimo = settings.GPS_DESVIO_TIEMPO_MIN_S
+	estados = ultimas.obtener_backend("desvios")
+	for (ruta_id, usuario_id), grupo in grupos.items():
+		corredor = obtener_corredor(ruta_id)
+		if corredor is None:
+			continue
+		grupo.sort(key=lambda p: p.fecha_hora)
+		distancias = corredor.distancias(
+			[float(p.latitud) for p in grupo], [float(p.longitud) for p in grupo]
+		)
+		with estados.bloqueo(ruta_id, usuario_id):
+			estado = estados.obtener(ruta_id, usuario_id) or {"ts": None, "fuera_desde": None, "evento": None}
+			ultimo = estado["ts"]
+			for posicion, distancia in zip(grupo, distancias):
+				ts = posicion.fecha_hora.timestamp()
+				tardia = ultimo is not None and ts <= ultimo
+				if distancia > umbral:
+					if estado["fuera_desde"] is None:
+						if tardia:
+							# Fuera antes del último dato, que estaba dentro: no hay desvío vigente
+							continue
+						estado["fuera_desde"] = ts
+					elif ts < estado["fuera_desde"]:
+						# Dato tardío que adelanta el inicio del tramo fuera del corredor
+						estado["fuera_desde"] = ts
+					fin = max(ts, ultimo) if tardia else ts
+					if estado["evento"] is None and fin - estado["fuera_desde"] >= tiempo_minimo:
+						evento = EventoDesvio.objects.create(
+							posicion=posicion,
+							ruta_id=ruta_id,
+							fecha_hora=posicion.fecha_hora,
+							tipo_desvio=TIPO_FUERA_CORREDOR,
+							estado=ESTADO_ABIERTO,
+							descripcion=f"Bus a {distancia:.0f} m del corredor de la ruta (umbral {umbral:g} m).",
+						)
+						estado["evento"] = evento.id
+				elif not tardia:
+					if estado["evento"] is not None:
+						EventoDesvio.objects.filter(pk=estado["evento"]).update(estado=ESTADO_CERRADO)
+					estado["fuera_desde"] = None
+					estado["evento"] = None
+			# El estado leído con el bloqueo ya incluye el guardado: se conserva la marca más reciente
+			estados.guardar({
+				"ruta": ruta_id,
+				"usuario": usuario_id,
+				"ts": max(grupo[-1].fecha_hora.timestamp(), ultimo or 0),
+				"fuera_desde": estado["fuera_desde"],
+				"evento": estado["evento"],
+			})
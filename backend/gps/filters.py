@@ -0,0 +1,17 @@
+import django_filters
+
+from .models import GPSPosicion
+
+
+class GPSPosicionFilter(django_filters.FilterSet):
+	"""Filtros de posiciones; cada uno coincide con un índice compuesto del modelo."""
+
+	# Ids planos: evita la consulta de validación de ModelChoiceFilter
+	ruta = django_filters.NumberFilter(field_name="ruta_id")
+	usuario = django_filters.NumberFilter(field_name="usuario_id")
+	desde = django_filters.IsoDateTimeFilter(field_name="fecha_hora", lookup_expr="gte")
+	hasta = django_filters.IsoDateTimeFilter(field_name="fecha_hora", lookup_expr="lte")
+
+	class Meta:
+		model = GPSPosicion
+		fields = ["ruta", "usuario", "desde", "hasta"]
@@ -0,0 +1,70 @@
+"""Lectura del recorrido histórico de una ruta.
+
+Combina de forma transparente las posiciones vivas en `GPSPosicion` con las
+que `gps.retencion` ya movió al archivo comprimido.
+"""
+import heapq
+import os
+from datetime import date
+
+from . import archivo
+from .models import GPSPosicion
+
+
+def _dias_archivados(ruta_id, desde, hasta):
+	try:
+		nombres = os.listdir(archivo.directorio_ruta(ruta_id))
+	except FileNotFoundError:
+		return []
+	primero, ultimo = archivo.dia_de(desde), archivo.dia_de(hasta)
+	dias = []
+	for nombre in nombres:
+		if not nombre.endswith(".gpz"):
+			continue
+		dia = date.fromisoformat(nombre[:-4])
+		if primero <= dia <= ultimo:
+			dias.append(dia)
+	return sorted(dias)
+
+
+def _desde_archivo(ruta_id, desde, hasta, usuario_id):
+	for dia in _dias_archivados(ruta_id, desde, hasta):
+		for fila in archivo.leer_dia(ruta_id, dia):
+			if desde <= fila.fecha_hora <= hasta and (usuario_id is None or fila.usuario == usuario_id):
+				yield fila
+
+
+def _desde_bd(ruta_id, desde, hasta, usuario_id, chunk_size):
+	posiciones = GPSPosicion.objects.filter(ruta_id=ruta_id, fecha_hora__range=(desde, hasta))
+	if usuario_id is not None:
+		posiciones = posiciones.filter(usuario_id=usuario_id)
+	filas = posiciones.order_by("fecha_hora", "id").values_list(
+		"id", "fecha_hora", "usuario_id", "latitud", "longitud", "velocidad"
+	)
+	for pk, fecha_hora, usuario, latitud, longitud, velocidad in filas.iterator(chunk_size=chunk_size):
+		yield archivo.Fila(
+			id=pk,
+			fecha_hora=fecha_hora,
+			usuario=usuario,
+			latitud=float(latitud),
+			longitud=float(longitud),
+			velocidad=float(velocidad) if velocidad is not None else None,
+		)
+
+
+def iterar_posiciones(ruta_id, desde, hasta, usuario_id=None, chunk_size=2000):
+	"""Genera `archivo.Fila` de una ruta en `[desde, hasta]` en orden cronológico.
+
+	Las filas de la base de datos se leen con un iterador del lado del
+	servidor, así que el consumo de memoria no crece con la ventana.
+	"""
+	anterior = None
+	for fila in heapq.merge(
+		_desde_archivo(ruta_id, desde, hasta, usuario_id),
+		_desde_bd(ruta_id, desde, hasta, usuario_id, chunk_size),
+		key=lambda f: (f.fecha_hora, f.id),
+	):
+		# Una fila puede aparecer en ambos orígenes si el borrado se interrumpió
+		if fila.id != anterior:
+			yield fila
+		anterior = fila.id
@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from rutas.models import Ruta
+
+from . import broker, desvios, ultimas
+from .models import GPSPosicion
+from .serializers import GPSPosicionLoteSerializer
+from .signals import posiciones_registradas
+
+
+def _error(indice, errores):
+	return {"indice": indice, "errores": errores}
+
+
+def registrar_lote(items):
+	"""Valida e inserta un lote de posiciones GPS.
+
+	Cada elemento se valida por separado, pero las FKs (`ruta`, `usuario`)
+	se comprueban con una sola consulta por modelo para todo el lote. Los
+	elementos válidos se insertan con `bulk_create` en bloques de
+	`GPS_LOTE_TAMANO`; los inválidos no detienen el resto del lote.
+
+	Retorna una tupla `(posiciones_creadas, errores)` donde `errores` es una
+	lista de `{"indice": i, "errores": {...}}` ordenada por índice.
+	"""
+	validos = []
+	errores = []
+	for indice, item in enumerate(items):
+		if not isinstance(item, dict):
+			errores.append(_error(indice, {"non_field_errors": ["Se esperaba un objeto."]}))
+			continue
+		serializer = GPSPosicionLoteSerializer(data=item)
+		if serializer.is_valid():
+			validos.append((indice, serializer.validated_data))
+		else:
+			errores.append(_error(indice, serializer.errors))
+
+	ruta_ids = {data["ruta"] for _, data in validos if data.get("ruta") is not None}
+	usuario_ids = {data["usuario"] for _, data in validos if data.get("usuario") is not None}
+	rutas_existentes = set(Ruta.objects.filter(pk__in=ruta_ids).values_list("pk", flat=True)) if ruta_ids else set()
+	usuarios_existentes = (
+		set(get_user_model().objects.filter(pk__in=usuario_ids).values_list("pk", flat=True))
+		if usuario_ids else set()
+	)
+
+	objetos = []
+	for indice, data in validos:
+		ruta_id = data.get("ruta")
+		usuario_id = data.get("usuario")
+		errores_fk = {}
+		if ruta_id is not None and ruta_id not in rutas_existentes:
+			errores_fk["ruta"] = [f'Clave primaria "{ruta_id}" inválida - objeto no existe.']
+		if usuario_id is not None and usuario_id not in usuarios_existentes:
+			errores_fk["usuario"] = [f'Clave primaria "{usuario_id}" inválida - objeto no existe.']
+		if errores_fk:
+			errores.append(_error(indice, errores_fk))
+			continue
+		objetos.append(GPSPosicion(
+			ruta_id=ruta_id,
+			usuario_id=usuario_id,
+			longitud=data["longitud"],
+			latitud=data["latitud"],
+			velocidad=data.get("velocidad"),
+			fecha_hora=data["fecha_hora"],
+		))
+
+	creadas = GPSPosicion.objects.bulk_create(objetos, batch_size=settings.GPS_LOTE_TAMANO) if objetos else []
+	procesar_posiciones(creadas)
+	errores.sort(key=lambda e: e["indice"])
+	return creadas, errores
+
+
+def procesar_posiciones(posiciones):
+	"""Propaga posiciones recién guardadas a los consumidores en vivo.
+
+	Actualiza la última posición, difunde a los suscriptores, evalúa desvíos
+	y envía `posiciones_registradas` para el resto de apps (p. ej. ETA).
+	"""
+	if not posiciones:
+		return
+	ultimas.actualizar(posiciones)
+	broker.publicar_posiciones(posiciones)
+	desvios.detectar(posiciones)
+	posiciones_registradas.send(sender=GPSPosicion, posiciones=posiciones)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from gps.retencion import ejecutar_retencion
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve las posiciones GPS antiguas al archivo comprimido por ruta y día, "
+        "genera resúmenes opcionales y borra las filas en bloques"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, help="Antigüedad mínima en días (por defecto GPS_RETENCION_DIAS)")
+        parser.add_argument(
+            "--resumen-minutos", type=int,
+            help="Intervalo de los resúmenes en minutos; 0 los desactiva (por defecto GPS_RESUMEN_MINUTOS)",
+        )
+        parser.add_argument("--lote", type=int, help="Filas borradas por transacción (por defecto GPS_LOTE_TAMANO)")
+
+    def handle(self, *args, **options):
+        resultado = ejecutar_retencion(
+            dias=options["dias"],
+            resumen_minutos=options["resumen_minutos"],
+            lote=options["lote"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archivados {resultado['posiciones']} posiciones en {resultado['dias']} archivos diarios; "
+            f"{resultado['resumenes']} resúmenes creados."
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0001_initial'),
+        ('rutas', '0004_remove_bus_ruta_ruta_buses'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GPSPosicionResumen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField()),
+                ('minutos', models.PositiveIntegerField()),
+                ('muestras', models.PositiveIntegerField()),
+                ('longitud', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('latitud', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('velocidad_media', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('velocidad_maxima', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('ruta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_gps', to='rutas.ruta')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resumenes_gps', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen GPS',
+                'verbose_name_plural': 'Resúmenes GPS',
+                'ordering': ['-inicio'],
+                'indexes': [models.Index(fields=['ruta', 'inicio'], name='gps_gpsposi_ruta_id_958878_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gps', '0002_gpsposicionresumen'),
+        ('rutas', '0004_remove_bus_ruta_ruta_buses'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gpsposicion',
+            index=models.Index(fields=['-fecha_hora', '-id'], name='gps_gpsposi_fecha_h_18c029_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gpsposicion',
+            index=models.Index(fields=['ruta', '-fecha_hora', '-id'], name='gps_gpsposi_ruta_id_3c3937_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gpsposicion',
+            index=models.Index(fields=['usuario', '-fecha_hora', '-id'], name='gps_gpsposi_usuario_3659d6_idx'),
+        ),
+    ]
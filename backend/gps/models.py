@@ -25,6 +25,11 @@ class GPSPosicion(models.Model):
 		verbose_name = "GPS Posición"
 		verbose_name_plural = "GPS Posiciones"
 		ordering = ["-fecha_hora"]
+		indexes = [
+			models.Index(fields=["-fecha_hora", "-id"]),
+			models.Index(fields=["ruta", "-fecha_hora", "-id"]),
+			models.Index(fields=["usuario", "-fecha_hora", "-id"]),
+		]
 
 	def __str__(self):
 		u = self.usuario.username if self.usuario else "-"
@@ -60,3 +65,39 @@ class EventoDesvio(models.Model):
 		pos = f"pos={self.posicion.id}" if self.posicion else "pos=-"
 		return f"Evento {self.id} ({self.tipo_desvio}) {pos} @ {self.fecha_hora}"
 
+
+
+class GPSPosicionResumen(models.Model):
+	"""Resumen (downsampling) de posiciones archivadas.
+
+	Agrupa las posiciones de un usuario en una ruta por intervalos fijos de
+	`GPS_RESUMEN_MINUTOS` minutos antes de moverlas al archivo comprimido.
+
+	Campos principales:
+	- ruta / usuario: igual que en `GPSPosicion`
+	- inicio: comienzo del intervalo
+	- muestras: cantidad de posiciones resumidas
+	- latitud/longitud: promedio del intervalo
+	- velocidad_media / velocidad_maxima: en km/h (opcionales)
+	"""
+
+	ruta = models.ForeignKey(Ruta, on_delete=models.SET_NULL, null=True, blank=True, related_name="resumenes_gps")
+	usuario = models.ForeignKey("accounts.User", on_delete=models.SET_NULL, null=True, blank=True, related_name="resumenes_gps")
+	inicio = models.DateTimeField()
+	minutos = models.PositiveIntegerField()
+	muestras = models.PositiveIntegerField()
+	longitud = models.DecimalField(max_digits=9, decimal_places=6)
+	latitud = models.DecimalField(max_digits=9, decimal_places=6)
+	velocidad_media = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+	velocidad_maxima = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+
+	class Meta:
+		verbose_name = "Resumen GPS"
+		verbose_name_plural = "Resúmenes GPS"
+		ordering = ["-inicio"]
+		indexes = [
+			models.Index(fields=["ruta", "inicio"]),
+		]
+
+	def __str__(self):
+		return f"Resumen {self.id} (ruta={self.ruta_id} @ {self.inicio}, {self.muestras} muestras)"
@@ -0,0 +1,84 @@
+from base64 import b64decode, b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class GPSPosicionCursorPagination(CursorPagination):
+	"""Paginación keyset sobre (`fecha_hora`, `id`) descendente, sin `COUNT(*)` ni OFFSET.
+
+	El cursor lleva la fecha y el id de la fila límite de la página y la
+	siguiente se pide con `(fecha_hora, id) < (fecha, id)`, así que las
+	posiciones con la misma fecha no se saltan ni se repiten. Con `r` en el
+	cursor se retrocede con la comparación inversa y orden ascendente.
+	"""
+
+	ordering = ("-fecha_hora", "-id")
+	page_size_query_param = "page_size"
+	max_page_size = 500
+
+	def paginate_queryset(self, queryset, request, view=None):
+		self.page_size = self.get_page_size(request)
+		if not self.page_size:
+			return None
+
+		self.base_url = request.build_absolute_uri()
+		self.cursor = self.decode_cursor(request)
+		if self.cursor is None:
+			queryset = queryset.order_by("-fecha_hora", "-id")
+			atras = False
+		else:
+			fecha, pk, atras = self.cursor
+			if atras:
+				queryset = queryset.filter(Q(fecha_hora__gte=fecha) & (Q(fecha_hora__gt=fecha) | Q(id__gt=pk)))
+				queryset = queryset.order_by("fecha_hora", "id")
+			else:
+				queryset = queryset.filter(Q(fecha_hora__lte=fecha) & (Q(fecha_hora__lt=fecha) | Q(id__lt=pk)))
+				queryset = queryset.order_by("-fecha_hora", "-id")
+
+		resultados = list(queryset[:self.page_size + 1])
+		hay_mas = len(resultados) > self.page_size
+		self.page = resultados[:self.page_size]
+		if atras:
+			self.page.reverse()
+			self.has_next, self.has_previous = True, hay_mas
+		else:
+			self.has_next, self.has_previous = hay_mas, self.cursor is not None
+		if (self.has_next or self.has_previous) and self.template is not None:
+			self.display_page_controls = True
+		return self.page
+
+	def get_next_link(self):
+		if not self.has_next:
+			return None
+		if not self.page:
+			# Se retrocedió más allá del inicio: la siguiente es la primera página
+			return remove_query_param(self.base_url, self.cursor_query_param)
+		ultima = self.page[-1]
+		return self.encode_cursor((ultima.fecha_hora, ultima.id, False))
+
+	def get_previous_link(self):
+		if not self.has_previous:
+			return None
+		if not self.page:
+			return self.encode_cursor((self.cursor[0], self.cursor[1], True))
+		primera = self.page[0]
+		return self.encode_cursor((primera.fecha_hora, primera.id, True))
+
+	def decode_cursor(self, request):
+		codificado = request.query_params.get(self.cursor_query_param)
+		if codificado is None:
+			return None
+		try:
+			fecha, pk, atras = b64decode(codificado.encode("ascii")).decode("ascii").split("|")
+			return datetime.fromisoformat(fecha), int(pk), atras == "r"
+		except (TypeError, ValueError):
+			raise NotFound(self.invalid_cursor_message)
+
+	def encode_cursor(self, cursor):
+		fecha, pk, atras = cursor
+		codificado = b64encode(f"{fecha.isoformat()}|{pk}|{'r' if atras else 'a'}".encode("ascii")).decode("ascii")
+		return replace_query_param(self.base_url, self.cursor_query_param, codificado)
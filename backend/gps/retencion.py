@@ -0,0 +1,121 @@
+"""Retención del histórico GPS: archivo comprimido, resúmenes y borrado.
+
+`ejecutar_retencion` es el punto de entrada para tareas programadas (cron,
+Celery beat, etc.); el comando `archivar_gps` lo expone por consola.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, Min, OuterRef
+from django.utils import timezone
+
+from . import archivo
+from .models import EventoDesvio, GPSPosicion, GPSPosicionResumen
+
+
+CAMPOS = ("id", "fecha_hora", "usuario_id", "latitud", "longitud", "velocidad")
+
+
+def _decimal(valor, decimales):
+	return Decimal(str(round(valor, decimales)))
+
+
+def _resumir(ruta_id, dia, minutos):
+	"""
+	Reemplaza los `GPSPosicionResumen` de `minutos` de la ruta en el día por
+	los calculados sobre todo lo archivado de ese día, agrupado por usuario e
+	intervalo.
+
+	El archivo fusiona por id lo de ejecuciones anteriores, así que si una
+	retención se cortó a mitad del borrado, la siguiente rehace los
+	intervalos completos en lugar de duplicarlos con las filas restantes.
+	Borrado e inserción van en una misma transacción.
+	"""
+	segundos = minutos * 60
+	inicio_dia = datetime.combine(dia, time.min, tzinfo=dt_timezone.utc)
+	grupos = defaultdict(list)
+	for fila in archivo.leer_dia(ruta_id, dia):
+		grupos[(fila.usuario, int(fila.fecha_hora.timestamp()) // segundos)].append(fila)
+
+	resumenes = []
+	for (usuario_id, intervalo), grupo in grupos.items():
+		velocidades = [f.velocidad for f in grupo if f.velocidad is not None]
+		resumenes.append(GPSPosicionResumen(
+			ruta_id=ruta_id,
+			usuario_id=usuario_id,
+			# Un intervalo que empieza el día anterior se recorta al día: cada día es dueño de sus resúmenes
+			inicio=max(datetime.fromtimestamp(intervalo * segundos, tz=dt_timezone.utc), inicio_dia),
+			minutos=minutos,
+			muestras=len(grupo),
+			latitud=_decimal(sum(f.latitud for f in grupo) / len(grupo), 6),
+			longitud=_decimal(sum(f.longitud for f in grupo) / len(grupo), 6),
+			velocidad_media=_decimal(sum(velocidades) / len(velocidades), 2) if velocidades else None,
+			velocidad_maxima=_decimal(max(velocidades), 2) if velocidades else None,
+		))
+	del_dia = GPSPosicionResumen.objects.filter(
+		minutos=minutos, inicio__gte=inicio_dia, inicio__lt=inicio_dia + timedelta(days=1)
+	)
+	del_dia = del_dia.filter(ruta_id=ruta_id) if ruta_id is not None else del_dia.filter(ruta__isnull=True)
+	with transaction.atomic():
+		del_dia.delete()
+		return GPSPosicionResumen.objects.bulk_create(resumenes)
+
+
+def ejecutar_retencion(dias=None, resumen_minutos=None, lote=None):
+	"""Mueve al archivo las posiciones con más de `dias` días de antigüedad.
+
+	Se procesa un (ruta, día) completo cada vez: primero se escribe el
+	archivo comprimido, luego (opcionalmente) los resúmenes y por último se
+	borran las filas en bloques de `lote`, cada uno en su propia
+	transacción corta. Las posiciones referenciadas por un `EventoDesvio`
+	se conservan en la base de datos.
+
+	Retorna un diccionario con contadores de lo procesado.
+	"""
+	dias = settings.GPS_RETENCION_DIAS if dias is None else dias
+	resumen_minutos = settings.GPS_RESUMEN_MINUTOS if resumen_minutos is None else resumen_minutos
+	lote = lote or settings.GPS_LOTE_TAMANO
+
+	limite = datetime.combine(
+		archivo.dia_de(timezone.now() - timedelta(days=dias)), time.min, tzinfo=dt_timezone.utc
+	)
+	candidatas = GPSPosicion.objects.filter(fecha_hora__lt=limite).exclude(
+		Exists(EventoDesvio.objects.filter(posicion=OuterRef("pk")))
+	)
+
+	resultado = {"dias": 0, "posiciones": 0, "resumenes": 0}
+	for ruta_id in candidatas.order_by().values_list("ruta_id", flat=True).distinct():
+		de_ruta = candidatas.filter(ruta_id=ruta_id) if ruta_id is not None else candidatas.filter(ruta__isnull=True)
+		while True:
+			primera = de_ruta.aggregate(primera=Min("fecha_hora"))["primera"]
+			if primera is None:
+				break
+			dia = archivo.dia_de(primera)
+			inicio = datetime.combine(dia, time.min, tzinfo=dt_timezone.utc)
+			filas = [
+				archivo.Fila(
+					id=pk,
+					fecha_hora=fecha_hora,
+					usuario=usuario_id,
+					latitud=float(latitud),
+					longitud=float(longitud),
+					velocidad=float(velocidad) if velocidad is not None else None,
+				)
+				for pk, fecha_hora, usuario_id, latitud, longitud, velocidad in de_ruta.filter(
+					fecha_hora__gte=inicio, fecha_hora__lt=inicio + timedelta(days=1)
+				).order_by().values_list(*CAMPOS)
+			]
+
+			archivo.escribir_dia(ruta_id, dia, filas)
+			if resumen_minutos:
+				resultado["resumenes"] += len(_resumir(ruta_id, dia, resumen_minutos))
+			ids = [fila.id for fila in filas]
+			for i in range(0, len(ids), lote):
+				GPSPosicion.objects.filter(pk__in=ids[i:i + lote]).delete()
+
+			resultado["dias"] += 1
+			resultado["posiciones"] += len(filas)
+	return resultado
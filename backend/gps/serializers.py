@@ -25,3 +25,41 @@ class GPSPosicionSerializer(serializers.ModelSerializer):
             "fecha_hora",
             "eventos",
         ]
+
+
+class GPSPosicionSinEventosSerializer(serializers.ModelSerializer):
+    """Variante de listado sin la lista anidada de eventos."""
+
+    class Meta:
+        model = GPSPosicion
+        fields = [
+            "id",
+            "ruta",
+            "usuario",
+            "longitud",
+            "latitud",
+            "velocidad",
+            "fecha_hora",
+        ]
+
+
+class GPSPosicionLoteSerializer(serializers.Serializer):
+    """Valida un elemento de una carga masiva de posiciones.
+
+    `ruta` y `usuario` se reciben como ids planos: su existencia se
+    comprueba para todo el lote de una vez en `gps.ingesta`.
+    """
+
+    ruta = serializers.IntegerField(required=False, allow_null=True)
+    usuario = serializers.IntegerField(required=False, allow_null=True)
+    longitud = serializers.DecimalField(max_digits=9, decimal_places=6)
+    latitud = serializers.DecimalField(max_digits=9, decimal_places=6)
+    velocidad = serializers.DecimalField(max_digits=8, decimal_places=2, required=False, allow_null=True)
+    fecha_hora = serializers.DateTimeField()
+
+    def validate(self, data):
+        if not -90 <= data["latitud"] <= 90:
+            raise serializers.ValidationError({"latitud": "La latitud debe estar entre -90 y 90 grados."})
+        if not -180 <= data["longitud"] <= 180:
+            raise serializers.ValidationError({"longitud": "La longitud debe estar entre -180 y 180 grados."})
+        return data
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from paradas.models import Parada
+
+from .desvios import invalidar_corredor
+
+
+# Se envía tras guardar posiciones por la API (individual o masiva),
+# con `posiciones` = lista de `GPSPosicion` ya persistidas.
+posiciones_registradas = Signal()
+
+
+@receiver([post_save, post_delete], sender=Parada)
+def invalidar_corredor_parada(sender, instance, **kwargs):
+	"""El corredor de la ruta cambia con cualquier alta, baja o edición de sus paradas."""
+	invalidar_corredor(instance.ruta_id)
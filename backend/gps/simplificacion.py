@@ -0,0 +1,159 @@
+"""Simplificación de recorridos GPS (Douglas–Peucker y Visvalingam–Whyatt).
+
+Las coordenadas se proyectan a metros con una equirectangular local
+centrada en el recorrido, suficiente para tramos urbanos, de modo que la
+tolerancia se expresa directamente en metros.
+"""
+import heapq
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import archivo
+from .historial import iterar_posiciones
+
+
+RADIO_TIERRA_M = 6371008.8
+ALGORITMOS = ("dp", "vw")
+
+
+def escalas(lat0):
+	"""Metros por grado de longitud y de latitud alrededor de la latitud `lat0`."""
+	escala_y = RADIO_TIERRA_M * math.pi / 180
+	return escala_y * math.cos(math.radians(lat0)), escala_y
+
+
+def proyectar(latitudes, longitudes, lat0=None):
+	"""Proyecta listas de lat/lng (grados) a listas x/y en metros.
+
+	Sin `lat0` se usa la latitud media de los puntos.
+	"""
+	if not latitudes:
+		return [], []
+	if lat0 is None:
+		lat0 = sum(latitudes) / len(latitudes)
+	escala_x, escala_y = escalas(lat0)
+	return [lng * escala_x for lng in longitudes], [lat * escala_y for lat in latitudes]
+
+
+def douglas_peucker(xs, ys, tolerancia):
+	"""Índices de los puntos que conserva Douglas–Peucker (versión iterativa)."""
+	n = len(xs)
+	if n < 3:
+		return list(range(n))
+	conservar = [False] * n
+	conservar[0] = conservar[-1] = True
+	pila = [(0, n - 1)]
+	tolerancia2 = tolerancia * tolerancia
+	while pila:
+		inicio, fin = pila.pop()
+		ax, ay = xs[inicio], ys[inicio]
+		dx, dy = xs[fin] - ax, ys[fin] - ay
+		largo2 = dx * dx + dy * dy
+		mayor, indice = -1.0, -1
+		for i in range(inicio + 1, fin):
+			px, py = xs[i] - ax, ys[i] - ay
+			if largo2 == 0:
+				d2 = px * px + py * py
+			else:
+				t = max(0.0, min(1.0, (px * dx + py * dy) / largo2))
+				ex, ey = px - t * dx, py - t * dy
+				d2 = ex * ex + ey * ey
+			if d2 > mayor:
+				mayor, indice = d2, i
+		if mayor > tolerancia2:
+			conservar[indice] = True
+			pila.append((inicio, indice))
+			pila.append((indice, fin))
+	return [i for i in range(n) if conservar[i]]
+
+
+def visvalingam(xs, ys, tolerancia):
+	"""Índices que conserva Visvalingam–Whyatt con área mínima `tolerancia²` (m²)."""
+	n = len(xs)
+	if n < 3:
+		return list(range(n))
+	anterior = list(range(-1, n - 1))
+	siguiente = list(range(1, n + 1))
+
+	def area(i):
+		a, c = anterior[i], siguiente[i]
+		return abs((xs[a] - xs[i]) * (ys[c] - ys[i]) - (xs[c] - xs[i]) * (ys[a] - ys[i])) / 2
+
+	areas = [math.inf] * n
+	for i in range(1, n - 1):
+		areas[i] = area(i)
+	monticulo = [(areas[i], i) for i in range(1, n - 1)]
+	heapq.heapify(monticulo)
+	eliminado = [False] * n
+	area_minima = tolerancia * tolerancia
+	while monticulo:
+		valor, i = heapq.heappop(monticulo)
+		if eliminado[i] or valor != areas[i]:
+			continue
+		if valor >= area_minima:
+			break
+		eliminado[i] = True
+		a, c = anterior[i], siguiente[i]
+		siguiente[a], anterior[c] = c, a
+		for j in (a, c):
+			if 0 < j < n - 1:
+				# El área de un vecino nunca baja de la del punto eliminado
+				areas[j] = max(area(j), valor)
+				heapq.heappush(monticulo, (areas[j], j))
+	return [i for i in range(n) if not eliminado[i]]
+
+
+def simplificar(filas, tolerancia, algoritmo="dp"):
+	"""Simplifica `filas` por usuario (cada bus es una línea) y las reordena por fecha."""
+	funcion = visvalingam if algoritmo == "vw" else douglas_peucker
+	por_usuario = defaultdict(list)
+	for fila in filas:
+		por_usuario[fila.usuario].append(fila)
+	resultado = []
+	for grupo in por_usuario.values():
+		xs, ys = proyectar([f.latitud for f in grupo], [f.longitud for f in grupo])
+		resultado.extend(grupo[i] for i in funcion(xs, ys, tolerancia))
+	resultado.sort(key=lambda f: (f.fecha_hora, f.id))
+	return resultado
+
+
+def dia_simplificado(ruta_id, dia, tolerancia, algoritmo, usuario_id, cargar):
+	"""Recorrido simplificado de un día completo, cacheado por (ruta, usuario, día, tolerancia).
+
+	`cargar()` devuelve las filas del día cuando no están en caché. Los días
+	cerrados se guardan `GPS_TRACK_CACHE_SEGUNDOS`; el día en curso sigue
+	recibiendo posiciones, así que solo se guarda `GPS_TRACK_CACHE_HOY_SEGUNDOS`.
+	"""
+	clave = f"gps:track:{ruta_id}:{usuario_id or '-'}:{dia.isoformat()}:{algoritmo}:{tolerancia:g}"
+	filas = cache.get(clave)
+	if filas is None:
+		filas = simplificar(cargar(), tolerancia, algoritmo)
+		hoy = archivo.dia_de(timezone.now())
+		cache.set(
+			clave,
+			[tuple(f) for f in filas],
+			settings.GPS_TRACK_CACHE_HOY_SEGUNDOS if dia >= hoy else settings.GPS_TRACK_CACHE_SEGUNDOS,
+		)
+		return filas
+	return [archivo.Fila(*f) for f in filas]
+
+
+def iterar_simplificado(ruta_id, desde, hasta, tolerancia, algoritmo="dp", usuario_id=None):
+	"""Como `historial.iterar_posiciones`, pero con cada día simplificado (y cacheado)."""
+	dia, ultimo = archivo.dia_de(desde), archivo.dia_de(hasta)
+	while dia <= ultimo:
+		inicio = datetime.combine(dia, time.min, tzinfo=dt_timezone.utc)
+		fin = inicio + timedelta(days=1) - timedelta(microseconds=1)
+		filas = dia_simplificado(
+			ruta_id, dia, tolerancia, algoritmo, usuario_id,
+			lambda: iterar_posiciones(ruta_id, inicio, fin, usuario_id=usuario_id),
+		)
+		for fila in filas:
+			if desde <= fila.fecha_hora <= hasta:
+				yield fila
+		dia += timedelta(days=1)
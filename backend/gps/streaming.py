@@ -0,0 +1,37 @@
+"""Canal Server-Sent Events con las posiciones en vivo de una ruta.
+
+Requiere servir la aplicación por ASGI (uvicorn, daphne...): cada cliente
+es una corrutina esperando en su cola, sin hilo dedicado.
+"""
+import asyncio
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .broker import obtener_broker
+
+
+async def _eventos(ruta_id):
+	suscripcion = obtener_broker().suscribir(ruta_id)
+	try:
+		yield f"retry: {settings.GPS_STREAM_REINTENTO_MS}\n\n"
+		while True:
+			try:
+				registro = await asyncio.wait_for(suscripcion.siguiente(), timeout=settings.GPS_STREAM_LATIDO)
+			except asyncio.TimeoutError:
+				# Comentario SSE para mantener viva la conexión a través de proxies
+				yield ": ping\n\n"
+				continue
+			datos = json.dumps({k: v for k, v in registro.items() if k != "ts"})
+			yield f"id: {registro['id']}\nevent: posicion\ndata: {datos}\n\n"
+	finally:
+		suscripcion.cerrar()
+
+
+async def stream_posiciones(request, ruta_id):
+	"""GET /api/gps/posiciones/stream/{ruta_id}/ - Posiciones nuevas de la ruta (SSE)."""
+	respuesta = StreamingHttpResponse(_eventos(ruta_id), content_type="text/event-stream")
+	respuesta["Cache-Control"] = "no-cache"
+	respuesta["X-Accel-Buffering"] = "no"
+	return respuesta
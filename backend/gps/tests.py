@@ -1,3 +1,377 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from paradas.models import Parada
+from rutas.models import Ruta
+from . import ultimas
+from .broker import MemoriaBroker
+from .codificacion import decodificar_polyline
+from .historial import iterar_posiciones
+from .models import EventoDesvio, GPSPosicion, GPSPosicionResumen
+from .retencion import ejecutar_retencion
+from .simplificacion import douglas_peucker, visvalingam
+from .streaming import _eventos
+
+
+# Caché en memoria para las pruebas: `cache.clear()` no debe tocar la caché en disco
+CACHES_PRUEBA = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas"},
+    "versiones": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas-versiones"},
+}
+
+
+def leer_json(respuesta):
+    return json.loads(b"".join(respuesta.streaming_content))
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class GPSTestCase(APITestCase):
+    """Aísla la caché y el directorio de datos GPS de cada prueba."""
+
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        ajustes = override_settings(GPS_DATA_DIR=self.tmp.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+
+class GPSLoteTests(GPSTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+        self.url = "/api/gps/posiciones/bulk/"
+
+    def test_lote_json_reporta_errores_por_indice(self):
+        items = [
+            {"ruta": self.ruta.id, "latitud": "11.544", "longitud": "-72.907", "fecha_hora": "2025-11-10T12:00:00Z"},
+            {"ruta": 9999, "latitud": "11.544", "longitud": "-72.907", "fecha_hora": "2025-11-10T12:00:05Z"},
+            {"ruta": self.ruta.id, "latitud": "95", "longitud": "-72.907", "fecha_hora": "2025-11-10T12:00:10Z"},
+        ]
+        r = self.client.post(self.url, items, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.data["creadas"], 1)
+        self.assertEqual([e["indice"] for e in r.data["errores"]], [1, 2])
+        self.assertEqual(GPSPosicion.objects.count(), 1)
+
+    def test_lote_ndjson(self):
+        lineas = "\n".join(
+            json.dumps({"ruta": self.ruta.id, "latitud": "11.5", "longitud": "-72.9", "fecha_hora": f"2025-11-10T12:00:0{i}Z"})
+            for i in range(3)
+        )
+        r = self.client.post(self.url, lineas, content_type="application/x-ndjson")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.data["creadas"], 3)
+
+
+class GPSUltimasTests(GPSTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+
+    def test_ultimas_guarda_la_mas_reciente(self):
+        items = [
+            {"ruta": self.ruta.id, "latitud": "11.5", "longitud": "-72.9", "fecha_hora": "2025-11-10T12:00:05Z"},
+            {"ruta": self.ruta.id, "latitud": "11.6", "longitud": "-72.8", "fecha_hora": "2025-11-10T12:00:00Z"},
+        ]
+        self.client.post("/api/gps/posiciones/bulk/", items, format="json")
+        self.client.post("/api/gps/posiciones/", {
+            "ruta": self.ruta.id, "latitud": "11.7", "longitud": "-72.7", "fecha_hora": "2025-11-10T11:00:00Z",
+        }, format="json")
+        r = self.client.get(f"/api/gps/posiciones/ultimas/?ruta={self.ruta.id}")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.data), 1)
+        self.assertEqual(r.data[0]["latitud"], 11.5)
+
+
+class GPSRetencionTests(GPSTestCase):
+    def test_archiva_y_lee_de_forma_transparente(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+        base = timezone.now() - timedelta(days=40)
+        GPSPosicion.objects.bulk_create([
+            GPSPosicion(ruta=ruta, latitud=Decimal("11.544100") + i, longitud=Decimal("-72.907000"),
+                        velocidad=Decimal("30.5") if i % 2 else None, fecha_hora=base + timedelta(seconds=i))
+            for i in range(5)
+        ])
+        GPSPosicion.objects.create(ruta=ruta, latitud=1, longitud=2, fecha_hora=timezone.now())
+
+        resultado = ejecutar_retencion(dias=30, resumen_minutos=5)
+
+        self.assertEqual(resultado["posiciones"], 5)
+        self.assertEqual(GPSPosicion.objects.count(), 1)
+        self.assertTrue(GPSPosicionResumen.objects.exists())
+        filas = list(iterar_posiciones(ruta.id, base - timedelta(days=1), timezone.now()))
+        self.assertEqual(len(filas), 6)
+        self.assertAlmostEqual(filas[4].latitud, 15.5441)
+        self.assertEqual(filas[1].velocidad, 30.5)
+        self.assertIsNone(filas[0].velocidad)
+
+    def test_reintento_tras_fallo_no_duplica_resumenes(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+        base = (timezone.now() - timedelta(days=40)).replace(hour=10, minute=0, second=0, microsecond=0)
+        GPSPosicion.objects.bulk_create([
+            GPSPosicion(ruta=ruta, latitud=1, longitud=2, fecha_hora=base + timedelta(seconds=i))
+            for i in range(6)
+        ])
+        borrar = QuerySet.delete
+        llamadas = []
+
+        def falla_al_segundo_lote(queryset):
+            if queryset.model is GPSPosicion:
+                llamadas.append(None)
+                if len(llamadas) == 2:
+                    raise RuntimeError("caída")
+            return borrar(queryset)
+
+        with mock.patch.object(QuerySet, "delete", falla_al_segundo_lote):
+            with self.assertRaises(RuntimeError):
+                ejecutar_retencion(dias=30, resumen_minutos=5, lote=2)
+        self.assertEqual(GPSPosicion.objects.count(), 4)
+
+        ejecutar_retencion(dias=30, resumen_minutos=5, lote=2)
+        self.assertFalse(GPSPosicion.objects.exists())
+        self.assertEqual(list(GPSPosicionResumen.objects.values_list("inicio", "muestras")), [(base, 6)])
+
+
+class GPSStreamTests(SimpleTestCase):
+    async def test_difusion_desde_otro_hilo(self):
+        broker = MemoriaBroker()
+        suscripcion = broker.suscribir(7)
+        otra = broker.suscribir(8)
+        hilo = threading.Thread(target=broker.publicar, args=(7, [{"id": 1, "ts": 0}]))
+        hilo.start()
+        hilo.join()
+        self.assertEqual(await asyncio.wait_for(suscripcion.siguiente(), 1), {"id": 1, "ts": 0})
+        self.assertTrue(otra.cola.empty())
+        suscripcion.cerrar()
+        self.assertEqual(broker.difusor.cantidad(7), 0)
+
+    async def test_eventos_sse(self):
+        from . import broker
+        broker._broker = MemoriaBroker()
+        self.addCleanup(setattr, broker, "_broker", None)
+        eventos = _eventos(3)
+        self.assertTrue((await anext(eventos)).startswith("retry:"))
+        broker._broker.publicar(3, [{"id": 5, "ruta": 3, "ts": 0}])
+        evento = await asyncio.wait_for(anext(eventos), 1)
+        self.assertIn("event: posicion", evento)
+        self.assertIn('"ruta": 3', evento)
+        await eventos.aclose()
+        self.assertEqual(broker._broker.difusor.cantidad(), 0)
+
+
+class GPSTrackTests(GPSTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+        self.base = timezone.now() - timedelta(hours=1)
+        GPSPosicion.objects.bulk_create([
+            GPSPosicion(ruta=self.ruta, latitud=Decimal("38.5") + Decimal(i) / 10, longitud=Decimal("-120.2") - i,
+                        velocidad=Decimal("12.5"), fecha_hora=self.base + timedelta(seconds=10 * i))
+            for i in range(3)
+        ])
+
+    def test_columnar(self):
+        r = self.client.get(f"/api/gps/posiciones/track/?ruta={self.ruta.id}")
+        self.assertEqual(r.status_code, 200)
+        datos = leer_json(r)
+        self.assertEqual(datos["cantidad"], 3)
+        self.assertEqual(datos["ruta"], self.ruta.id)
+        self.assertEqual(datos["lat"], [38.5, 38.6, 38.7])
+        self.assertEqual(datos["vel"], [12.5] * 3)
+        self.assertEqual(datos["usuario"], [None] * 3)
+
+    def test_polyline(self):
+        r = self.client.get(f"/api/gps/posiciones/track/?ruta={self.ruta.id}&formato=polyline")
+        self.assertEqual(r.status_code, 200)
+        datos = leer_json(r)
+        puntos = decodificar_polyline(datos["polyline"])
+        self.assertEqual(puntos, [(38.5, -120.2), (38.6, -121.2), (38.7, -122.2)])
+        self.assertEqual(decodificar_polyline(datos["tiempos"], dimensiones=1, precision=0), [(0,), (10,), (20,)])
+
+    def test_precision_limitada(self):
+        r = self.client.get(f"/api/gps/posiciones/track/?ruta={self.ruta.id}&formato=polyline&precision=400")
+        datos = leer_json(r)
+        self.assertEqual(datos["precision"], 7)
+        puntos = decodificar_polyline(datos["polyline"], precision=7)
+        self.assertEqual(puntos[0], (38.5, -120.2))
+
+    def test_columnar_en_varios_bloques(self):
+        GPSPosicion.objects.bulk_create([
+            GPSPosicion(ruta=self.ruta, latitud=1, longitud=2,
+                        fecha_hora=self.base + timedelta(minutes=1, milliseconds=i))
+            for i in range(2500)
+        ])
+        r = self.client.get(f"/api/gps/posiciones/track/?ruta={self.ruta.id}")
+        bloques = list(r.streaming_content)
+        self.assertGreater(len(bloques), 3)
+        datos = json.loads(b"".join(bloques))
+        self.assertEqual(datos["cantidad"], 2503)
+        self.assertEqual(len(datos["lng"]), 2503)
+        self.assertEqual(datos["lat"][-1], 1.0)
+
+    def test_binario(self):
+        r = self.client.get(f"/api/gps/posiciones/track/?ruta={self.ruta.id}&formato=binario")
+        contenido = b"".join(r.streaming_content)
+        self.assertEqual(contenido[:4], b"GPT1")
+        self.assertEqual(len(contenido), 4 + 3 * 22)
+
+
+class GPSSimplificacionTests(GPSTestCase):
+    def test_algoritmos_conservan_extremos_y_picos(self):
+        xs = [0, 10, 20, 30, 40, 50]
+        ys = [0, 0.5, 0, 80, 0, 0.2]
+        self.assertEqual(douglas_peucker(xs, ys, 5), [0, 2, 3, 4, 5])
+        self.assertEqual(visvalingam(xs, ys, 5), [0, 2, 3, 4, 5])
+
+    def test_track_simplificado_cacheado(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+        base = timezone.now() - timedelta(days=2)
+        GPSPosicion.objects.bulk_create([
+            GPSPosicion(ruta=ruta, latitud=Decimal("11.5"), longitud=Decimal("-72.9") + Decimal(i) / 10000,
+                        fecha_hora=base + timedelta(seconds=i))
+            for i in range(50)
+        ])
+        url = (f"/api/gps/posiciones/track/?ruta={ruta.id}&tolerancia=5"
+               f"&desde={(base - timedelta(hours=1)).isoformat()}&hasta={(base + timedelta(hours=1)).isoformat()}")
+        url = url.replace("+", "%2B")
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(leer_json(r)["cantidad"], 2)
+        with self.assertNumQueries(0):
+            leer_json(self.client.get(url))
+
+
+class GPSDesvioTests(GPSTestCase):
+    def test_abre_y_cierra_evento(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1", capacidad_activa=10)
+        Parada.objects.create(nombre="A", direccion="-", coordenada_lat=11, coordenada_lng=-73, ruta=ruta, orden=1)
+        Parada.objects.create(nombre="B", direccion="-", coordenada_lat=11, coordenada_lng=-72.9, ruta=ruta, orden=2)
+        # Dentro, fuera (~1 km al norte) durante 90 s y de vuelta al corredor
+        desplazamientos = [0, 0.01, 0.01, 0.01, 0.01, 0]
+        items = [
+            {"ruta": ruta.id, "latitud": f"{11 + d:.6f}", "longitud": f"{-72.99 + i * 0.01:.6f}",
+             "fecha_hora": (timezone.now() + timedelta(seconds=30 * i)).isoformat()}
+            for i, d in enumerate(desplazamientos)
+        ]
+        self.client.post("/api/gps/posiciones/bulk/", items[:4], format="json")
+        evento = EventoDesvio.objects.get()
+        self.assertEqual(evento.estado, "abierto")
+        self.client.post("/api/gps/posiciones/bulk/", items[4:], format="json")
+        evento.refresh_from_db()
+        self.assertEqual(evento.estado, "cerrado")
+        self.assertEqual(EventoDesvio.objects.count(), 1)
+
+    def test_lotes_desordenados_se_combinan(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1", capacidad_activa=10)
+        Parada.objects.create(nombre="A", direccion="-", coordenada_lat=11, coordenada_lng=-73, ruta=ruta, orden=1)
+        Parada.objects.create(nombre="B", direccion="-", coordenada_lat=11, coordenada_lng=-72.9, ruta=ruta, orden=2)
+        desplazamientos = [0, 0.01, 0.01, 0.01, 0, 0]
+        inicio = timezone.now()
+        items = [
+            {"ruta": ruta.id, "latitud": f"{11 + d:.6f}", "longitud": f"{-72.99 + i * 0.01:.6f}",
+             "fecha_hora": (inicio + timedelta(seconds=30 * i)).isoformat()}
+            for i, d in enumerate(desplazamientos)
+        ]
+        # 30 s fuera: todavía no es desvío
+        self.client.post("/api/gps/posiciones/bulk/", items[2:4], format="json")
+        self.assertFalse(EventoDesvio.objects.exists())
+        # Llega tarde la primera posición fuera: el tramo ya dura 60 s
+        self.client.post("/api/gps/posiciones/bulk/", items[1:2], format="json")
+        evento = EventoDesvio.objects.get()
+        estado = ultimas.obtener_backend("desvios").obtener(ruta.id, None)
+        self.assertEqual(estado["ts"], (inicio + timedelta(seconds=90)).timestamp())
+        # Una posición dentro anterior al estado no cierra el desvío
+        self.client.post("/api/gps/posiciones/bulk/", items[:1], format="json")
+        evento.refresh_from_db()
+        self.assertEqual(evento.estado, "abierto")
+        self.client.post("/api/gps/posiciones/bulk/", items[4:], format="json")
+        evento.refresh_from_db()
+        self.assertEqual(evento.estado, "cerrado")
+
+    def test_bloqueo_por_bus_es_exclusivo(self):
+        estados = ultimas.obtener_backend("desvios")
+        tomado = threading.Event()
+
+        def otro_lote():
+            with estados.bloqueo(1, 2):
+                tomado.set()
+
+        with estados.bloqueo(1, 2):
+            hilo = threading.Thread(target=otro_lote)
+            hilo.start()
+            with estados.bloqueo(1, 3):
+                pass
+            self.assertFalse(tomado.wait(0.2))
+        hilo.join(5)
+        self.assertTrue(tomado.is_set())
+
+
+class GPSListadoCursorTests(GPSTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+        base = timezone.now()
+        posiciones = GPSPosicion.objects.bulk_create([
+            GPSPosicion(ruta=self.ruta, latitud=1, longitud=2, fecha_hora=base + timedelta(seconds=i))
+            for i in range(5)
+        ])
+        for posicion in posiciones:
+            EventoDesvio.objects.create(posicion=posicion, ruta=self.ruta, fecha_hora=base, tipo_desvio="x")
+
+    def test_cursor_sin_n_mas_1(self):
+        with self.assertNumQueries(2):
+            r = self.client.get(f"/api/gps/posiciones/?modo=cursor&page_size=3&ruta={self.ruta.id}")
+        self.assertEqual(len(r.data["results"]), 3)
+        self.assertNotIn("count", r.data)
+        self.assertEqual(len(r.data["results"][0]["eventos"]), 1)
+        siguiente = self.client.get(r.data["next"])
+        self.assertEqual(len(siguiente.data["results"]), 2)
+
+    def test_cursor_con_fechas_repetidas(self):
+        # Fechas iguales en el límite de página: el cursor compara (fecha_hora, id)
+        fecha = timezone.now() + timedelta(hours=1)
+        GPSPosicion.objects.bulk_create([
+            GPSPosicion(ruta=self.ruta, latitud=1, longitud=2, fecha_hora=fecha) for _ in range(4)
+        ])
+        esperados = list(GPSPosicion.objects.order_by("-fecha_hora", "-id").values_list("id", flat=True))
+
+        vistos, paginas = [], []
+        url = "/api/gps/posiciones/?modo=cursor&page_size=3&eventos=false"
+        while url:
+            with CaptureQueriesContext(connection) as consultas:
+                r = self.client.get(url)
+            self.assertNotIn("OFFSET", consultas[0]["sql"])
+            paginas.append(r)
+            vistos += [fila["id"] for fila in r.data["results"]]
+            url = r.data["next"]
+        self.assertEqual(vistos, esperados)
+        self.assertIsNone(paginas[0].data["previous"])
+
+        # Volver atrás desde la última página da la penúltima
+        anterior = self.client.get(paginas[-1].data["previous"])
+        self.assertEqual([fila["id"] for fila in anterior.data["results"]], esperados[3:6])
+        self.assertEqual(anterior.data["next"], paginas[-2].data["next"])
+
+    def test_cursor_invalido(self):
+        r = self.client.get("/api/gps/posiciones/?cursor=xyz")
+        self.assertEqual(r.status_code, 404)
+
+    def test_sin_eventos(self):
+        with self.assertNumQueries(1):
+            r = self.client.get("/api/gps/posiciones/?modo=cursor&eventos=false")
+        self.assertNotIn("eventos", r.data["results"][0])
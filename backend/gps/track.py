@@ -0,0 +1,140 @@
+"""Formatos compactos para el recorrido de una ruta en una ventana de tiempo.
+
+Todos los formatos consumen un iterable de `archivo.Fila` (ver
+`gps.historial.iterar_posiciones`) en una sola pasada y se generan en
+bloques (para `StreamingHttpResponse`), sin acumular el recorrido.
+
+- columnar: JSON con arreglos paralelos (`t` en segundos epoch).
+- polyline: polilínea de Google para (lat, lng) y, aparte, los tiempos
+  como deltas de segundos en la misma codificación de una dimensión.
+- binario: registros `<qiiiH` (ms epoch, lat y lng en micro-grados,
+  usuario o 0, velocidad en décimas de km/h o 0xFFFF si es nula), precedidos
+  por la cabecera `GPT1`.
+
+En los formatos JSON el primer arreglo sale a medida que llegan las filas y
+los demás se escriben en archivos temporales (en memoria hasta
+`TEMPORAL_MAX_BYTES`, luego en disco) que se copian al final; `cantidad`
+va como último campo.
+"""
+import json
+import struct
+import tempfile
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .codificacion import CodificadorPolyline
+
+
+CABECERA_BINARIA = b"GPT1"
+REGISTRO_BINARIO = struct.Struct("<qiiiH")
+VELOCIDAD_NULA = 0xFFFF
+REGISTROS_POR_BLOQUE = 1024
+BYTES_POR_BLOQUE = 64 * 1024
+TEMPORAL_MAX_BYTES = 1024 * 1024
+PRECISION_MAXIMA = 7
+
+
+def _json(valor):
+	return json.dumps(valor, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":"))
+
+
+def _abrir(cabecera):
+	"""`{` seguido de los campos de `cabecera`, listo para agregar más campos."""
+	return "{" + "".join(f"{_json(clave)}:{_json(valor)}," for clave, valor in (cabecera or {}).items())
+
+
+def _temporal():
+	return tempfile.SpooledTemporaryFile(max_size=TEMPORAL_MAX_BYTES, mode="w+", encoding="utf-8")
+
+
+def _volcar(temporal):
+	temporal.seek(0)
+	while bloque := temporal.read(BYTES_POR_BLOQUE):
+		yield bloque
+
+
+def _numero(valor):
+	return "null" if valor is None else repr(float(valor))
+
+
+def columnar(filas, cabecera=None):
+	"""Genera el JSON columnar por bloques; `cabecera` son campos extra al inicio."""
+	columnas = {nombre: _temporal() for nombre in ("lat", "lng", "vel", "usuario")}
+	try:
+		yield _abrir(cabecera) + '"t":['
+		tiempos, cantidad = [], 0
+		for fila in filas:
+			separador = "," if cantidad else ""
+			tiempos.append(separador + repr(fila.fecha_hora.timestamp()))
+			columnas["lat"].write(separador + _numero(fila.latitud))
+			columnas["lng"].write(separador + _numero(fila.longitud))
+			columnas["vel"].write(separador + _numero(fila.velocidad))
+			columnas["usuario"].write(separador + (str(fila.usuario) if fila.usuario else "null"))
+			cantidad += 1
+			if len(tiempos) >= REGISTROS_POR_BLOQUE:
+				yield "".join(tiempos)
+				tiempos = []
+		yield "".join(tiempos) + "]"
+		for nombre, temporal in columnas.items():
+			yield f',"{nombre}":['
+			yield from _volcar(temporal)
+			yield "]"
+		yield f',"cantidad":{cantidad}}}'
+	finally:
+		for temporal in columnas.values():
+			temporal.close()
+
+
+def _escapar(fragmento):
+	# El alfabeto de la polilínea (63-126) incluye la barra invertida
+	return fragmento.replace("\\", "\\\\")
+
+
+def polyline(filas, precision=5, cabecera=None):
+	"""Genera el JSON de la polilínea por bloques; `precision` se limita a 0-7."""
+	precision = min(max(precision, 0), PRECISION_MAXIMA)
+	coordenadas = CodificadorPolyline(dimensiones=2, precision=precision)
+	tiempos = CodificadorPolyline(dimensiones=1, precision=0)
+	temporal = _temporal()
+	try:
+		yield _abrir({**(cabecera or {}), "precision": precision}) + '"polyline":"'
+		partes, cantidad, inicio = [], 0, None
+		for fila in filas:
+			segundos = round(fila.fecha_hora.timestamp())
+			if inicio is None:
+				inicio = segundos
+			partes.append(_escapar(coordenadas.agregar(float(fila.latitud), float(fila.longitud))))
+			temporal.write(_escapar(tiempos.agregar(segundos - inicio)))
+			cantidad += 1
+			if len(partes) >= REGISTROS_POR_BLOQUE:
+				yield "".join(partes)
+				partes = []
+		yield "".join(partes) + '","tiempos":"'
+		yield from _volcar(temporal)
+		yield f'","inicio":{_json(inicio)},"cantidad":{cantidad}}}'
+	finally:
+		temporal.close()
+
+
+def _registro_binario(fila):
+	velocidad = VELOCIDAD_NULA if fila.velocidad is None else min(max(round(fila.velocidad * 10), 0), VELOCIDAD_NULA - 1)
+	return REGISTRO_BINARIO.pack(
+		round(fila.fecha_hora.timestamp() * 1000),
+		round(fila.latitud * 1e6),
+		round(fila.longitud * 1e6),
+		fila.usuario or 0,
+		velocidad,
+	)
+
+
+def binario(filas):
+	"""Genera el formato binario por bloques (para `StreamingHttpResponse`)."""
+	yield CABECERA_BINARIA
+	bloque = []
+	for fila in filas:
+		bloque.append(_registro_binario(fila))
+		if len(bloque) >= REGISTROS_POR_BLOQUE:
+			yield b"".join(bloque)
+			bloque = []
+	if bloque:
+		yield b"".join(bloque)
@@ -0,0 +1,216 @@
+"""Almacén de la última posición conocida por (ruta, usuario).
+
+Cada escritura que pasa por `gps.ingesta.procesar_posiciones` actualiza el
+almacén, de modo que "¿dónde está cada bus ahora?" se responde sin
+consultar el histórico de `GPSPosicion`. El backend es configurable con
+`GPS_ULTIMAS_BACKEND`; por defecto se usa `ArchivoBackend`, compartido por
+todos los procesos WSGI/ASGI del mismo servidor.
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+	import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+	fcntl = None
+
+
+SIN_RUTA = "sin_ruta"
+SIN_USUARIO = "anonimo"
+
+
+def registro_desde_posicion(posicion):
+	"""Convierte una `GPSPosicion` en el registro plano que guarda el almacén."""
+	return {
+		"id": posicion.id,
+		"ruta": posicion.ruta_id,
+		"usuario": posicion.usuario_id,
+		"latitud": float(posicion.latitud),
+		"longitud": float(posicion.longitud),
+		"velocidad": float(posicion.velocidad) if posicion.velocidad is not None else None,
+		"fecha_hora": posicion.fecha_hora.isoformat(),
+		"ts": posicion.fecha_hora.timestamp(),
+	}
+
+
+class BaseBackend:
+	"""Interfaz de los backends. `espacio` separa almacenes independientes."""
+
+	def __init__(self, espacio="ultimas"):
+		self.espacio = espacio
+
+	def guardar(self, registro):
+		"""Guarda el registro si es más reciente que el existente para su clave."""
+		raise NotImplementedError
+
+	def obtener(self, ruta_id, usuario_id):
+		"""Registro guardado para la clave, o None."""
+		raise NotImplementedError
+
+	def por_ruta(self, ruta_id):
+		raise NotImplementedError
+
+	def todas(self):
+		raise NotImplementedError
+
+	def limpiar(self):
+		raise NotImplementedError
+
+	def bloqueo(self, ruta_id, usuario_id):
+		"""Context manager exclusivo por clave, para leer-modificar-guardar sin carreras."""
+		raise NotImplementedError
+
+
+class MemoriaBackend(BaseBackend):
+	"""Backend en memoria del proceso. Útil para desarrollo y pruebas."""
+
+	_datos = {}
+	_lock = threading.Lock()
+	_bloqueos = {}
+
+	def _rutas(self):
+		return self._datos.setdefault(self.espacio, {})
+
+	def guardar(self, registro):
+		with self._lock:
+			por_usuario = self._rutas().setdefault(registro["ruta"], {})
+			actual = por_usuario.get(registro["usuario"])
+			if actual is None or actual["ts"] <= registro["ts"]:
+				por_usuario[registro["usuario"]] = registro
+
+	def obtener(self, ruta_id, usuario_id):
+		return self._rutas().get(ruta_id, {}).get(usuario_id)
+
+	def por_ruta(self, ruta_id):
+		return list(self._rutas().get(ruta_id, {}).values())
+
+	def todas(self):
+		return [r for por_usuario in list(self._rutas().values()) for r in por_usuario.values()]
+
+	def limpiar(self):
+		with self._lock:
+			self._datos.pop(self.espacio, None)
+
+	def bloqueo(self, ruta_id, usuario_id):
+		with self._lock:
+			return self._bloqueos.setdefault((self.espacio, ruta_id, usuario_id), threading.Lock())
+
+
+class ArchivoBackend(BaseBackend):
+	"""Backend en disco: un archivo JSON pequeño por (ruta, usuario).
+
+	Las escrituras son atómicas (`os.replace`) y, donde existe `fcntl`, se
+	serializan por ruta con un bloqueo de archivo, así que varios procesos
+	pueden compartir el mismo directorio (`GPS_DATA_DIR`).
+	"""
+
+	def __init__(self, espacio="ultimas"):
+		super().__init__(espacio)
+		self.raiz = Path(settings.GPS_DATA_DIR) / espacio
+
+	def _directorio(self, ruta_id):
+		return self.raiz / (str(ruta_id) if ruta_id is not None else SIN_RUTA)
+
+	@contextmanager
+	def _bloqueo(self, directorio):
+		if fcntl is None:
+			yield
+			return
+		with open(directorio / ".lock", "a") as lock:
+			fcntl.flock(lock, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(lock, fcntl.LOCK_UN)
+
+	@staticmethod
+	def _leer(archivo):
+		try:
+			with open(archivo, encoding="utf-8") as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return None
+
+	def _archivo(self, ruta_id, usuario_id):
+		usuario = usuario_id if usuario_id is not None else SIN_USUARIO
+		return self._directorio(ruta_id) / f"{usuario}.json"
+
+	def guardar(self, registro):
+		directorio = self._directorio(registro["ruta"])
+		directorio.mkdir(parents=True, exist_ok=True)
+		destino = self._archivo(registro["ruta"], registro["usuario"])
+		with self._bloqueo(directorio):
+			actual = self._leer(destino)
+			if actual is not None and actual["ts"] > registro["ts"]:
+				return
+			fd, temporal = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+			with os.fdopen(fd, "w", encoding="utf-8") as f:
+				json.dump(registro, f)
+			os.replace(temporal, destino)
+
+	def _leer_directorio(self, directorio):
+		try:
+			entradas = list(os.scandir(directorio))
+		except FileNotFoundError:
+			return []
+		registros = (self._leer(e.path) for e in entradas if e.name.endswith(".json"))
+		return [r for r in registros if r is not None]
+
+	def obtener(self, ruta_id, usuario_id):
+		return self._leer(self._archivo(ruta_id, usuario_id))
+
+	def por_ruta(self, ruta_id):
+		return self._leer_directorio(self._directorio(ruta_id))
+
+	def todas(self):
+		try:
+			directorios = [e.path for e in os.scandir(self.raiz) if e.is_dir()]
+		except FileNotFoundError:
+			return []
+		return [r for d in directorios for r in self._leer_directorio(d)]
+
+	def limpiar(self):
+		for registro in self.todas():
+			self._archivo(registro["ruta"], registro["usuario"]).unlink(missing_ok=True)
+
+	@contextmanager
+	def bloqueo(self, ruta_id, usuario_id):
+		# Archivo propio por clave: `guardar` toma el `.lock` de la ruta y
+		# flock no es reentrante entre descriptores distintos
+		directorio = self._directorio(ruta_id)
+		directorio.mkdir(parents=True, exist_ok=True)
+		usuario = usuario_id if usuario_id is not None else SIN_USUARIO
+		if fcntl is None:
+			yield
+			return
+		with open(directorio / f".{usuario}.bloqueo", "a") as lock:
+			fcntl.flock(lock, fcntl.LOCK_EX)
+			try:
+				yield
+			finally:
+				fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def obtener_backend(espacio="ultimas"):
+	"""Instancia el backend configurado en `GPS_ULTIMAS_BACKEND`."""
+	return import_string(settings.GPS_ULTIMAS_BACKEND)(espacio)
+
+
+def actualizar(posiciones):
+	"""Actualiza el almacén con un lote de posiciones (solo la más reciente por clave)."""
+	recientes = {}
+	for posicion in posiciones:
+		clave = (posicion.ruta_id, posicion.usuario_id)
+		actual = recientes.get(clave)
+		if actual is None or actual.fecha_hora <= posicion.fecha_hora:
+			recientes[clave] = posicion
+	backend = obtener_backend()
+	for posicion in recientes.values():
+		backend.guardar(registro_desde_posicion(posicion))
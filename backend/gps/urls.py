@@ -1,5 +1,7 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
+from .streaming import stream_posiciones
 from .views import GPSPosicionViewSet, EventoDesvioViewSet
 
 
@@ -7,4 +9,6 @@ router = DefaultRouter()
 router.register(r'posiciones', GPSPosicionViewSet, basename='posicion')
 router.register(r'eventos_desvio', EventoDesvioViewSet, basename='evento_desvio')
 
-urlpatterns = router.urls
+urlpatterns = [
+    path('posiciones/stream/<int:ruta_id>/', stream_posiciones, name='posicion-stream'),
+] + router.urls
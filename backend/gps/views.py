@@ -1,18 +1,188 @@
-from rest_framework import viewsets
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 
+from . import simplificacion, track, ultimas
+from .filters import GPSPosicionFilter
+from .historial import iterar_posiciones
+from .ingesta import procesar_posiciones, registrar_lote
 from .models import GPSPosicion, EventoDesvio
-from .serializers import GPSPosicionSerializer, EventoDesvioSerializer
+from .pagination import GPSPosicionCursorPagination
+from .parsers import NDJSONParser
+from .serializers import GPSPosicionSerializer, GPSPosicionSinEventosSerializer, EventoDesvioSerializer
+
+
+def _parse_fecha(valor):
+	"""Convierte un parámetro ISO 8601 en datetime consciente (UTC si no trae zona)."""
+	fecha = parse_datetime(valor)
+	if fecha is None:
+		raise ValueError(valor)
+	if timezone.is_naive(fecha):
+		fecha = timezone.make_aware(fecha, dt_timezone.utc)
+	return fecha
 
 
 class GPSPosicionViewSet(viewsets.ModelViewSet):
+	"""
+	ViewSet de posiciones GPS.
+
+	Listado: filtros `ruta`, `usuario`, `desde`, `hasta` (ISO 8601);
+	`modo=cursor` (o un `cursor` recibido) activa la paginación por cursor
+	y `eventos=false` omite los eventos anidados.
+
+	Endpoints adicionales:
+	- POST /api/gps/posiciones/bulk/ - Ingesta masiva (lista JSON o NDJSON)
+	- GET /api/gps/posiciones/ultimas/?ruta={id} - Última posición conocida por bus
+	- GET /api/gps/posiciones/track/?ruta={id}&desde=&hasta=&formato= - Recorrido compacto
+	- GET /api/gps/posiciones/stream/{ruta_id}/ - Posiciones en vivo (SSE, ver `gps.streaming`)
+	"""
+
 	queryset = GPSPosicion.objects.all()
 	serializer_class = GPSPosicionSerializer
 	permission_classes = [AllowAny]
+	filterset_class = GPSPosicionFilter
+	ordering_fields = ["fecha_hora", "id"]
+	ordering = ["-fecha_hora", "-id"]
+
+	def _incluir_eventos(self):
+		return self.request.query_params.get("eventos", "true").lower() not in ("0", "false", "no")
+
+	def get_queryset(self):
+		queryset = super().get_queryset()
+		if self.action in ("list", "retrieve") and self._incluir_eventos():
+			queryset = queryset.prefetch_related("eventos")
+		return queryset
+
+	def get_serializer_class(self):
+		if self.action in ("list", "retrieve") and not self._incluir_eventos():
+			return GPSPosicionSinEventosSerializer
+		return GPSPosicionSerializer
+
+	@property
+	def paginator(self):
+		if not hasattr(self, "_paginator"):
+			params = self.request.query_params
+			if params.get("modo") == "cursor" or "cursor" in params:
+				self._paginator = GPSPosicionCursorPagination()
+			else:
+				self._paginator = super().paginator
+		return self._paginator
+
+	def perform_create(self, serializer):
+		procesar_posiciones([serializer.save()])
+
+	def perform_update(self, serializer):
+		procesar_posiciones([serializer.save()])
+
+	@action(detail=False, methods=["post"], url_path="bulk", parser_classes=[JSONParser, NDJSONParser])
+	def lote(self, request):
+		"""Registra un lote de posiciones; los elementos inválidos se reportan por índice."""
+		items = request.data
+		if not isinstance(items, list):
+			return Response(
+				{"error": "Se esperaba una lista de posiciones (JSON o NDJSON)."},
+				status=status.HTTP_400_BAD_REQUEST
+			)
+		if len(items) > settings.GPS_LOTE_MAX_ITEMS:
+			return Response(
+				{"error": f"El lote supera el máximo de {settings.GPS_LOTE_MAX_ITEMS} posiciones."},
+				status=status.HTTP_400_BAD_REQUEST
+			)
+
+		creadas, errores = registrar_lote(items)
+		return Response(
+			{
+				"recibidas": len(items),
+				"creadas": len(creadas),
+				"ids": [posicion.id for posicion in creadas],
+				"errores": errores,
+			},
+			status=status.HTTP_201_CREATED if creadas or not items else status.HTTP_400_BAD_REQUEST
+		)
+
+	@action(detail=False, methods=["get"])
+	def ultimas(self, request):
+		"""Última posición conocida de cada bus, opcionalmente filtrada por ruta."""
+		ruta = request.query_params.get("ruta")
+		backend = ultimas.obtener_backend()
+		if ruta is None:
+			registros = backend.todas()
+		else:
+			try:
+				registros = backend.por_ruta(int(ruta))
+			except ValueError:
+				return Response(
+					{"error": "El parámetro 'ruta' debe ser un entero."},
+					status=status.HTTP_400_BAD_REQUEST
+				)
+		registros.sort(key=lambda r: (r["ruta"] or 0, r["usuario"] or 0))
+		return Response([{k: v for k, v in r.items() if k != "ts"} for r in registros])
+
+	@action(detail=False, methods=["get"])
+	def track(self, request):
+		"""
+		Recorrido completo de una ruta en una ventana de tiempo, en una sola respuesta.
+		Parámetros: ruta, desde/hasta (ISO 8601; por defecto las últimas 24 h),
+		usuario (opcional), formato=columnar|polyline|binario, precision (polyline, 0-7),
+		tolerancia (metros, opcional) y algoritmo=dp|vw para simplificar la línea.
+		"""
+		params = request.query_params
+		formato = params.get("formato", "columnar")
+		if formato not in ("columnar", "polyline", "binario"):
+			return Response(
+				{"error": "El parámetro 'formato' debe ser columnar, polyline o binario."},
+				status=status.HTTP_400_BAD_REQUEST
+			)
+		try:
+			ruta = int(params["ruta"])
+			usuario = int(params["usuario"]) if params.get("usuario") else None
+			hasta = _parse_fecha(params["hasta"]) if params.get("hasta") else timezone.now()
+			desde = _parse_fecha(params["desde"]) if params.get("desde") else hasta - timedelta(days=1)
+			precision = int(params.get("precision", 5))
+			tolerancia = float(params["tolerancia"]) if params.get("tolerancia") else None
+		except KeyError:
+			return Response({"error": "El parámetro 'ruta' es requerido."}, status=status.HTTP_400_BAD_REQUEST)
+		except ValueError:
+			return Response(
+				{"error": "Parámetros inválidos: 'ruta', 'usuario' y 'precision' son enteros, 'tolerancia' "
+				 "es un número y las fechas van en ISO 8601."},
+				status=status.HTTP_400_BAD_REQUEST
+			)
+		if desde > hasta or hasta - desde > timedelta(days=settings.GPS_TRACK_MAX_DIAS):
+			return Response(
+				{"error": f"La ventana debe ser válida y de máximo {settings.GPS_TRACK_MAX_DIAS} días."},
+				status=status.HTTP_400_BAD_REQUEST
+			)
+		algoritmo = params.get("algoritmo", "dp")
+		if algoritmo not in simplificacion.ALGORITMOS or (tolerancia is not None and not tolerancia > 0):
+			return Response(
+				{"error": "'algoritmo' debe ser dp o vw y 'tolerancia' un número positivo."},
+				status=status.HTTP_400_BAD_REQUEST
+			)
+
+		if tolerancia:
+			filas = simplificacion.iterar_simplificado(ruta, desde, hasta, tolerancia, algoritmo, usuario_id=usuario)
+		else:
+			filas = iterar_posiciones(ruta, desde, hasta, usuario_id=usuario)
+		if formato == "binario":
+			return StreamingHttpResponse(track.binario(filas), content_type="application/octet-stream")
+		cabecera = {"ruta": ruta, "desde": desde, "hasta": hasta, "formato": formato}
+		if formato == "polyline":
+			contenido = track.polyline(filas, precision, cabecera=cabecera)
+		else:
+			contenido = track.columnar(filas, cabecera=cabecera)
+		return StreamingHttpResponse(contenido, content_type="application/json")
 
 
 class EventoDesvioViewSet(viewsets.ModelViewSet):
 	queryset = EventoDesvio.objects.all()
 	serializer_class = EventoDesvioSerializer
 	permission_classes = [AllowAny]
-
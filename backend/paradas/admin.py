@@ -1,5 +1,7 @@
-from django.contrib import admin
-from .models import Parada
+from django.contrib import admin, messages
+from .models import Parada, TiempoSegmento
+from .optimizacion import proponer_orden
+from .secuencia import aplicar_operaciones, reordenar_activas
 
 
 @admin.register(Parada)
@@ -18,7 +20,14 @@ class ParadaAdmin(admin.ModelAdmin):
     search_fields = ["nombre", "direccion"]
     ordering = ["ruta", "orden", "nombre"]
     list_editable = ["activa", "orden"]
-    readonly_fields = ["fecha_creacion", "fecha_actualizacion"]
+    actions = ["optimizar_orden_rutas"]
+    readonly_fields = [
+        "distancia_acumulada_m",
+        "longitud_segmento_m",
+        "rumbo_siguiente",
+        "fecha_creacion",
+        "fecha_actualizacion",
+    ]
     
     fieldsets = (
         ("Información básica", {
@@ -30,8 +39,42 @@ class ParadaAdmin(admin.ModelAdmin):
         ("Ruta", {
             "fields": ("ruta", "orden")
         }),
+        ("Geometría en la ruta", {
+            "fields": ("distancia_acumulada_m", "longitud_segmento_m", "rumbo_siguiente"),
+            "classes": ("collapse",)
+        }),
         ("Fechas", {
             "fields": ("fecha_creacion", "fecha_actualizacion"),
             "classes": ("collapse",)
         }),
     )
+
+    @admin.action(description="Optimizar el orden de las rutas seleccionadas (conserva la primera y la última parada)")
+    def optimizar_orden_rutas(self, request, queryset):
+        for ruta_id in sorted(set(queryset.values_list("ruta_id", flat=True))):
+            todas = list(Parada.objects.filter(ruta_id=ruta_id).order_by("orden", "id"))
+            paradas = [parada for parada in todas if parada.activa]
+            propuesta, actual, nueva = proponer_orden(paradas, fijar_inicio=True, fijar_fin=True)
+            if actual - nueva < 1:
+                self.message_user(request, f"Ruta {ruta_id}: el orden actual ya es el más corto encontrado.")
+                continue
+            resultado = aplicar_operaciones(ruta_id, reordenar_activas(todas, propuesta))
+            if resultado["errores"]:
+                self.message_user(
+                    request,
+                    f"Ruta {ruta_id}: no se aplicó el nuevo orden ({resultado['errores'][0]['errores']}).",
+                    messages.ERROR,
+                )
+                continue
+            self.message_user(
+                request,
+                f"Ruta {ruta_id}: recorrido de {actual / 1000:.2f} km a {nueva / 1000:.2f} km.",
+                messages.SUCCESS,
+            )
+
+
+@admin.register(TiempoSegmento)
+class TiempoSegmentoAdmin(admin.ModelAdmin):
+    list_display = ["ruta", "parada_origen", "parada_destino", "dia_semana", "hora", "muestras", "media_segundos"]
+    list_filter = ["ruta", "dia_semana"]
+    list_select_related = ["ruta", "parada_origen", "parada_destino"]
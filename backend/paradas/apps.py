@@ -5,3 +5,6 @@ class ParadasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'paradas'
     verbose_name = 'Gestión de Paradas'
+
+    def ready(self):
+        import paradas.signals
@@ -0,0 +1,55 @@
+"""Búsqueda de paradas por proximidad (radio y k vecinos más cercanos) en BD.
+
+El índice por `Parada.geohash` reduce los candidatos a las 9 celdas que
+cubren el círculo de búsqueda; después se ordena por distancia haversine.
+Sirve para querysets arbitrarios; las paradas activas se consultan
+normalmente en el índice en memoria de `paradas.indice`.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+
+from .geo import celdas_vecindad, haversine_m
+
+
+# Carácter siguiente a "z" (último símbolo geohash): cota superior del rango de un prefijo
+FIN_PREFIJO = "{"
+
+
+def filtrar_por_celdas(queryset, lat, lng, radio_m):
+    """Restringe `queryset` a las celdas geohash que cubren el círculo."""
+    prefijos = celdas_vecindad(lat, lng, radio_m)
+    if not prefijos:
+        return queryset
+    filtro = Q()
+    for prefijo in prefijos:
+        # Rango en lugar de LIKE para que cualquier índice B-tree sirva
+        filtro |= Q(geohash__gte=prefijo, geohash__lt=prefijo + FIN_PREFIJO)
+    return queryset.filter(filtro)
+
+
+def _dentro_del_radio(queryset, lat, lng, radio_m, limite):
+    candidatas = (
+        (haversine_m(lat, lng, float(p.coordenada_lat), float(p.coordenada_lng)), p.id, p)
+        for p in filtrar_por_celdas(queryset, lat, lng, radio_m)
+    )
+    return heapq.nsmallest(limite, (c for c in candidatas if c[0] <= radio_m))
+
+
+def buscar_cercanas(queryset, lat, lng, radio_m=None, limite=20):
+    """Paradas de `queryset` más cercanas al punto, ordenadas por distancia.
+
+    Con `radio_m` se devuelven como máximo `limite` paradas dentro del radio.
+    Sin radio se buscan los `limite` vecinos más cercanos, duplicando el
+    radio desde `PARADAS_CERCANAS_RADIO_INICIAL_M` hasta
+    `PARADAS_CERCANAS_RADIO_MAX_M`.
+
+    Retorna una lista de `(distancia_m, parada)`.
+    """
+    radio = radio_m if radio_m is not None else settings.PARADAS_CERCANAS_RADIO_INICIAL_M
+    while True:
+        resultados = _dentro_del_radio(queryset, lat, lng, radio, limite)
+        if radio_m is not None or len(resultados) >= limite or radio >= settings.PARADAS_CERCANAS_RADIO_MAX_M:
+            return [(d, p) for d, _, p in resultados]
+        radio = min(radio * 2, settings.PARADAS_CERCANAS_RADIO_MAX_M)
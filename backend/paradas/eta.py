@@ -0,0 +1,112 @@
+"""Estimación de llegada (ETA) de los buses a las paradas de su ruta.
+
+El estado de cada bus (progreso sobre la ruta y velocidad suavizada) se
+actualiza de forma incremental con cada lote de posiciones ingerido y se
+guarda en el almacén compartido de `gps.ultimas` (espacio "eta"). Consultar
+la ETA de una parada solo lee ese estado: no recorre el histórico.
+
+Cuando `paradas.segmentos` tiene tiempos históricos para todos los tramos
+pendientes en la franja horaria, se usan en lugar de la velocidad actual.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from gps import ultimas
+
+from .geometria import obtener_geometria
+from .segmentos import tabla_segmentos, tiempo_historico
+
+
+def _estados():
+    return ultimas.obtener_backend("eta")
+
+
+def actualizar(posiciones):
+    """Proyecta las posiciones nuevas sobre su ruta y actualiza el estado de cada bus."""
+    grupos = defaultdict(list)
+    for posicion in posiciones:
+        if posicion.ruta_id is not None:
+            grupos[(posicion.ruta_id, posicion.usuario_id)].append(posicion)
+    if not grupos:
+        return
+
+    suavizado = settings.ETA_SUAVIZADO
+    estados = _estados()
+    for (ruta_id, usuario_id), grupo in grupos.items():
+        geometria = obtener_geometria(ruta_id)
+        if len(geometria.ids) < 2:
+            continue
+        grupo.sort(key=lambda p: p.fecha_hora)
+        estado = estados.obtener(ruta_id, usuario_id)
+        for posicion in grupo:
+            ts = posicion.fecha_hora.timestamp()
+            if estado is not None and ts <= estado["ts"]:
+                continue
+            progreso, distancia = geometria.proyectar(float(posicion.latitud), float(posicion.longitud))
+            if posicion.velocidad is not None:
+                medida = float(posicion.velocidad) / 3.6
+            elif estado is not None:
+                medida = max(0.0, (progreso - estado["progreso_m"]) / (ts - estado["ts"]))
+            else:
+                medida = None
+            velocidad = estado["velocidad_ms"] if estado is not None else None
+            if medida is not None:
+                velocidad = medida if velocidad is None else suavizado * medida + (1 - suavizado) * velocidad
+            estado = {
+                "ruta": ruta_id,
+                "usuario": usuario_id,
+                "ts": ts,
+                "progreso_m": progreso,
+                "distancia_ruta_m": distancia,
+                "velocidad_ms": velocidad,
+            }
+        if estado is not None:
+            estados.guardar(estado)
+
+
+def eta_parada(parada, ahora=None):
+    """Buses que aún no pasan por la parada, con distancia restante y ETA.
+
+    Retorna None si la parada no forma parte de la secuencia activa de su ruta.
+    """
+    geometria = obtener_geometria(parada.ruta_id)
+    objetivo = geometria.progreso_parada(parada.id)
+    if objetivo is None:
+        return None
+
+    ahora = time.time() if ahora is None else ahora
+    velocidad_minima = settings.ETA_VELOCIDAD_MINIMA_KMH / 3.6
+    indice = geometria.indice[parada.id]
+    tabla = tabla_segmentos(parada.ruta_id)
+    buses = []
+    for estado in _estados().por_ruta(parada.ruta_id):
+        antiguedad = ahora - estado["ts"]
+        restante = objetivo - estado["progreso_m"]
+        if antiguedad > settings.ETA_MAX_ANTIGUEDAD_S or restante < -settings.ETA_TOLERANCIA_M:
+            continue
+        restante = max(restante, 0.0)
+        segundos = tiempo_historico(geometria, tabla, estado["progreso_m"], indice, estado["ts"]) if tabla else None
+        fuente = "historico"
+        if segundos is None:
+            velocidad = max(estado["velocidad_ms"] or 0.0, velocidad_minima)
+            segundos = restante / velocidad
+            fuente = "velocidad"
+        # Descontar lo que el bus ya avanzó desde su último reporte
+        segundos = max(segundos - antiguedad, 0.0)
+        buses.append({
+            "usuario": estado["usuario"],
+            "distancia_m": round(restante, 1),
+            "eta_segundos": round(segundos),
+            "llegada_estimada": ahora + segundos,
+            "reporte": estado["ts"],
+            "fuente": fuente,
+        })
+    buses.sort(key=lambda b: b["eta_segundos"])
+    return {
+        "parada": parada.id,
+        "ruta": parada.ruta_id,
+        "progreso_parada_m": round(objetivo, 1),
+        "buses": buses,
+    }
@@ -0,0 +1,85 @@
+"""Utilidades geográficas para paradas."""
+import math
+
+
+RADIO_TIERRA_M = 6371008.8
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Distancia en metros sobre la esfera entre dos puntos en grados."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * RADIO_TIERRA_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def rumbo_grados(lat1, lng1, lat2, lng2):
+    """Rumbo inicial (0-360, 0 = norte) para ir del punto 1 al punto 2."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dl = math.radians(lng2 - lng1)
+    x = math.sin(dl) * math.cos(p2)
+    y = math.cos(p1) * math.sin(p2) - math.sin(p1) * math.cos(p2) * math.cos(dl)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+BASE32_GEOHASH = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION_GEOHASH = 9
+
+
+def geohash(lat, lng, precision=PRECISION_GEOHASH):
+    """Codifica un punto como geohash de `precision` caracteres."""
+    lat_rango = [-90.0, 90.0]
+    lng_rango = [-180.0, 180.0]
+    caracteres = []
+    bits = 0
+    valor = 0
+    par = True
+    while len(caracteres) < precision:
+        rango, coordenada = (lng_rango, lng) if par else (lat_rango, lat)
+        medio = (rango[0] + rango[1]) / 2
+        valor <<= 1
+        if coordenada >= medio:
+            valor |= 1
+            rango[0] = medio
+        else:
+            rango[1] = medio
+        par = not par
+        bits += 1
+        if bits == 5:
+            caracteres.append(BASE32_GEOHASH[valor])
+            bits = 0
+            valor = 0
+    return "".join(caracteres)
+
+
+def tamano_celda_grados(precision):
+    """(alto en grados de latitud, ancho en grados de longitud) de una celda."""
+    bits = 5 * precision
+    bits_lng = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / 2 ** bits_lat, 360.0 / 2 ** bits_lng
+
+
+def celdas_vecindad(lat, lng, radio_m):
+    """Prefijos geohash (celda central y sus 8 vecinas) que cubren el círculo.
+
+    Se elige la mayor precisión cuya celda mide al menos `radio_m` en ambos
+    ejes a esa latitud; retorna [] si el radio excede la celda más grande,
+    en cuyo caso no conviene filtrar por geohash.
+    """
+    metros_grado = math.pi * RADIO_TIERRA_M / 180
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    for precision in range(PRECISION_GEOHASH, 0, -1):
+        alto, ancho = tamano_celda_grados(precision)
+        if alto * metros_grado >= radio_m and ancho * metros_grado * cos_lat >= radio_m:
+            break
+    else:
+        return []
+    prefijos = set()
+    for dlat in (-alto, 0, alto):
+        for dlng in (-ancho, 0, ancho):
+            vecino_lat = min(max(lat + dlat, -90.0), 90.0 - 1e-9)
+            vecino_lng = (lng + dlng + 180.0) % 360.0 - 180.0
+            prefijos.add(geohash(vecino_lat, vecino_lng, precision))
+    return sorted(prefijos)
@@ -0,0 +1,145 @@
+"""Geometría lineal de una ruta a partir de la secuencia de sus paradas.
+
+Cada `Parada` activa guarda su distancia acumulada desde el inicio de la
+ruta, la longitud del tramo hasta la siguiente y el rumbo hacia ella.
+`recalcular_geometria` los actualiza en una sola pasada masiva cuando
+cambian las paradas de la ruta (ver `paradas.signals`), de modo que el
+avance sobre la ruta se lee en O(1). En la misma pasada se guarda en
+`Ruta.trazado` la polilínea codificada que indexa `rutas.indice`.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from gps.simplificacion import escalas
+from rutas.indice import codificar_trazado, indice_rutas
+from rutas.models import Ruta
+from sincronizacion.registro import registrar_cambios
+
+from .geo import haversine_m, rumbo_grados
+from .models import Parada
+
+
+def clave_geometria(ruta_id):
+    return f"paradas:geometria:{ruta_id}"
+
+
+class GeometriaRuta:
+    """Paradas activas de una ruta con su distancia acumulada desde el inicio.
+
+    `proyectar` ubica un punto sobre la polilínea y devuelve cuántos metros
+    de ruta lleva recorridos (progreso) y a qué distancia está de ella.
+    """
+
+    def __init__(self, ruta_id, paradas):
+        """`paradas`: tuplas (id, lat, lng, distancia_acumulada_m) en orden de ruta."""
+        self.ruta_id = ruta_id
+        self.ids = [p[0] for p in paradas]
+        self.lats = [p[1] for p in paradas]
+        self.lngs = [p[2] for p in paradas]
+        self.acumuladas = [p[3] for p in paradas]
+        if None in self.acumuladas:
+            # Geometría aún no precalculada: se suma sobre la marcha
+            self.acumuladas = [0.0] * len(paradas)
+            for i in range(1, len(paradas)):
+                self.acumuladas[i] = self.acumuladas[i - 1] + haversine_m(
+                    self.lats[i - 1], self.lngs[i - 1], self.lats[i], self.lngs[i]
+                )
+        self.indice = {parada_id: i for i, parada_id in enumerate(self.ids)}
+        lat0 = sum(self.lats) / len(self.lats) if self.lats else 0.0
+        self.escala_x, self.escala_y = escalas(lat0)
+
+    @property
+    def longitud_total(self):
+        return self.acumuladas[-1] if self.acumuladas else 0.0
+
+    def progreso_parada(self, parada_id):
+        i = self.indice.get(parada_id)
+        return None if i is None else self.acumuladas[i]
+
+    def proyectar(self, lat, lng):
+        """Retorna `(progreso_m, distancia_m)` del punto respecto a la ruta."""
+        if len(self.ids) < 2:
+            return None, None
+        px, py = lng * self.escala_x, lat * self.escala_y
+        mejor = None
+        for i in range(len(self.ids) - 1):
+            ax, ay = self.lngs[i] * self.escala_x, self.lats[i] * self.escala_y
+            dx = self.lngs[i + 1] * self.escala_x - ax
+            dy = self.lats[i + 1] * self.escala_y - ay
+            largo2 = dx * dx + dy * dy
+            t = 0.0 if largo2 == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / largo2))
+            ex, ey = px - ax - t * dx, py - ay - t * dy
+            d2 = ex * ex + ey * ey
+            if mejor is None or d2 < mejor[0]:
+                segmento = self.acumuladas[i + 1] - self.acumuladas[i]
+                mejor = (d2, self.acumuladas[i] + t * segmento)
+        return mejor[1], mejor[0] ** 0.5
+
+
+def obtener_geometria(ruta_id):
+    """Geometría cacheada de la ruta (se invalida con cualquier cambio en sus paradas)."""
+    clave = clave_geometria(ruta_id)
+    geometria = cache.get(clave)
+    if geometria is None:
+        paradas = [
+            (pk, float(lat), float(lng), acumulada)
+            for pk, lat, lng, acumulada in Parada.objects.filter(ruta_id=ruta_id, activa=True)
+            .order_by("orden", "id").values_list("id", "coordenada_lat", "coordenada_lng", "distancia_acumulada_m")
+        ]
+        geometria = GeometriaRuta(ruta_id, paradas)
+        cache.set(clave, geometria, settings.PARADAS_GEOMETRIA_CACHE_SEGUNDOS)
+    return geometria
+
+
+def invalidar_geometria(ruta_id):
+    cache.delete(clave_geometria(ruta_id))
+
+
+CAMPOS_GEOMETRIA = ["distancia_acumulada_m", "longitud_segmento_m", "rumbo_siguiente"]
+
+
+def calcular_campos(paradas):
+    """Asigna en memoria los campos de geometría a `paradas` (activas y en orden)."""
+    acumulada = 0.0
+    for actual, siguiente in zip(paradas, paradas[1:] + [None]):
+        actual.distancia_acumulada_m = acumulada
+        if siguiente is None:
+            actual.longitud_segmento_m = None
+            actual.rumbo_siguiente = None
+            continue
+        puntos = (
+            float(actual.coordenada_lat), float(actual.coordenada_lng),
+            float(siguiente.coordenada_lat), float(siguiente.coordenada_lng),
+        )
+        actual.longitud_segmento_m = haversine_m(*puntos)
+        actual.rumbo_siguiente = rumbo_grados(*puntos)
+        acumulada += actual.longitud_segmento_m
+
+
+def recalcular_geometria(ruta_id):
+    """
+    Recalcula la geometría de todas las paradas de la ruta con un único
+    `bulk_update`, y el trazado codificado de la ruta.
+    """
+    paradas = list(
+        Parada.objects.filter(ruta_id=ruta_id).order_by("orden", "id")
+        .only("id", "coordenada_lat", "coordenada_lng", "activa", *CAMPOS_GEOMETRIA)
+    )
+    anteriores = {p.id: tuple(getattr(p, campo) for campo in CAMPOS_GEOMETRIA) for p in paradas}
+    for parada in paradas:
+        if not parada.activa:
+            for campo in CAMPOS_GEOMETRIA:
+                setattr(parada, campo, None)
+    activas = [p for p in paradas if p.activa]
+    calcular_campos(activas)
+    cambiadas = [p for p in paradas if tuple(getattr(p, c) for c in CAMPOS_GEOMETRIA) != anteriores[p.id]]
+    if cambiadas:
+        Parada.objects.bulk_update(cambiadas, CAMPOS_GEOMETRIA)
+        registrar_cambios(Parada, [p.id for p in cambiadas])
+
+    trazado = codificar_trazado([(float(p.coordenada_lat), float(p.coordenada_lng)) for p in activas])
+    if Ruta.objects.filter(pk=ruta_id).exclude(trazado=trazado).update(trazado=trazado):
+        transaction.on_commit(indice_rutas.invalidar)
+    invalidar_geometria(ruta_id)
+    return len(cambiadas)
@@ -0,0 +1,271 @@
+"""Importación masiva de las paradas de una ruta desde CSV o GeoJSON.
+
+Todas las filas se validan en memoria antes de escribir; si alguna falla no
+se toca la base de datos. Las escrituras (altas, cambios, bajas y la nueva
+numeración de `orden`) van en una sola transacción con operaciones
+masivas, y la geometría, la versión de la ruta y las cachés derivadas se
+actualizan una sola vez al final (`secuencia.confirmar_edicion`), en vez
+de una vez por parada como ocurre con las señales de `save()`.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from rutas.models import Ruta
+
+from . import geo
+from .models import Parada
+from .secuencia import borrar_paradas, confirmar_edicion
+
+
+FORMATO_CSV = "csv"
+FORMATO_GEOJSON = "geojson"
+FORMATOS = (FORMATO_CSV, FORMATO_GEOJSON)
+
+CAMPOS_ACTUALIZABLES = [
+    "nombre", "direccion", "coordenada_lat", "coordenada_lng", "geohash", "orden", "activa",
+    "fecha_actualizacion",
+]
+
+# Nombres de columna aceptados en CSV -> campo
+ALIAS_CSV = {
+    "lat": "coordenada_lat",
+    "latitud": "coordenada_lat",
+    "lng": "coordenada_lng",
+    "lon": "coordenada_lng",
+    "longitud": "coordenada_lng",
+}
+
+VERDADEROS = {"1", "true", "t", "si", "sí", "s", "yes", "y"}
+FALSOS = {"0", "false", "f", "no", "n"}
+
+
+class ErrorFormato(ValueError):
+    """El archivo no se pudo leer como el formato indicado."""
+
+
+def detectar_formato(nombre_archivo):
+    nombre = (nombre_archivo or "").lower()
+    if nombre.endswith((".geojson", ".json")):
+        return FORMATO_GEOJSON
+    if nombre.endswith(".csv"):
+        return FORMATO_CSV
+    return None
+
+
+def leer_csv(texto):
+    """Filas del CSV como diccionarios con los nombres de campo normalizados."""
+    lector = csv.DictReader(io.StringIO(texto.lstrip("\ufeff")))
+    if not lector.fieldnames:
+        raise ErrorFormato("El CSV está vacío o no tiene encabezado.")
+    filas = []
+    for fila in lector:
+        normalizada = {}
+        for columna, valor in fila.items():
+            if columna is None:
+                continue
+            clave = columna.strip().lower()
+            normalizada[ALIAS_CSV.get(clave, clave)] = valor.strip() if isinstance(valor, str) else valor
+        filas.append(normalizada)
+    return filas
+
+
+def leer_geojson(datos):
+    """Filas a partir de una FeatureCollection de puntos (texto o ya decodificada)."""
+    if isinstance(datos, (str, bytes)):
+        try:
+            datos = json.loads(datos)
+        except ValueError as exc:
+            raise ErrorFormato(f"GeoJSON inválido: {exc}")
+    if not isinstance(datos, dict) or datos.get("type") != "FeatureCollection":
+        raise ErrorFormato("Se esperaba una FeatureCollection de GeoJSON.")
+    filas = []
+    for feature in datos.get("features") or []:
+        feature = feature if isinstance(feature, dict) else {}
+        fila = dict(feature.get("properties") or {})
+        geometria = feature.get("geometry") or {}
+        coordenadas = geometria.get("coordinates")
+        if geometria.get("type") == "Point" and isinstance(coordenadas, list) and len(coordenadas) >= 2:
+            # GeoJSON ordena las coordenadas como [longitud, latitud]
+            fila["coordenada_lng"], fila["coordenada_lat"] = coordenadas[0], coordenadas[1]
+        if "id" not in fila and feature.get("id") is not None:
+            fila["id"] = feature["id"]
+        filas.append(fila)
+    return filas
+
+
+def leer(contenido, formato):
+    if formato == FORMATO_CSV:
+        if isinstance(contenido, bytes):
+            contenido = contenido.decode("utf-8-sig")
+        return leer_csv(contenido)
+    if formato == FORMATO_GEOJSON:
+        return leer_geojson(contenido)
+    raise ErrorFormato(f"Formato no soportado; use uno de: {', '.join(FORMATOS)}.")
+
+
+def _decimal(valor, minimo, maximo):
+    try:
+        numero = Decimal(str(valor).strip())
+    except (InvalidOperation, ValueError):
+        raise ValueError("Debe ser un número.")
+    if not numero.is_finite() or not minimo <= numero <= maximo:
+        raise ValueError(f"Debe estar entre {minimo} y {maximo}.")
+    return numero.quantize(Decimal("0.000001"))
+
+
+def _booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    texto = str(valor).strip().lower()
+    if texto in VERDADEROS:
+        return True
+    if texto in FALSOS:
+        return False
+    raise ValueError("Debe ser verdadero o falso.")
+
+
+def _entero(valor):
+    if isinstance(valor, bool):
+        raise ValueError("Debe ser un número entero.")
+    try:
+        return int(str(valor).strip())
+    except ValueError:
+        raise ValueError("Debe ser un número entero.")
+
+
+def validar_fila(fila):
+    """Devuelve `(datos, errores)` con los valores ya convertidos a los tipos del modelo."""
+    datos, errores = {}, {}
+
+    nombre = str(fila.get("nombre") or "").strip()
+    if not nombre:
+        errores["nombre"] = ["Este campo es obligatorio."]
+    elif len(nombre) > 200:
+        errores["nombre"] = ["No puede tener más de 200 caracteres."]
+    datos["nombre"] = nombre
+
+    direccion = str(fila.get("direccion") or "").strip()
+    if len(direccion) > 300:
+        errores["direccion"] = ["No puede tener más de 300 caracteres."]
+    datos["direccion"] = direccion
+
+    for campo, limite in (("coordenada_lat", 90), ("coordenada_lng", 180)):
+        valor = fila.get(campo)
+        if valor in (None, ""):
+            errores[campo] = ["Este campo es obligatorio."]
+            continue
+        try:
+            datos[campo] = _decimal(valor, -limite, limite)
+        except ValueError as exc:
+            errores[campo] = [str(exc)]
+
+    for campo, conversor in (("id", _entero), ("orden", _entero), ("activa", _booleano)):
+        valor = fila.get(campo)
+        if valor in (None, ""):
+            continue
+        try:
+            datos[campo] = conversor(valor)
+        except ValueError as exc:
+            errores[campo] = [str(exc)]
+    return datos, errores
+
+
+def importar_paradas(ruta, filas, reemplazar=False):
+    """
+    Crea o actualiza las paradas de `ruta` a partir de `filas` (dicts).
+
+    Cada fila se asocia a una parada existente de la ruta por `id` o, si no
+    lo trae, por `nombre`; si no hay coincidencia se crea. El `orden` de la
+    fila (o su posición en el archivo) solo decide la secuencia: las paradas
+    importadas se renumeran 1..n y las existentes que no aparecen quedan
+    detrás conservando su orden relativo, o se eliminan con `reemplazar`.
+
+    Devuelve un dict con `creadas`, `actualizadas`, `eliminadas`, `errores`
+    (lista de `{"indice", "errores"}`; si hay errores no se escribe nada) y
+    la `version` de la ruta.
+
+    Como `secuencia.aplicar_operaciones`, todo ocurre con la fila de la ruta
+    bloqueada: otra importación o edición de la secuencia espera a que esta
+    termine en lugar de trabajar sobre una lista de paradas ya vieja, y la
+    versión que sube al escribir hace que los editores con la anterior
+    reciban 409.
+    """
+    with transaction.atomic():
+        ruta = Ruta.objects.select_for_update().get(pk=ruta.pk)
+        return _importar(ruta, filas, reemplazar)
+
+
+def _importar(ruta, filas, reemplazar):
+    existentes = list(Parada.objects.filter(ruta=ruta).order_by("orden", "id"))
+    por_id = {parada.id: parada for parada in existentes}
+    por_nombre = {}
+    for parada in existentes:
+        por_nombre.setdefault(parada.nombre.casefold(), parada)
+
+    validas, errores, usadas = [], [], set()
+    for indice, fila in enumerate(filas):
+        datos, errores_fila = validar_fila(fila if isinstance(fila, dict) else {})
+        parada = None
+        if "id" in datos:
+            parada = por_id.get(datos["id"])
+            if parada is None:
+                errores_fila.setdefault("id", []).append("No existe una parada con ese id en la ruta.")
+        elif datos.get("nombre"):
+            parada = por_nombre.get(datos["nombre"].casefold())
+        if parada is not None:
+            if parada.id in usadas:
+                errores_fila.setdefault("id", []).append("La parada aparece más de una vez en el archivo.")
+            usadas.add(parada.id)
+        if errores_fila:
+            errores.append({"indice": indice, "errores": errores_fila})
+        else:
+            validas.append((datos.get("orden", indice), indice, datos, parada))
+
+    resultado = {"creadas": 0, "actualizadas": 0, "eliminadas": 0, "errores": errores, "version": ruta.version}
+    if errores:
+        return resultado
+
+    validas.sort(key=lambda item: item[:2])
+    ahora = timezone.now()
+    nuevas, modificadas = [], []
+    for orden, (_, _, datos, parada) in enumerate(validas, start=1):
+        if parada is None:
+            parada = Parada(ruta=ruta)
+            nuevas.append(parada)
+        else:
+            modificadas.append(parada)
+        parada.nombre = datos["nombre"]
+        parada.direccion = datos["direccion"]
+        parada.coordenada_lat = datos["coordenada_lat"]
+        parada.coordenada_lng = datos["coordenada_lng"]
+        parada.activa = datos.get("activa", True if parada.pk is None else parada.activa)
+        parada.orden = orden
+        parada.fecha_actualizacion = ahora
+        # bulk_create/bulk_update no pasan por Parada.save()
+        parada.geohash = geo.geohash(float(parada.coordenada_lat), float(parada.coordenada_lng))
+
+    restantes = [parada for parada in existentes if parada.id not in usadas]
+    if not reemplazar:
+        for orden, parada in enumerate(restantes, start=len(validas) + 1):
+            if parada.orden != orden:
+                parada.orden = orden
+                parada.fecha_actualizacion = ahora
+                modificadas.append(parada)
+
+    eliminadas = [parada.id for parada in restantes] if reemplazar else []
+    borrar_paradas(eliminadas)
+    Parada.objects.bulk_create(nuevas, batch_size=500)
+    Parada.objects.bulk_update(modificadas, CAMPOS_ACTUALIZABLES, batch_size=500)
+    confirmar_edicion(ruta.id, [parada.id for parada in nuevas + modificadas], eliminadas)
+
+    resultado["eliminadas"] = len(eliminadas)
+    resultado["version"] = ruta.version + 1
+
+    resultado["creadas"] = len(nuevas)
+    resultado["actualizadas"] = len(modificadas)
+    return resultado
@@ -0,0 +1,167 @@
+"""Índice espacial en memoria (KD-tree) de las paradas activas.
+
+Cada proceso mantiene un `IndiceParadas` con los vectores unitarios 3D de
+las paradas activas y su representación ya serializada, de modo que las
+búsquedas de proximidad no tocan la base de datos ni serializan Decimals.
+
+- Se construye de forma perezosa en la primera consulta.
+- Las señales `post_save`/`post_delete` de `Parada` actualizan o retiran
+  solo la parada afectada (al confirmar la transacción); el árbol se
+  reconstruye desde memoria en la siguiente consulta.
+- La versión compartida de `rutas.versiones` permite que los demás
+  procesos detecten el cambio y recarguen.
+"""
+import heapq
+import math
+import threading
+
+from rutas import versiones
+
+from .geo import RADIO_TIERRA_M
+
+
+CLAVE_VERSION = "paradas:indice:version"
+
+
+def vector_unitario(lat, lng):
+    p, l = math.radians(lat), math.radians(lng)
+    return (math.cos(p) * math.cos(l), math.cos(p) * math.sin(l), math.sin(p))
+
+
+def cuerda_desde_metros(metros):
+    """Longitud de cuerda (esfera unidad) equivalente a una distancia en superficie."""
+    return 2 * math.sin(min(metros / RADIO_TIERRA_M, math.pi) / 2)
+
+
+def metros_desde_cuerda(cuerda):
+    return 2 * RADIO_TIERRA_M * math.asin(min(cuerda / 2, 1.0))
+
+
+class KDTree:
+    """KD-tree estático de puntos 3D `(x, y, z, clave)`."""
+
+    def __init__(self, puntos):
+        # Cada nodo: [x, y, z, clave, eje, izquierdo, derecho]
+        self.nodos = []
+        self.raiz = self._construir(list(puntos), 0)
+
+    def __len__(self):
+        return len(self.nodos)
+
+    def _construir(self, puntos, profundidad):
+        if not puntos:
+            return -1
+        eje = profundidad % 3
+        puntos.sort(key=lambda p: p[eje])
+        medio = len(puntos) // 2
+        x, y, z, clave = puntos[medio]
+        indice = len(self.nodos)
+        self.nodos.append([x, y, z, clave, eje, -1, -1])
+        self.nodos[indice][5] = self._construir(puntos[:medio], profundidad + 1)
+        self.nodos[indice][6] = self._construir(puntos[medio + 1:], profundidad + 1)
+        return indice
+
+    def vecinos(self, objetivo, k, maximo2=math.inf):
+        """Los `k` puntos más cercanos con distancia² <= `maximo2`: lista de (d², clave)."""
+        mejores = []  # montículo de (-d², clave)
+        limite = maximo2
+        # (nodo, cota inferior de d² para todo su subárbol)
+        pila = [(self.raiz, 0.0)]
+        while pila:
+            indice, cota = pila.pop()
+            if indice < 0 or cota > limite:
+                continue
+            x, y, z, clave, eje, izquierdo, derecho = self.nodos[indice]
+            d2 = (x - objetivo[0]) ** 2 + (y - objetivo[1]) ** 2 + (z - objetivo[2]) ** 2
+            if d2 <= limite:
+                if len(mejores) == k:
+                    heapq.heapreplace(mejores, (-d2, clave))
+                else:
+                    heapq.heappush(mejores, (-d2, clave))
+                if len(mejores) == k:
+                    limite = -mejores[0][0]
+            diferencia = objetivo[eje] - (x, y, z)[eje]
+            cercano, lejano = (izquierdo, derecho) if diferencia < 0 else (derecho, izquierdo)
+            # El lado lejano se apila primero para explorarlo después del cercano
+            pila.append((lejano, diferencia * diferencia))
+            pila.append((cercano, cota))
+        return sorted((-d2, clave) for d2, clave in mejores)
+
+
+class IndiceParadas:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._paradas = None  # id -> (vector, datos serializados)
+        self._arbol = None
+        self._version = None
+
+    def _cargar(self):
+        from .models import Parada
+        from .serializers import ParadaListSerializer
+
+        paradas = list(Parada.objects.filter(activa=True).select_related("ruta"))
+        datos = ParadaListSerializer(paradas, many=True).data
+        self._paradas = {
+            parada.id: (vector_unitario(float(parada.coordenada_lat), float(parada.coordenada_lng)), dict(item))
+            for parada, item in zip(paradas, datos)
+        }
+        self._arbol = None
+
+    def _preparado(self):
+        with self._lock:
+            version = versiones.actual(CLAVE_VERSION)
+            if self._paradas is None or version != self._version:
+                self._cargar()
+                self._version = version
+            if self._arbol is None:
+                self._arbol = KDTree((*vector, pk) for pk, (vector, _) in self._paradas.items())
+            return self._arbol, self._paradas
+
+    def cercanas(self, lat, lng, radio_m=None, limite=20):
+        """Paradas activas más cercanas: lista de `(distancia_m, datos)` ordenada."""
+        arbol, paradas = self._preparado()
+        maximo = cuerda_desde_metros(radio_m) ** 2 if radio_m is not None else math.inf
+        return [
+            (metros_desde_cuerda(math.sqrt(d2)), paradas[pk][1])
+            for d2, pk in arbol.vecinos(vector_unitario(lat, lng), limite, maximo)
+        ]
+
+    def actualizar(self, parada):
+        """Inserta, reemplaza o retira (si está inactiva) una parada del índice."""
+        from .serializers import ParadaListSerializer
+
+        with self._lock:
+            if self._paradas is None:
+                versiones.avanzar(CLAVE_VERSION)
+                return
+            al_dia = versiones.actual(CLAVE_VERSION) == self._version
+            if parada.activa:
+                vector = vector_unitario(float(parada.coordenada_lat), float(parada.coordenada_lng))
+                self._paradas[parada.id] = (vector, dict(ParadaListSerializer(parada).data))
+            else:
+                self._paradas.pop(parada.id, None)
+            self._arbol = None
+            self._marcar(al_dia)
+
+    def retirar(self, parada_id):
+        with self._lock:
+            al_dia = versiones.actual(CLAVE_VERSION) == self._version
+            if self._paradas is not None and self._paradas.pop(parada_id, None) is not None:
+                self._arbol = None
+            self._marcar(al_dia)
+
+    def _marcar(self, al_dia):
+        # Avisa a los demás procesos; este queda al día solo si ya lo estaba
+        # antes del cambio (si no, le faltan cambios de otros y debe recargar)
+        version = versiones.avanzar(CLAVE_VERSION)
+        self._version = version if al_dia else None
+
+    def invalidar(self):
+        """Fuerza una recarga completa (p. ej. si cambia el nombre de una ruta)."""
+        with self._lock:
+            self._paradas = None
+            self._arbol = None
+            versiones.avanzar(CLAVE_VERSION)
+
+
+indice_paradas = IndiceParadas()
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from paradas.segmentos import procesar_segmentos
+
+
+class Command(BaseCommand):
+    help = "Acumula los tiempos de viaje entre paradas a partir de las posiciones GPS nuevas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, help="Filas leídas por bloque (por defecto GPS_LOTE_TAMANO)")
+
+    def handle(self, *args, **options):
+        resultado = procesar_segmentos(lote=options["lote"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Procesadas {resultado['posiciones']} posiciones; {resultado['segmentos']} franjas actualizadas."
+        ))
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paradas import importacion
+from rutas.models import Ruta
+
+
+class Command(BaseCommand):
+    help = "Importa las paradas de una ruta desde un archivo CSV o GeoJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("ruta", type=int, help="ID de la ruta")
+        parser.add_argument("archivo", help="Ruta del archivo .csv o .geojson")
+        parser.add_argument("--formato", choices=importacion.FORMATOS, help="Por defecto se deduce de la extensión")
+        parser.add_argument(
+            "--reemplazar",
+            action="store_true",
+            help="Elimina las paradas de la ruta que no aparezcan en el archivo",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            ruta = Ruta.objects.get(pk=options["ruta"])
+        except Ruta.DoesNotExist:
+            raise CommandError(f"No existe la ruta {options['ruta']}.")
+        archivo = Path(options["archivo"])
+        if not archivo.is_file():
+            raise CommandError(f"No se encontró el archivo {archivo}.")
+
+        formato = options["formato"] or importacion.detectar_formato(archivo.name)
+        try:
+            filas = importacion.leer(archivo.read_bytes(), formato)
+        except (importacion.ErrorFormato, UnicodeDecodeError) as exc:
+            raise CommandError(str(exc))
+
+        resultado = importacion.importar_paradas(ruta, filas, reemplazar=options["reemplazar"])
+        if resultado["errores"]:
+            for error in resultado["errores"]:
+                self.stderr.write(f"Fila {error['indice'] + 1}: {error['errores']}")
+            raise CommandError("No se importó ninguna parada por errores de validación.")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['creadas']} paradas creadas, {resultado['actualizadas']} actualizadas "
+            f"y {resultado['eliminadas']} eliminadas en la ruta {ruta}."
+        ))
@@ -0,0 +1,236 @@
+"""Capas de mapa precalculadas: GeoJSON por ruta y teselas vectoriales (MVT).
+
+Cada respuesta se genera una vez, se guarda en la caché ya serializada y
+comprimida con gzip, y se sirve con un ETag fuerte. Las claves llevan la
+versión de la ruta (GeoJSON) o la generación global del mapa (teselas),
+que `invalidar_mapa` avanza cada vez que cambia la secuencia de paradas de
+una ruta; con la caché caliente una petición no toca el ORM.
+
+Las vistas son `APIView` de DRF, con la misma autenticación y permisos por
+defecto que `ParadaViewSet`; devuelven el blob como `HttpResponse`.
+"""
+import gzip
+import hashlib
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework import status
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from rutas import versiones
+from rutas.models import Ruta
+
+from . import vectorial
+from .models import Parada
+
+
+CLAVE_GENERACION = "paradas:mapa:generacion"
+
+TIPO_GEOJSON = "application/geo+json"
+TIPO_MVT = "application/vnd.mapbox-vector-tile"
+
+Blob = namedtuple("Blob", "etag cuerpo comprimido")
+
+_datos = (None, None)  # (generación, rutas con sus paradas activas)
+
+
+def clave_version(ruta_id):
+    return f"rutas:version:{ruta_id}"
+
+
+def version_ruta(ruta_id):
+    """Versión de la ruta, leída de la caché; `None` si la ruta no existe."""
+    version = cache.get(clave_version(ruta_id))
+    if version is None:
+        version = Ruta.objects.filter(pk=ruta_id).values_list("version", flat=True).first()
+        if version is not None:
+            cache.set(clave_version(ruta_id), version, None)
+    return version
+
+
+def generacion():
+    return versiones.actual(CLAVE_GENERACION)
+
+
+def invalidar_mapa(ruta_id):
+    """Llamar tras confirmar un cambio en la secuencia de paradas de la ruta."""
+    cache.delete(clave_version(ruta_id))
+    versiones.avanzar(CLAVE_GENERACION)
+
+
+def _blob(contenido):
+    return Blob(hashlib.sha1(contenido).hexdigest()[:24], contenido, gzip.compress(contenido, mtime=0))
+
+
+def _cacheado(clave, generar):
+    blob = cache.get(clave)
+    if blob is None:
+        blob = _blob(generar())
+        cache.set(clave, blob, settings.PARADAS_MAPA_CACHE_SEGUNDOS)
+    return blob
+
+
+def geojson_ruta(ruta_id):
+    """Blob con la FeatureCollection de la ruta, o `None` si la ruta no existe."""
+    version = version_ruta(ruta_id)
+    if version is None:
+        return None
+
+    def generar():
+        paradas = list(
+            Parada.objects.filter(ruta_id=ruta_id).order_by("orden", "id")
+            .values_list("id", "nombre", "coordenada_lat", "coordenada_lng", "orden", "activa")
+        )
+        features = [
+            {
+                "type": "Feature",
+                "id": pk,
+                "geometry": {"type": "Point", "coordinates": [float(lng), float(lat)]},
+                "properties": {"tipo": "parada", "nombre": nombre, "ruta": ruta_id, "orden": orden, "activa": activa},
+            }
+            for pk, nombre, lat, lng, orden, activa in paradas
+        ]
+        linea = [[float(lng), float(lat)] for _, _, lat, lng, _, activa in paradas if activa]
+        if len(linea) >= 2:
+            features.insert(0, {
+                "type": "Feature",
+                "id": f"ruta-{ruta_id}",
+                "geometry": {"type": "LineString", "coordinates": linea},
+                "properties": {"tipo": "ruta", "ruta": ruta_id, "version": version},
+            })
+        coleccion = {"type": "FeatureCollection", "features": features}
+        return json.dumps(coleccion, ensure_ascii=False, separators=(",", ":")).encode()
+
+    return _cacheado(f"paradas:geojson:{ruta_id}:{version}", generar)
+
+
+def datos_mapa():
+    """Paradas activas agrupadas por ruta y en orden, memorizadas por generación."""
+    global _datos
+    actual = generacion()
+    if _datos[0] != actual:
+        rutas = {}
+        filas = (
+            Parada.objects.filter(activa=True).order_by("ruta_id", "orden", "id")
+            .values_list("ruta_id", "id", "nombre", "coordenada_lat", "coordenada_lng", "orden")
+        )
+        for ruta_id, pk, nombre, lat, lng, orden in filas:
+            rutas.setdefault(ruta_id, []).append((pk, nombre, float(lat), float(lng), orden))
+        _datos = (actual, rutas)
+    return _datos[1]
+
+
+def _tramos_visibles(puntos, limites, z, x, y):
+    """Partes de la polilínea cuyos segmentos tocan la tesela, ya proyectadas."""
+    lat_min, lng_min, lat_max, lng_max = limites
+    tramos, tramo = [], []
+    for (lat1, lng1), (lat2, lng2) in zip(puntos, puntos[1:]):
+        visible = (
+            min(lat1, lat2) <= lat_max and max(lat1, lat2) >= lat_min
+            and min(lng1, lng2) <= lng_max and max(lng1, lng2) >= lng_min
+        )
+        if not visible:
+            if len(tramo) >= 2:
+                tramos.append(tramo)
+            tramo = []
+            continue
+        for lat, lng in ((lat1, lng1), (lat2, lng2)) if not tramo else ((lat2, lng2),):
+            pixel = vectorial.proyectar(lat, lng, z, x, y)
+            if not tramo or tramo[-1] != pixel:
+                tramo.append(pixel)
+    if len(tramo) >= 2:
+        tramos.append(tramo)
+    return tramos
+
+
+def tesela(z, x, y):
+    """Blob MVT con las capas `rutas` y `paradas` de la tesela z/x/y."""
+
+    def generar():
+        lat_min, lng_min, lat_max, lng_max = vectorial.limites_tesela(z, x, y)
+        margen = settings.PARADAS_MVT_MARGEN / vectorial.EXTENSION
+        dlat, dlng = (lat_max - lat_min) * margen, (lng_max - lng_min) * margen
+        limites = (lat_min - dlat, lng_min - dlng, lat_max + dlat, lng_max + dlng)
+
+        capa_rutas = vectorial.Capa("rutas")
+        capa_paradas = vectorial.Capa("paradas")
+        for ruta_id, paradas in datos_mapa().items():
+            tramos = _tramos_visibles([(lat, lng) for _, _, lat, lng, _ in paradas], limites, z, x, y)
+            if tramos:
+                capa_rutas.linea(ruta_id, tramos, {"ruta": ruta_id})
+            for pk, nombre, lat, lng, orden in paradas:
+                if limites[0] <= lat <= limites[2] and limites[1] <= lng <= limites[3]:
+                    px, py = vectorial.proyectar(lat, lng, z, x, y)
+                    capa_paradas.punto(pk, px, py, {"nombre": nombre, "ruta": ruta_id, "orden": orden})
+        return vectorial.codificar_tesela([capa_rutas, capa_paradas])
+
+    return _cacheado(f"paradas:mvt:{generacion()}:{z}:{x}:{y}", generar)
+
+
+def _acepta_gzip(request):
+    for codificacion in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        nombre, _, parametros = codificacion.strip().partition(";")
+        if nombre.strip().lower() == "gzip":
+            return parametros.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _servir(request, blob, tipo):
+    usar_gzip = _acepta_gzip(request)
+    etag = f'"{blob.etag}-gz"' if usar_gzip else f'"{blob.etag}"'
+    recibidos = [valor.strip().removeprefix("W/") for valor in request.META.get("HTTP_IF_NONE_MATCH", "").split(",")]
+    if etag in recibidos or "*" in recibidos:
+        respuesta = HttpResponseNotModified()
+    else:
+        respuesta = HttpResponse(blob.comprimido if usar_gzip else blob.cuerpo, content_type=tipo)
+        if usar_gzip:
+            respuesta["Content-Encoding"] = "gzip"
+    respuesta["ETag"] = etag
+    respuesta["Vary"] = "Accept-Encoding"
+    # Requiere autenticación: solo la caché del propio cliente puede guardarla
+    respuesta["Cache-Control"] = "private, no-cache"
+    return respuesta
+
+
+class SinNegociacion(DefaultContentNegotiation):
+    """El cuerpo ya viene serializado; el renderer (JSON) solo se usa para los errores."""
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class MapaView(APIView):
+    # Los clientes de mapas piden `Accept: application/vnd.mapbox-vector-tile`,
+    # que con la negociación por defecto terminaría en 406
+    content_negotiation_class = SinNegociacion
+
+
+class GeoJSONParadasView(MapaView):
+    """GET /api/paradas/geojson/?ruta={id} - Paradas y trazado de la ruta en GeoJSON."""
+
+    def get(self, request):
+        try:
+            ruta_id = int(request.query_params["ruta"])
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "El parámetro 'ruta' es requerido y debe ser un entero."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        blob = geojson_ruta(ruta_id)
+        if blob is None:
+            return Response({"error": "La ruta no existe."}, status=status.HTTP_404_NOT_FOUND)
+        return _servir(request, blob, TIPO_GEOJSON)
+
+
+class TeselaParadasView(MapaView):
+    """GET /api/paradas/tiles/{z}/{x}/{y}.mvt - Rutas y paradas como tesela vectorial."""
+
+    def get(self, request, z, x, y):
+        if z > settings.PARADAS_MVT_ZOOM_MAXIMO or x >= 1 << z or y >= 1 << z:
+            return Response({"error": "Tesela fuera de rango."}, status=status.HTTP_400_BAD_REQUEST)
+        return _servir(request, tesela(z, x, y), TIPO_MVT)
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paradas', '0001_initial'),
+        ('rutas', '0004_remove_bus_ruta_ruta_buses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcesoSegmentos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_posicion', models.BigIntegerField(default=0)),
+                ('estado', models.JSONField(blank=True, default=dict)),
+                ('fecha_ejecucion', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Proceso de segmentos',
+                'verbose_name_plural': 'Proceso de segmentos',
+            },
+        ),
+        migrations.CreateModel(
+            name='TiempoSegmento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(help_text='0 = lunes ... 6 = domingo')),
+                ('hora', models.PositiveSmallIntegerField(help_text='Hora del día (0-23) de salida del origen')),
+                ('muestras', models.PositiveIntegerField(default=0)),
+                ('suma_segundos', models.FloatField(default=0)),
+                ('suma_cuadrados', models.FloatField(default=0)),
+                ('minimo_segundos', models.FloatField(blank=True, null=True)),
+                ('maximo_segundos', models.FloatField(blank=True, null=True)),
+                ('parada_destino', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiempos_llegada', to='paradas.parada')),
+                ('parada_origen', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiempos_salida', to='paradas.parada')),
+                ('ruta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tiempos_segmento', to='rutas.ruta')),
+            ],
+            options={
+                'verbose_name': 'Tiempo de segmento',
+                'verbose_name_plural': 'Tiempos de segmento',
+                'indexes': [models.Index(fields=['ruta'], name='paradas_tie_ruta_id_2bd115_idx')],
+                'constraints': [models.UniqueConstraint(fields=('parada_origen', 'parada_destino', 'dia_semana', 'hora'), name='unique_tiempo_segmento_por_franja')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:39
+
+from django.db import migrations, models
+
+from paradas.geo import geohash
+
+
+def calcular_geohash(apps, schema_editor):
+    Parada = apps.get_model("paradas", "Parada")
+    paradas = list(Parada.objects.only("id", "coordenada_lat", "coordenada_lng"))
+    for parada in paradas:
+        parada.geohash = geohash(float(parada.coordenada_lat), float(parada.coordenada_lng))
+    Parada.objects.bulk_update(paradas, ["geohash"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paradas', '0002_tiempos_segmento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parada',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Celda geohash de las coordenadas; se recalcula al guardar', max_length=12),
+        ),
+        migrations.RunPython(calcular_geohash, migrations.RunPython.noop),
+    ]
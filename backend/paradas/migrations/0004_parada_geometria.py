@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:41
+
+from django.db import migrations, models
+
+from paradas.geo import haversine_m, rumbo_grados
+
+
+def calcular_geometria(apps, schema_editor):
+    Parada = apps.get_model("paradas", "Parada")
+    paradas = list(Parada.objects.filter(activa=True).order_by("ruta_id", "orden", "id"))
+    for i, actual in enumerate(paradas):
+        anterior = paradas[i - 1] if i and paradas[i - 1].ruta_id == actual.ruta_id else None
+        if anterior is None:
+            actual.distancia_acumulada_m = 0.0
+        else:
+            actual.distancia_acumulada_m = anterior.distancia_acumulada_m + anterior.longitud_segmento_m
+        siguiente = paradas[i + 1] if i + 1 < len(paradas) and paradas[i + 1].ruta_id == actual.ruta_id else None
+        if siguiente is not None:
+            puntos = (
+                float(actual.coordenada_lat), float(actual.coordenada_lng),
+                float(siguiente.coordenada_lat), float(siguiente.coordenada_lng),
+            )
+            actual.longitud_segmento_m = haversine_m(*puntos)
+            actual.rumbo_siguiente = rumbo_grados(*puntos)
+    Parada.objects.bulk_update(
+        paradas, ["distancia_acumulada_m", "longitud_segmento_m", "rumbo_siguiente"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paradas', '0003_parada_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parada',
+            name='distancia_acumulada_m',
+            field=models.FloatField(blank=True, editable=False, help_text='Metros desde la primera parada activa de la ruta', null=True),
+        ),
+        migrations.AddField(
+            model_name='parada',
+            name='longitud_segmento_m',
+            field=models.FloatField(blank=True, editable=False, help_text='Metros hasta la siguiente parada activa', null=True),
+        ),
+        migrations.AddField(
+            model_name='parada',
+            name='rumbo_siguiente',
+            field=models.FloatField(blank=True, editable=False, help_text='Rumbo en grados (0 = norte) hacia la siguiente parada activa', null=True),
+        ),
+        migrations.RunPython(calcular_geometria, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paradas', '0004_parada_geometria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='procesosegmentos',
+            name='pendientes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from rutas.models import Ruta
+
+from . import geo
 # from gps.models import GPSPosicion
 
 
@@ -50,6 +52,31 @@ class Parada(models.Model):
         default=True,
         verbose_name="Parada activa"
     )
+    distancia_acumulada_m = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Metros desde la primera parada activa de la ruta"
+    )
+    longitud_segmento_m = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Metros hasta la siguiente parada activa"
+    )
+    rumbo_siguiente = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Rumbo en grados (0 = norte) hacia la siguiente parada activa"
+    )
+    geohash = models.CharField(
+        max_length=12,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text="Celda geohash de las coordenadas; se recalcula al guardar"
+    )
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
@@ -65,6 +92,13 @@ class Parada(models.Model):
     def __str__(self):
         return f"{self.nombre} - {self.ruta.nombre_ruta if self.ruta else 'Sin ruta'}"
 
+    def save(self, *args, **kwargs):
+        self.geohash = geo.geohash(float(self.coordenada_lat), float(self.coordenada_lng))
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"coordenada_lat", "coordenada_lng"} & set(update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"geohash"}
+        super().save(*args, **kwargs)
+
     @property
     def coordenadas(self):
         """Retorna las coordenadas como un diccionario."""
@@ -72,3 +106,64 @@ class Parada(models.Model):
             "lat": float(self.coordenada_lat),
             "lng": float(self.coordenada_lng)
         }
+
+
+class TiempoSegmento(models.Model):
+    """Distribución histórica del tiempo de viaje entre dos paradas consecutivas.
+
+    Un registro por (segmento, día de la semana, hora del día), acumulado de
+    forma incremental por `paradas.segmentos.procesar_segmentos`.
+    """
+
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name="tiempos_segmento")
+    parada_origen = models.ForeignKey(Parada, on_delete=models.CASCADE, related_name="tiempos_salida")
+    parada_destino = models.ForeignKey(Parada, on_delete=models.CASCADE, related_name="tiempos_llegada")
+    dia_semana = models.PositiveSmallIntegerField(help_text="0 = lunes ... 6 = domingo")
+    hora = models.PositiveSmallIntegerField(help_text="Hora del día (0-23) de salida del origen")
+    muestras = models.PositiveIntegerField(default=0)
+    suma_segundos = models.FloatField(default=0)
+    suma_cuadrados = models.FloatField(default=0)
+    minimo_segundos = models.FloatField(null=True, blank=True)
+    maximo_segundos = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tiempo de segmento"
+        verbose_name_plural = "Tiempos de segmento"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["parada_origen", "parada_destino", "dia_semana", "hora"],
+                name="unique_tiempo_segmento_por_franja",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["ruta"]),
+        ]
+
+    def __str__(self):
+        return f"{self.parada_origen_id}->{self.parada_destino_id} d{self.dia_semana} h{self.hora}"
+
+    @property
+    def media_segundos(self):
+        return self.suma_segundos / self.muestras if self.muestras else None
+
+
+class ProcesoSegmentos(models.Model):
+    """Marca de avance del cálculo incremental de tiempos de segmento (fila única).
+
+    - ultima_posicion: mayor id de `GPSPosicion` ya procesado
+    - estado: último cruce de parada de cada bus, para continuar entre ejecuciones
+    - pendientes: rangos `[desde, hasta, visto]` de ids por debajo de la marca
+      que aún no se habían confirmado cuando se leyó (ver `segmentos`)
+    """
+
+    ultima_posicion = models.BigIntegerField(default=0)
+    estado = models.JSONField(default=dict, blank=True)
+    pendientes = models.JSONField(default=list, blank=True)
+    fecha_ejecucion = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Proceso de segmentos"
+        verbose_name_plural = "Proceso de segmentos"
+
+    def __str__(self):
+        return f"Segmentos procesados hasta la posición {self.ultima_posicion}"
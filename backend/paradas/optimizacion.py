@@ -0,0 +1,166 @@
+"""Propuesta de orden de paradas más corto (heurística de viajante, camino abierto).
+
+Se parte del mejor entre el orden actual y el del vecino más cercano, y se
+mejora con 2-opt (invertir un tramo) y Or-opt (mover bloques de 1 a 3
+paradas, también invertidos) hasta que ninguna jugada acorta el recorrido
+o se agota el tiempo, que se revisa en cada posición de cada pasada. La
+primera y la última parada pueden quedar fijas.
+
+La matriz de distancias se calcula una vez (haversine, simétrica) como
+lista de filas; las mejoras solo hacen búsquedas en ella.
+"""
+import time
+
+from django.conf import settings
+
+from .geo import haversine_m
+
+
+def matriz_distancias(puntos):
+    n = len(puntos)
+    matriz = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        lat1, lng1 = puntos[i]
+        fila = matriz[i]
+        for j in range(i + 1, n):
+            distancia = haversine_m(lat1, lng1, *puntos[j])
+            fila[j] = distancia
+            matriz[j][i] = distancia
+    return matriz
+
+
+def longitud(orden, matriz):
+    return sum(matriz[a][b] for a, b in zip(orden, orden[1:]))
+
+
+def vecino_mas_cercano(matriz, inicio, fin=None):
+    n = len(matriz)
+    pendientes = set(range(n)) - {inicio, fin}
+    orden = [inicio]
+    while pendientes:
+        fila = matriz[orden[-1]]
+        siguiente = min(pendientes, key=fila.__getitem__)
+        pendientes.remove(siguiente)
+        orden.append(siguiente)
+    if fin is not None and fin != inicio:
+        orden.append(fin)
+    return orden
+
+
+def _dos_opt(orden, matriz, primero, ultimo, limite):
+    """Una pasada de 2-opt; `primero`/`ultimo` son las posiciones que pueden moverse."""
+    n = len(orden)
+    mejoro = False
+    for i in range(primero, ultimo):
+        if time.perf_counter() >= limite:
+            break
+        for j in range(i + 1, ultimo + 1):
+            a, b = orden[i], orden[j]
+            antes = orden[i - 1] if i > 0 else None
+            despues = orden[j + 1] if j + 1 < n else None
+            delta = 0.0
+            if antes is not None:
+                delta += matriz[antes][b] - matriz[antes][a]
+            if despues is not None:
+                delta += matriz[a][despues] - matriz[b][despues]
+            if delta < -1e-7:
+                orden[i:j + 1] = orden[i:j + 1][::-1]
+                mejoro = True
+    return mejoro
+
+
+def _or_opt(orden, matriz, primero, ultimo, limite):
+    """Una pasada de Or-opt con bloques de 1 a 3 paradas."""
+    n = len(orden)
+    mejoro = False
+    for largo in (1, 2, 3):
+        i = primero
+        while i + largo - 1 <= ultimo:
+            if time.perf_counter() >= limite:
+                return mejoro
+            bloque = orden[i:i + largo]
+            antes = orden[i - 1] if i > 0 else None
+            despues = orden[i + largo] if i + largo < n else None
+            # Ahorro de sacar el bloque y unir sus vecinos
+            quitar = 0.0
+            if antes is not None:
+                quitar += matriz[antes][bloque[0]]
+            if despues is not None:
+                quitar += matriz[bloque[-1]][despues]
+            if antes is not None and despues is not None:
+                quitar -= matriz[antes][despues]
+
+            resto = orden[:i] + orden[i + largo:]
+            mejor = (-1e-7, None, None)
+            # Posición k: el bloque queda entre resto[k-1] y resto[k]
+            for k in range(primero, min(ultimo - largo + 1, len(resto)) + 1):
+                if k == i:
+                    continue
+                izquierda = resto[k - 1] if k > 0 else None
+                derecha = resto[k] if k < len(resto) else None
+                for candidato in (bloque, bloque[::-1]):
+                    poner = 0.0
+                    if izquierda is not None:
+                        poner += matriz[izquierda][candidato[0]]
+                    if derecha is not None:
+                        poner += matriz[candidato[-1]][derecha]
+                    if izquierda is not None and derecha is not None:
+                        poner -= matriz[izquierda][derecha]
+                    delta = poner - quitar
+                    if delta < mejor[0]:
+                        mejor = (delta, k, candidato)
+            if mejor[1] is not None:
+                _, k, candidato = mejor
+                orden[:] = resto[:k] + candidato + resto[k:]
+                mejoro = True
+            i += 1
+    return mejoro
+
+
+def optimizar_orden(puntos, fijar_inicio=False, fijar_fin=False, tiempo_max=None):
+    """
+    Orden propuesto (índices de `puntos`) para recorrer todos los puntos con
+    el menor camino posible, partiendo del orden dado por la lista.
+    """
+    n = len(puntos)
+    if n < 3:
+        return list(range(n))
+    tiempo_max = settings.PARADAS_OPTIMIZACION_TIEMPO_MAX_S if tiempo_max is None else tiempo_max
+    limite = time.perf_counter() + tiempo_max
+    matriz = matriz_distancias(puntos)
+
+    actual = list(range(n))
+    fin = n - 1 if fijar_fin else None
+    candidatos = [actual, vecino_mas_cercano(matriz, 0, fin)]
+    if not fijar_inicio:
+        # Sin inicio fijo conviene arrancar desde un extremo del recorrido
+        extremo = max(range(n), key=matriz[0].__getitem__)
+        if extremo != fin:
+            candidatos.append(vecino_mas_cercano(matriz, extremo, fin))
+    orden = min(candidatos, key=lambda o: longitud(o, matriz))
+
+    primero = 1 if fijar_inicio else 0
+    ultimo = n - 2 if fijar_fin else n - 1
+    while time.perf_counter() < limite:
+        mejoro = _dos_opt(orden, matriz, primero, ultimo, limite)
+        mejoro = _or_opt(orden, matriz, primero, ultimo, limite) or mejoro
+        if not mejoro:
+            break
+    return orden
+
+
+def distancia_recorrido(paradas):
+    """Metros del camino que une las paradas en el orden dado."""
+    puntos = [(float(p.coordenada_lat), float(p.coordenada_lng)) for p in paradas]
+    return sum(haversine_m(*a, *b) for a, b in zip(puntos, puntos[1:]))
+
+
+def proponer_orden(paradas, fijar_inicio=False, fijar_fin=False):
+    """
+    `paradas`: paradas activas de la ruta en su orden actual.
+
+    Devuelve `(paradas en el orden propuesto, metros actuales, metros propuestos)`.
+    """
+    puntos = [(float(p.coordenada_lat), float(p.coordenada_lng)) for p in paradas]
+    propuesta = [paradas[i] for i in optimizar_orden(puntos, fijar_inicio=fijar_inicio, fijar_fin=fijar_fin)]
+    return propuesta, distancia_recorrido(paradas), distancia_recorrido(propuesta)
@@ -0,0 +1,226 @@
+"""Planificador de viajes origen–destino sobre el grafo de rutas y paradas.
+
+El grafo se compila en memoria una vez por generación del mapa (ver
+`paradas.mapa`, que avanza con cualquier cambio en la secuencia de paradas
+de una ruta) y cada consulta es un A* sobre él, sin tocar la base de datos.
+
+Cada parada activa da dos estados: "en la parada" y "a bordo" del bus de
+su ruta. Aristas:
+
+- a bordo en la parada i -> a bordo en la i+1 de la misma ruta (viaje en bus)
+- en la parada -> a bordo (abordaje, con una penalización fija que modela
+  la espera y hace que cada transbordo cueste)
+- a bordo -> en la parada (bajarse, sin costo)
+- en la parada -> en una parada cercana (caminata)
+
+El origen y el destino se enlazan caminando con las paradas dentro del
+radio de caminata; también se considera ir caminando directamente.
+"""
+import heapq
+import math
+import threading
+
+from django.conf import settings
+
+from rutas.models import Ruta
+
+from .geo import haversine_m
+from .indice import KDTree, cuerda_desde_metros, metros_desde_cuerda, vector_unitario
+from .mapa import datos_mapa, generacion
+
+
+class Grafo:
+    def __init__(self, rutas, nombres_ruta):
+        """`rutas`: {ruta_id: [(parada_id, nombre, lat, lng, orden), ...]} en orden de ruta."""
+        self.velocidad_bus = settings.PLANIFICADOR_VELOCIDAD_BUS_KMH / 3.6
+        self.velocidad_caminata = settings.PLANIFICADOR_VELOCIDAD_CAMINATA_KMH / 3.6
+        self.penalizacion = settings.PLANIFICADOR_PENALIZACION_ABORDAJE_S
+        self.caminata_max = settings.PLANIFICADOR_CAMINATA_MAX_M
+        self.nombres_ruta = nombres_ruta
+
+        self.ids, self.nombres, self.lats, self.lngs, self.rutas = [], [], [], [], []
+        self.siguiente = []  # índice de la siguiente parada de la ruta, o -1
+        self.viaje = []  # (metros, segundos) hasta la siguiente parada
+        for ruta_id, paradas in rutas.items():
+            inicio = len(self.ids)
+            for pk, nombre, lat, lng, _ in paradas:
+                self.ids.append(pk)
+                self.nombres.append(nombre)
+                self.lats.append(lat)
+                self.lngs.append(lng)
+                self.rutas.append(ruta_id)
+            fin = len(self.ids)
+            for i in range(inicio, fin):
+                if i + 1 < fin:
+                    metros = haversine_m(self.lats[i], self.lngs[i], self.lats[i + 1], self.lngs[i + 1])
+                    self.siguiente.append(i + 1)
+                else:
+                    metros = 0.0
+                    self.siguiente.append(-1)
+                self.viaje.append((metros, metros / self.velocidad_bus))
+
+        self.arbol = KDTree((*vector_unitario(lat, lng), i) for i, (lat, lng) in enumerate(zip(self.lats, self.lngs)))
+        self.caminatas = [
+            [(j, metros) for metros, j in self.cercanas(self.lats[i], self.lngs[i]) if j != i]
+            for i in range(len(self.ids))
+        ]
+
+    def cercanas(self, lat, lng):
+        """Paradas a distancia de caminata: lista de (metros, índice)."""
+        if not self.ids:
+            return []
+        maximo2 = cuerda_desde_metros(self.caminata_max) ** 2
+        vecinos = self.arbol.vecinos(vector_unitario(lat, lng), settings.PLANIFICADOR_MAX_VECINOS, maximo2)
+        return [(metros_desde_cuerda(math.sqrt(d2)), i) for d2, i in vecinos]
+
+    def _parada(self, i):
+        return {
+            "id": self.ids[i],
+            "nombre": self.nombres[i],
+            "lat": self.lats[i],
+            "lng": self.lngs[i],
+        }
+
+    def planificar(self, origen, destino):
+        """Mejor viaje entre dos coordenadas `(lat, lng)`, o `None` si no hay ninguno."""
+        n = len(self.ids)
+        fuente, meta = 2 * n, 2 * n + 1
+        lat_d, lng_d = destino
+        enlaces_destino = {i: metros for metros, i in self.cercanas(lat_d, lng_d)}
+
+        def heuristica(estado):
+            # Cota inferior: en línea recta a la velocidad del bus, la más rápida
+            if estado == meta:
+                return 0.0
+            if estado == fuente:
+                return haversine_m(*origen, lat_d, lng_d) / self.velocidad_bus
+            i = estado // 2
+            return haversine_m(self.lats[i], self.lngs[i], lat_d, lng_d) / self.velocidad_bus
+
+        def sucesores(estado):
+            if estado == fuente:
+                directo = haversine_m(*origen, *destino)
+                if directo <= self.caminata_max:
+                    yield meta, directo / self.velocidad_caminata
+                for metros, i in self.cercanas(*origen):
+                    yield 2 * i, metros / self.velocidad_caminata
+                return
+            i, a_bordo = divmod(estado, 2)
+            if a_bordo:
+                yield 2 * i, 0.0
+                if self.siguiente[i] >= 0:
+                    yield 2 * self.siguiente[i] + 1, self.viaje[i][1]
+                return
+            yield 2 * i + 1, self.penalizacion
+            for j, metros in self.caminatas[i]:
+                yield 2 * j, metros / self.velocidad_caminata
+            if i in enlaces_destino:
+                yield meta, enlaces_destino[i] / self.velocidad_caminata
+
+        costos = {fuente: 0.0}
+        previos = {fuente: None}
+        pendientes = [(heuristica(fuente), 0.0, fuente)]
+        while pendientes:
+            _, costo, estado = heapq.heappop(pendientes)
+            if estado == meta:
+                break
+            if costo > costos[estado]:
+                continue
+            for siguiente, paso in sucesores(estado):
+                nuevo = costo + paso
+                if nuevo < costos.get(siguiente, math.inf):
+                    costos[siguiente] = nuevo
+                    previos[siguiente] = estado
+                    heapq.heappush(pendientes, (nuevo + heuristica(siguiente), nuevo, siguiente))
+        if meta not in costos:
+            return None
+
+        camino = [meta]
+        while previos[camino[-1]] is not None:
+            camino.append(previos[camino[-1]])
+        camino.reverse()
+        return self._resumir(camino, origen, destino, costos[meta])
+
+    def _resumir(self, camino, origen, destino, total):
+        n = len(self.ids)
+        tramos = []
+
+        def punto(estado):
+            if estado == 2 * n:
+                return {"lat": origen[0], "lng": origen[1]}
+            if estado == 2 * n + 1:
+                return {"lat": destino[0], "lng": destino[1]}
+            return self._parada(estado // 2)
+
+        def coordenadas(estado):
+            if estado >= 2 * n:
+                return origen if estado == 2 * n else destino
+            return self.lats[estado // 2], self.lngs[estado // 2]
+
+        for anterior, actual in zip(camino, camino[1:]):
+            abordo_anterior = anterior < 2 * n and anterior % 2 == 1
+            abordo_actual = actual < 2 * n and actual % 2 == 1
+            if abordo_anterior and abordo_actual:
+                i = anterior // 2
+                metros, segundos = self.viaje[i]
+                tramo = tramos[-1]
+                tramo["hasta"] = self._parada(actual // 2)
+                tramo["paradas"] += 1
+                tramo["distancia_m"] += metros
+                tramo["duracion_s"] += segundos
+            elif abordo_actual:
+                i = actual // 2
+                tramos.append({
+                    "tipo": "bus",
+                    "ruta": self.rutas[i],
+                    "ruta_nombre": self.nombres_ruta.get(self.rutas[i]),
+                    "desde": self._parada(i),
+                    "hasta": self._parada(i),
+                    "paradas": 0,
+                    "distancia_m": 0.0,
+                    "duracion_s": 0.0,
+                    "espera_s": self.penalizacion,
+                })
+            elif not abordo_anterior:
+                metros = haversine_m(*coordenadas(anterior), *coordenadas(actual))
+                if tramos and tramos[-1]["tipo"] == "caminar":
+                    tramos[-1]["hasta"] = punto(actual)
+                    tramos[-1]["distancia_m"] += metros
+                    tramos[-1]["duracion_s"] += metros / self.velocidad_caminata
+                else:
+                    tramos.append({
+                        "tipo": "caminar",
+                        "desde": punto(anterior),
+                        "hasta": punto(actual),
+                        "distancia_m": metros,
+                        "duracion_s": metros / self.velocidad_caminata,
+                    })
+
+        for tramo in tramos:
+            tramo["distancia_m"] = round(tramo["distancia_m"], 1)
+            tramo["duracion_s"] = round(tramo["duracion_s"], 1)
+        return {
+            "duracion_s": round(total, 1),
+            "transbordos": max(sum(tramo["tipo"] == "bus" for tramo in tramos) - 1, 0),
+            "tramos": tramos,
+        }
+
+
+_grafo = (None, None)  # (generación, Grafo)
+_lock = threading.Lock()
+
+
+def obtener_grafo():
+    """Grafo de la generación vigente del mapa; se compila una vez por generación."""
+    global _grafo
+    actual = generacion()
+    if _grafo[0] != actual:
+        with _lock:
+            if _grafo[0] != actual:
+                nombres = dict(Ruta.objects.values_list("id", "nombre_ruta"))
+                _grafo = (actual, Grafo(datos_mapa(), nombres))
+    return _grafo[1]
+
+
+def planificar(origen, destino):
+    return obtener_grafo().planificar(origen, destino)
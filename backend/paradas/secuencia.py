@@ -0,0 +1,218 @@
+"""Edición por lotes de la secuencia de paradas de una ruta.
+
+Las operaciones se aplican en memoria sobre la secuencia actual y el
+resultado se escribe con un número constante de sentencias (el borrado
+sin señales de `borrar_paradas`, un `bulk_create` y un `bulk_update`),
+renumerando `orden` de 1 a n. La
+ruta sube una sola versión por lote y las cachés derivadas (geometría,
+índice de cercanía, corredor de desvíos, capas de mapa) se invalidan una
+sola vez.
+
+Operaciones admitidas (posiciones desde 1 sobre la secuencia vigente en
+ese punto del lote, incluidas las paradas inactivas):
+
+- `{"op": "insertar", "posicion": n, "nombre": ..., "coordenada_lat": ..., ...}`
+- `{"op": "mover", "parada": id, "posicion": n}`
+- `{"op": "eliminar", "parada": id}`
+- `{"op": "alternar", "parada": id, "activa": true|false}` (sin `activa` invierte el estado)
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from gps.desvios import invalidar_corredor
+from rutas.diferido import descartar
+from rutas import horarios
+from rutas.snapshot import invalidar_al_confirmar
+from rutas.models import Ruta
+from sincronizacion.registro import registrar_cambios, registrar_eliminados
+
+from . import geo
+from .geometria import recalcular_geometria
+from .indice import indice_paradas
+from .mapa import invalidar_mapa
+from .models import Parada, TiempoSegmento
+
+
+OPERACIONES = ("insertar", "mover", "eliminar", "alternar")
+
+
+class VersionDesactualizada(Exception):
+    """La ruta cambió desde la versión que el cliente dice haber editado."""
+
+    def __init__(self, actual):
+        super().__init__(f"La ruta está en la versión {actual}.")
+        self.actual = actual
+
+
+def clave_ruta(ruta_id):
+    return ("paradas.ruta", ruta_id)
+
+
+def incrementar_version(ruta_id):
+    # La ruta puede haberse eliminado (borrado en cascada de sus paradas)
+    if Ruta.objects.filter(pk=ruta_id).update(version=F("version") + 1):
+        registrar_cambios(Ruta, [ruta_id])
+    transaction.on_commit(lambda: invalidar_mapa(ruta_id))
+    invalidar_al_confirmar([ruta_id])
+    horarios.invalidar_al_confirmar()
+
+
+def actualizar_ruta(ruta_id):
+    """Tarea diferida tras editar paradas una a una (ver `paradas.signals`)."""
+    recalcular_geometria(ruta_id)
+    incrementar_version(ruta_id)
+
+
+def borrar_paradas(ids):
+    """
+    Borra las paradas `ids` y sus tiempos de segmento con un DELETE por tabla.
+
+    No emite `post_delete` por parada ni recorre el colector de cascadas: lo
+    que harían las señales lo hace `confirmar_edicion`, que debe recibir los
+    mismos ids como eliminados.
+    """
+    if not ids:
+        return
+    tiempos = TiempoSegmento.objects.filter(Q(parada_origen__in=ids) | Q(parada_destino__in=ids))
+    tiempos._raw_delete(tiempos.db)
+    paradas = Parada.objects.filter(pk__in=ids)
+    paradas._raw_delete(paradas.db)
+
+
+def confirmar_edicion(ruta_id, ids_modificados, ids_eliminados=()):
+    """
+    Cierra una edición masiva de las paradas de la ruta dentro de la transacción.
+
+    Las escrituras masivas no emiten señales, así que se hace aquí de una vez
+    lo que las señales harían por parada; si alguna señal ya agendó la
+    actualización diferida de la ruta, se descarta.
+    """
+    registrar_cambios(Parada, ids_modificados)
+    registrar_eliminados(Parada, ids_eliminados)
+    recalcular_geometria(ruta_id)
+    incrementar_version(ruta_id)
+    descartar(clave_ruta(ruta_id))
+    transaction.on_commit(indice_paradas.invalidar)
+    transaction.on_commit(lambda: invalidar_corredor(ruta_id))
+
+
+def reordenar_activas(todas, activas):
+    """
+    Operaciones `mover` que dejan las paradas `activas` en ese orden.
+
+    `todas` es la secuencia vigente completa de la ruta; como las posiciones
+    cuentan también las inactivas, las activas ocupan en el nuevo orden los
+    mismos huecos que antes y las inactivas no se mueven.
+    """
+    pendientes = iter(activas)
+    destino = [next(pendientes) if parada.activa else parada for parada in todas]
+    return [{"op": "mover", "parada": parada.id, "posicion": posicion} for posicion, parada in enumerate(destino, start=1)]
+
+
+def _posicion(operacion, maximo, requerida=True):
+    valor = operacion.get("posicion")
+    if valor is None and not requerida:
+        return maximo
+    if isinstance(valor, bool) or not isinstance(valor, int) or not 1 <= valor <= maximo:
+        raise ValueError(f"'posicion' debe ser un entero entre 1 y {maximo}.")
+    return valor
+
+
+def _buscar(secuencia, operacion):
+    parada_id = operacion.get("parada")
+    for indice, parada in enumerate(secuencia):
+        if parada.pk is not None and parada.pk == parada_id:
+            return indice
+    raise ValueError("La parada no pertenece a la ruta o ya fue eliminada en este lote.")
+
+
+def _aplicar(secuencia, operacion, eliminadas):
+    from .importacion import validar_fila
+
+    tipo = operacion.get("op")
+    if tipo == "insertar":
+        datos, errores = validar_fila(operacion)
+        if errores:
+            raise ValueError(errores)
+        parada = Parada(
+            nombre=datos["nombre"],
+            direccion=datos["direccion"],
+            coordenada_lat=datos["coordenada_lat"],
+            coordenada_lng=datos["coordenada_lng"],
+            activa=datos.get("activa", True),
+        )
+        parada.geohash = geo.geohash(float(parada.coordenada_lat), float(parada.coordenada_lng))
+        secuencia.insert(_posicion(operacion, len(secuencia) + 1, requerida=False) - 1, parada)
+    elif tipo == "mover":
+        parada = secuencia.pop(_buscar(secuencia, operacion))
+        secuencia.insert(_posicion(operacion, len(secuencia) + 1) - 1, parada)
+    elif tipo == "eliminar":
+        eliminadas.append(secuencia.pop(_buscar(secuencia, operacion)))
+    elif tipo == "alternar":
+        parada = secuencia[_buscar(secuencia, operacion)]
+        activa = operacion.get("activa", not parada.activa)
+        if not isinstance(activa, bool):
+            raise ValueError("'activa' debe ser booleano.")
+        parada.activa = activa
+    else:
+        raise ValueError(f"Operación desconocida; use una de: {', '.join(OPERACIONES)}.")
+
+
+def aplicar_operaciones(ruta_id, operaciones, version=None):
+    """
+    Aplica `operaciones` a la secuencia de paradas de la ruta, todo o nada.
+
+    Devuelve un dict con `errores` (lista de `{"indice", "errores"}`, vacía si
+    se aplicó), `version` y los conteos de `creadas`, `actualizadas` y
+    `eliminadas`. Con `version` se rechaza el lote (`VersionDesactualizada`)
+    si la ruta cambió desde entonces.
+    """
+    with transaction.atomic():
+        ruta = Ruta.objects.select_for_update().get(pk=ruta_id)
+        if version is not None and version != ruta.version:
+            raise VersionDesactualizada(ruta.version)
+
+        originales = {}
+        secuencia = []
+        for parada in Parada.objects.filter(ruta_id=ruta_id).order_by("orden", "id"):
+            originales[parada.pk] = (parada.orden, parada.activa)
+            secuencia.append(parada)
+
+        eliminadas = []
+        for indice, operacion in enumerate(operaciones):
+            try:
+                if not isinstance(operacion, dict):
+                    raise ValueError("Cada operación debe ser un objeto.")
+                _aplicar(secuencia, operacion, eliminadas)
+            except ValueError as exc:
+                detalle = exc.args[0] if isinstance(exc.args[0], dict) else {"operacion": [str(exc)]}
+                return {"errores": [{"indice": indice, "errores": detalle}], "version": ruta.version}
+
+        ahora = timezone.now()
+        nuevas, modificadas = [], []
+        for orden, parada in enumerate(secuencia, start=1):
+            parada.orden = orden
+            if parada.pk is None:
+                parada.ruta_id = ruta_id
+                nuevas.append(parada)
+            elif originales[parada.pk] != (parada.orden, parada.activa):
+                parada.fecha_actualizacion = ahora
+                modificadas.append(parada)
+        eliminadas = [parada.pk for parada in eliminadas if parada.pk is not None]
+
+        if not (nuevas or modificadas or eliminadas):
+            return {"errores": [], "version": ruta.version, "creadas": 0, "actualizadas": 0, "eliminadas": 0}
+
+        borrar_paradas(eliminadas)
+        Parada.objects.bulk_create(nuevas, batch_size=500)
+        Parada.objects.bulk_update(modificadas, ["orden", "activa", "fecha_actualizacion"], batch_size=500)
+        confirmar_edicion(ruta_id, [parada.pk for parada in nuevas + modificadas], eliminadas)
+
+    return {
+        "errores": [],
+        "version": ruta.version + 1,
+        "creadas": len(nuevas),
+        "actualizadas": len(modificadas),
+        "eliminadas": len(eliminadas),
+    }
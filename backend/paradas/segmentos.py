@@ -0,0 +1,226 @@
+"""Modelo histórico de tiempos de viaje por segmento (parada a parada).
+
+`procesar_segmentos` recorre solo las posiciones GPS nuevas desde la última
+ejecución, proyecta cada bus sobre la geometría de su ruta, interpola el
+instante en que pasa por cada parada y acumula la duración de cada tramo
+consecutivo por (día de la semana, hora). `tabla_segmentos` expone el
+resultado como un diccionario cacheado con acceso O(1).
+
+El avance se guarda como el mayor id leído, pero los ids se asignan al
+insertar y no al confirmar: una transacción que empezó antes puede confirmar
+después filas con ids menores que la marca. Por eso cada hueco de ids que
+queda por debajo de la marca se guarda como pendiente y se vuelve a consultar
+en las ejecuciones siguientes, hasta que aparecen sus filas o pasan
+`SEGMENTOS_ESPERA_HUECOS_S` segundos (ids de transacciones revertidas o de
+filas ya borradas, que no llegarán nunca). Una fila tardía solo suma si es
+posterior al último dato procesado de su bus.
+
+El recorrido es Python puro (NumPy no es dependencia del proyecto): una
+sola pasada lineal por las posiciones nuevas de cada bus, con búsqueda
+binaria sobre las distancias acumuladas de las paradas.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from gps.models import GPSPosicion
+
+from .geometria import obtener_geometria
+from .models import ProcesoSegmentos, TiempoSegmento
+
+
+def clave_tabla(ruta_id):
+    return f"paradas:segmentos:{ruta_id}"
+
+
+def franja(ts):
+    """(día de la semana, hora) local de una marca temporal epoch."""
+    local = timezone.localtime(datetime.fromtimestamp(ts, tz=dt_timezone.utc))
+    return local.weekday(), local.hour
+
+
+def _cruces(geometria, bus, progreso, ts):
+    """Paradas por las que pasó el bus entre su estado anterior y (progreso, ts).
+
+    Se considera que el bus pasa por una parada cuando la deja atrás (la
+    última, al alcanzarla); el instante se interpola linealmente entre las
+    dos muestras.
+    """
+    p0, t0 = bus["p"], bus["t"]
+    ultima = len(geometria.ids) - 1
+    k = bisect_left(geometria.acumuladas, p0)
+    while k <= ultima and (geometria.acumuladas[k] < progreso or (k == ultima and geometria.acumuladas[k] <= progreso)):
+        fraccion = (geometria.acumuladas[k] - p0) / (progreso - p0)
+        yield k, t0 + fraccion * (ts - t0)
+        k += 1
+
+
+def _huecos(ids, desde, hasta, visto):
+    """Rangos `[a, b, visto]` de `desde..hasta` sin ningún id de `ids` (ordenados)."""
+    rangos = []
+    inicio = bisect_left(ids, desde)
+    fin = bisect_right(ids, hasta)
+    siguiente = desde
+    for pk in ids[inicio:fin]:
+        if pk > siguiente:
+            rangos.append([siguiente, pk - 1, visto])
+        siguiente = pk + 1
+    if siguiente <= hasta:
+        rangos.append([siguiente, hasta, visto])
+    return rangos
+
+
+def _guardar(acumulado):
+    origenes = {clave[1] for clave in acumulado}
+    existentes = {
+        (t.ruta_id, t.parada_origen_id, t.parada_destino_id, t.dia_semana, t.hora): t
+        for t in TiempoSegmento.objects.filter(parada_origen_id__in=origenes)
+    }
+    nuevos, modificados = [], []
+    for clave, (muestras, suma, cuadrados, minimo, maximo) in acumulado.items():
+        registro = existentes.get(clave)
+        if registro is None:
+            ruta_id, origen_id, destino_id, dia, hora = clave
+            registro = TiempoSegmento(
+                ruta_id=ruta_id, parada_origen_id=origen_id, parada_destino_id=destino_id,
+                dia_semana=dia, hora=hora,
+            )
+            nuevos.append(registro)
+        else:
+            modificados.append(registro)
+        registro.muestras += muestras
+        registro.suma_segundos += suma
+        registro.suma_cuadrados += cuadrados
+        registro.minimo_segundos = minimo if registro.minimo_segundos is None else min(registro.minimo_segundos, minimo)
+        registro.maximo_segundos = maximo if registro.maximo_segundos is None else max(registro.maximo_segundos, maximo)
+    TiempoSegmento.objects.bulk_create(nuevos)
+    TiempoSegmento.objects.bulk_update(
+        modificados, ["muestras", "suma_segundos", "suma_cuadrados", "minimo_segundos", "maximo_segundos"]
+    )
+
+
+def procesar_segmentos(lote=None):
+    """Acumula los tiempos de segmento de las posiciones nuevas. Retorna un resumen."""
+    lote = lote or settings.GPS_LOTE_TAMANO
+    maximo_hueco = settings.SEGMENTOS_MAX_HUECO_S
+    retroceso = settings.SEGMENTOS_RETROCESO_M
+    proceso, _ = ProcesoSegmentos.objects.get_or_create(pk=1)
+    estado = proceso.estado
+    marca = ultimo_id = proceso.ultima_posicion
+
+    # Sin filtrar por ruta: los ids sin ruta también cuentan como vistos y no dejan huecos
+    filtro = Q(pk__gt=marca)
+    for desde, hasta, _ in proceso.pendientes:
+        filtro |= Q(pk__range=(desde, hasta))
+    filas = GPSPosicion.objects.filter(filtro).order_by(
+        "ruta_id", "usuario_id", "fecha_hora", "id"
+    ).values_list("id", "ruta_id", "usuario_id", "latitud", "longitud", "fecha_hora")
+
+    # (ruta, origen, destino, día, hora) -> [muestras, suma, suma de cuadrados, mínimo, máximo]
+    acumulado = defaultdict(lambda: [0, 0.0, 0.0, None, None])
+    geometrias = {}
+    posiciones = 0
+    leidos = []
+    for pk, ruta_id, usuario_id, lat, lng, fecha_hora in filas.iterator(chunk_size=lote):
+        ultimo_id = max(ultimo_id, pk)
+        leidos.append(pk)
+        if ruta_id is None:
+            continue
+        posiciones += 1
+        if ruta_id not in geometrias:
+            geometrias[ruta_id] = obtener_geometria(ruta_id)
+        geometria = geometrias[ruta_id]
+        if len(geometria.ids) < 2:
+            continue
+
+        clave_bus = f"{ruta_id}:{usuario_id or 0}"
+        progreso, _ = geometria.proyectar(float(lat), float(lng))
+        ts = fecha_hora.timestamp()
+        bus = estado.get(clave_bus)
+        if bus is not None and ts <= bus["t"]:
+            continue
+        if bus is None or ts - bus["t"] > maximo_hueco or progreso < bus["p"] - retroceso:
+            # Primer dato, hueco largo o inicio de otro recorrido: se reinicia la cadena
+            estado[clave_bus] = {"p": progreso, "t": ts, "parada": None, "tp": None}
+            continue
+        if progreso > bus["p"]:
+            for k, tk in _cruces(geometria, bus, progreso, ts):
+                parada_id = geometria.ids[k]
+                if k > 0 and bus["parada"] == geometria.ids[k - 1]:
+                    duracion = tk - bus["tp"]
+                    dia, hora = franja(bus["tp"])
+                    datos = acumulado[(ruta_id, bus["parada"], parada_id, dia, hora)]
+                    datos[0] += 1
+                    datos[1] += duracion
+                    datos[2] += duracion * duracion
+                    datos[3] = duracion if datos[3] is None else min(datos[3], duracion)
+                    datos[4] = duracion if datos[4] is None else max(datos[4], duracion)
+                bus["parada"], bus["tp"] = parada_id, tk
+            bus["p"] = progreso
+        bus["t"] = ts
+
+    leidos.sort()
+    ahora = timezone.now().timestamp()
+    pendientes = [
+        hueco
+        for desde, hasta, visto in proceso.pendientes
+        if ahora - visto < settings.SEGMENTOS_ESPERA_HUECOS_S
+        for hueco in _huecos(leidos, desde, hasta, visto)
+    ]
+    pendientes += _huecos(leidos, marca + 1, ultimo_id, ahora)
+
+    with transaction.atomic():
+        _guardar(acumulado)
+        proceso.ultima_posicion = ultimo_id
+        proceso.estado = estado
+        proceso.pendientes = pendientes
+        proceso.fecha_ejecucion = timezone.now()
+        proceso.save()
+    for ruta_id in {clave[0] for clave in acumulado}:
+        cache.delete(clave_tabla(ruta_id))
+    return {"posiciones": posiciones, "segmentos": len(acumulado)}
+
+
+def tabla_segmentos(ruta_id):
+    """{(origen, destino, día, hora): segundos medios} de la ruta, cacheado.
+
+    Solo incluye franjas con al menos `SEGMENTOS_MIN_MUESTRAS` muestras.
+    """
+    clave = clave_tabla(ruta_id)
+    tabla = cache.get(clave)
+    if tabla is None:
+        tabla = {
+            (origen, destino, dia, hora): suma / muestras
+            for origen, destino, dia, hora, suma, muestras in TiempoSegmento.objects.filter(
+                ruta_id=ruta_id, muestras__gte=settings.SEGMENTOS_MIN_MUESTRAS
+            ).values_list("parada_origen_id", "parada_destino_id", "dia_semana", "hora", "suma_segundos", "muestras")
+        }
+        cache.set(clave, tabla, settings.PARADAS_GEOMETRIA_CACHE_SEGUNDOS)
+    return tabla
+
+
+def tiempo_historico(geometria, tabla, progreso, indice_destino, inicio_ts):
+    """Segundos estimados desde `progreso` hasta la parada `indice_destino`.
+
+    Suma los tiempos medios de cada tramo para la franja en la que se
+    recorrería; None si falta algún tramo en la tabla.
+    """
+    i = min(max(bisect_left(geometria.acumuladas, progreso) - 1, 0), len(geometria.ids) - 2)
+    if i >= indice_destino:
+        return 0.0
+    largo = geometria.acumuladas[i + 1] - geometria.acumuladas[i]
+    recorrido = (progreso - geometria.acumuladas[i]) / largo if largo > 0 else 0.0
+    total = 0.0
+    for j in range(i, indice_destino):
+        dia, hora = franja(inicio_ts + total)
+        tramo = tabla.get((geometria.ids[j], geometria.ids[j + 1], dia, hora))
+        if tramo is None:
+            return None
+        total += tramo * (1 - min(max(recorrido, 0.0), 1.0)) if j == i else tramo
+    return total
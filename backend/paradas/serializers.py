@@ -22,10 +22,19 @@ class ParadaSerializer(serializers.ModelSerializer):
             "ruta_nombre",
             "orden",
             "activa",
+            "distancia_acumulada_m",
+            "longitud_segmento_m",
+            "rumbo_siguiente",
+            "fecha_creacion",
+            "fecha_actualizacion",
+        ]
+        read_only_fields = [
+            "distancia_acumulada_m",
+            "longitud_segmento_m",
+            "rumbo_siguiente",
             "fecha_creacion",
             "fecha_actualizacion",
         ]
-        read_only_fields = ["fecha_creacion", "fecha_actualizacion"]
 
     def get_coordenadas(self, obj):
         """Retorna las coordenadas en formato estándar."""
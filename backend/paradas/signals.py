@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from gps.signals import posiciones_registradas
+from rutas.diferido import al_confirmar
+from rutas.models import Ruta
+
+from . import eta
+from .geometria import invalidar_geometria
+from .indice import indice_paradas
+from .mapa import invalidar_mapa
+from .models import Parada
+from .secuencia import actualizar_ruta, clave_ruta
+
+
+@receiver(pre_save, sender=Parada)
+def recordar_ruta_anterior(sender, instance, raw=False, **kwargs):
+    """Si la parada cambia de ruta, la geometría de la ruta anterior también cambia."""
+    if instance.pk and not raw:
+        instance._ruta_anterior_id = (
+            Parada.objects.filter(pk=instance.pk).values_list("ruta_id", flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Parada)
+def actualizar_ruta_parada(sender, instance, **kwargs):
+    """Geometría y versión de la ruta, una sola vez por ruta y transacción."""
+    invalidar_geometria(instance.ruta_id)
+    rutas = {instance.ruta_id, getattr(instance, "_ruta_anterior_id", None)} - {None}
+    for ruta_id in rutas:
+        al_confirmar(clave_ruta(ruta_id), actualizar_ruta, ruta_id)
+
+
+@receiver(post_save, sender=Parada)
+def actualizar_indice_parada(sender, instance, **kwargs):
+    transaction.on_commit(lambda: indice_paradas.actualizar(instance))
+
+
+@receiver(post_delete, sender=Parada)
+def retirar_indice_parada(sender, instance, **kwargs):
+    parada_id = instance.id
+    transaction.on_commit(lambda: indice_paradas.retirar(parada_id))
+
+
+@receiver(post_save, sender=Ruta)
+def invalidar_indice_ruta(sender, instance, created, **kwargs):
+    # Las paradas indexadas llevan el nombre de la ruta ya serializado
+    if not created:
+        transaction.on_commit(indice_paradas.invalidar)
+        # El planificador de viajes muestra el nombre de la ruta
+        transaction.on_commit(lambda: invalidar_mapa(instance.id))
+
+
+@receiver(posiciones_registradas)
+def actualizar_eta(sender, posiciones, **kwargs):
+    eta.actualizar(posiciones)
@@ -1,3 +1,543 @@
-from django.test import TestCase
+import gzip
+import json
+import math
+import random
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin, messages
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from gps import ultimas
+from gps.codificacion import leer_varint
+from gps.models import GPSPosicion
+from rutas import diferido
+from rutas.models import Ruta
+from sincronizacion.models import RegistroCambio
+from . import eta
+from .admin import ParadaAdmin
+from .geo import geohash, haversine_m
+from .geometria import obtener_geometria
+from .indice import KDTree, indice_paradas, vector_unitario
+from .models import Parada, ProcesoSegmentos, TiempoSegmento
+from .optimizacion import longitud, matriz_distancias, optimizar_orden
+from .segmentos import procesar_segmentos
+
+User = get_user_model()
+
+# Caché en memoria para las pruebas: `cache.clear()` no debe tocar la caché en disco
+CACHES_PRUEBA = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas"},
+    "versiones": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas-versiones"},
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class ParadasTestCase(APITestCase):
+    """Aísla la caché y el directorio de datos compartidos de cada prueba."""
+
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        ajustes = override_settings(GPS_DATA_DIR=self.tmp.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.usuario = User.objects.create_user(username="ana", email="ana@example.com", password="pass12345")
+        self.client.force_authenticate(self.usuario)
+        indice_paradas.invalidar()
+
+    def crear_ruta(self, puntos, nombre="Ruta 1"):
+        ruta = Ruta.objects.create(nombre_ruta=nombre, capacidad_activa=10)
+        paradas = [
+            Parada.objects.create(
+                nombre=f"P{i}", direccion="-", coordenada_lat=lat, coordenada_lng=lng, ruta=ruta, orden=i
+            )
+            for i, (lat, lng) in enumerate(puntos, start=1)
+        ]
+        return ruta, paradas
+
+
+class ETATests(ParadasTestCase):
+    def test_eta_con_posiciones_incrementales(self):
+        # Tres paradas sobre el ecuador separadas ~1.1 km
+        ruta, paradas = self.crear_ruta([(0, 0), (0, 0.01), (0, 0.02)])
+        ahora = timezone.now()
+        self.client.post("/api/gps/posiciones/bulk/", [
+            {"ruta": ruta.id, "usuario": None, "latitud": "0.0001", "longitud": "0.005",
+             "velocidad": "36", "fecha_hora": ahora.isoformat()},
+        ], format="json")
+
+        r = self.client.get(f"/api/paradas/{paradas[2].id}/eta/")
+        self.assertEqual(r.status_code, 200)
+        bus = r.data["buses"][0]
+        self.assertAlmostEqual(bus["distancia_m"], 1667.9, delta=5)
+        # 36 km/h = 10 m/s
+        self.assertAlmostEqual(bus["eta_segundos"], 167, delta=3)
+
+        r = self.client.get(f"/api/paradas/{paradas[0].id}/eta/")
+        self.assertEqual(r.data["buses"], [])
+
+
+class TiemposSegmentoTests(ParadasTestCase):
+    def test_calculo_incremental_y_uso_en_eta(self):
+        ruta, paradas = self.crear_ruta([(0, 0), (0, 0.01), (0, 0.02)])
+        inicio = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=7)
+
+        def recorrido(desde):
+            # ~11 m/s: cada parada está a 1112 m, se pasa por ellas a los 100 y 200 s
+            return [
+                GPSPosicion(ruta=ruta, latitud=0, longitud=Decimal(i) / 1000, fecha_hora=desde + timedelta(seconds=10 * i))
+                for i in range(-1, 22)
+            ]
+
+        for vuelta in range(2):
+            GPSPosicion.objects.bulk_create(recorrido(inicio + timedelta(minutes=10 * vuelta)))
+        self.assertEqual(procesar_segmentos()["segmentos"], 2)
+        GPSPosicion.objects.bulk_create(recorrido(inicio + timedelta(minutes=20)))
+        self.assertEqual(procesar_segmentos()["posiciones"], 23)
+
+        tramo = TiempoSegmento.objects.get(parada_origen=paradas[0])
+        self.assertEqual(tramo.muestras, 3)
+        self.assertAlmostEqual(tramo.media_segundos, 100, delta=0.5)
+
+        # La ETA usa el histórico de la franja del bus (mismo día y hora, semana siguiente)
+        eta_bus = {"ruta": ruta.id, "usuario": None, "ts": (inicio + timedelta(days=7)).timestamp(),
+                   "progreso_m": 0.0, "distancia_ruta_m": 0.0, "velocidad_ms": 1.0}
+        ultimas.obtener_backend("eta").guardar(eta_bus)
+        resultado = eta.eta_parada(paradas[2], ahora=eta_bus["ts"])
+        self.assertEqual(resultado["buses"][0]["fuente"], "historico")
+        self.assertAlmostEqual(resultado["buses"][0]["eta_segundos"], 200, delta=1)
+
+
+    def test_filas_confirmadas_tarde_bajo_la_marca(self):
+        ruta_a, _ = self.crear_ruta([(0, 0), (0, 0.01), (0, 0.02)], nombre="A")
+        ruta_b, paradas_b = self.crear_ruta([(0, 0), (0, 0.01), (0, 0.02)], nombre="B")
+        inicio = timezone.now() - timedelta(hours=1)
+
+        def recorrido(ruta, primer_id):
+            return [
+                GPSPosicion(id=primer_id + i, ruta=ruta, latitud=0, longitud=Decimal(i) / 1000,
+                            fecha_hora=inicio + timedelta(seconds=10 * i))
+                for i in range(23)
+            ]
+
+        # La transacción de B reservó los ids 1000-1022 pero A confirma antes con ids mayores
+        GPSPosicion.objects.bulk_create(recorrido(ruta_a, 1100))
+        procesar_segmentos()
+        self.assertFalse(TiempoSegmento.objects.filter(ruta=ruta_b).exists())
+
+        GPSPosicion.objects.bulk_create(recorrido(ruta_b, 1000))
+        self.assertEqual(procesar_segmentos()["posiciones"], 23)
+        self.assertEqual(TiempoSegmento.objects.get(parada_origen=paradas_b[0]).muestras, 1)
+
+        # Los huecos que nunca se llenan caducan
+        with override_settings(SEGMENTOS_ESPERA_HUECOS_S=0):
+            self.assertEqual(procesar_segmentos()["posiciones"], 0)
+        self.assertEqual(ProcesoSegmentos.objects.get().pendientes, [])
+
+
+class CercanasTests(ParadasTestCase):
+    def setUp(self):
+        super().setUp()
+        # A 0, ~1.1 km, ~2.2 km y ~111 km al este del centro (11.5, -72.9)
+        self.ruta, self.paradas = self.crear_ruta(
+            [(11.5, -72.9), (11.5, -72.8898), (11.5, -72.8796), (11.5, -71.88)]
+        )
+
+    def test_geohash_se_actualiza_al_guardar(self):
+        parada = self.paradas[0]
+        self.assertEqual(parada.geohash, geohash(11.5, -72.9))
+        parada.coordenada_lat = 11.6
+        parada.save(update_fields=["coordenada_lat"])
+        parada.refresh_from_db()
+        self.assertEqual(parada.geohash, geohash(11.6, -72.9))
+
+    def test_radio_ordenado_y_limitado(self):
+        r = self.client.get("/api/paradas/cercanas/?lat=11.5&lng=-72.88&radio=5&limit=2")
+        self.assertEqual(r.status_code, 200)
+        ids = [p["id"] for p in r.data["paradas"]]
+        self.assertEqual(ids, [self.paradas[2].id, self.paradas[1].id])
+        self.assertLess(r.data["paradas"][0]["distancia_m"], r.data["paradas"][1]["distancia_m"])
+
+    def test_k_vecinos_sin_radio(self):
+        r = self.client.get("/api/paradas/cercanas/?lat=11.5&lng=-71.9&limit=1")
+        self.assertEqual([p["id"] for p in r.data["paradas"]], [self.paradas[3].id])
+
+
+class IndiceParadasTests(ParadasTestCase):
+    def test_kdtree_coincide_con_fuerza_bruta(self):
+        aleatorio = random.Random(7)
+        puntos = [(aleatorio.uniform(10, 12), aleatorio.uniform(-74, -72)) for _ in range(300)]
+        arbol = KDTree((*vector_unitario(lat, lng), i) for i, (lat, lng) in enumerate(puntos))
+        for lat, lng in puntos[:20]:
+            esperado = sorted(range(len(puntos)), key=lambda i: haversine_m(lat, lng, *puntos[i]))[:5]
+            self.assertEqual([i for _, i in arbol.vecinos(vector_unitario(lat, lng), 5)], esperado)
+
+    def test_actualizacion_incremental_por_senales(self):
+        ruta, paradas = self.crear_ruta([(11.5, -72.9), (11.5, -72.89)])
+        self.assertEqual(len(indice_paradas.cercanas(11.5, -72.9, radio_m=5000)), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            paradas[0].activa = False
+            paradas[0].save()
+        with self.assertNumQueries(0):
+            resultados = indice_paradas.cercanas(11.5, -72.9, radio_m=5000)
+        self.assertEqual([datos["id"] for _, datos in resultados], [paradas[1].id])
+
+
+class GeometriaPrecalculadaTests(ParadasTestCase):
+    def test_recalculo_unico_por_transaccion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ruta, paradas = self.crear_ruta([(0, 0), (0, 0.01), (0, 0.02)])
+        tramo = haversine_m(0, 0, 0, 0.01)
+        paradas[2].refresh_from_db()
+        self.assertAlmostEqual(paradas[2].distancia_acumulada_m, 2 * tramo, places=3)
+        paradas[0].refresh_from_db()
+        self.assertAlmostEqual(paradas[0].rumbo_siguiente, 90, places=3)
+        self.assertIsNone(paradas[2].longitud_segmento_m)
+
+        # Desactivar la parada intermedia en la misma transacción agenda un solo recálculo
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            paradas[1].activa = False
+            paradas[1].save()
+            paradas[2].nombre = "Final"
+            paradas[2].save()
+        self.assertEqual(sum(c.__module__ == diferido.__name__ for c in callbacks), 1)
+        paradas[1].refresh_from_db()
+        paradas[2].refresh_from_db()
+        self.assertIsNone(paradas[1].distancia_acumulada_m)
+        self.assertAlmostEqual(paradas[2].distancia_acumulada_m, 2 * tramo, places=3)
+
+        with self.assertNumQueries(1):
+            geometria = obtener_geometria(ruta.id)
+        self.assertEqual(geometria.ids, [paradas[0].id, paradas[2].id])
+
+
+class ImportacionTests(ParadasTestCase):
+    def subir_csv(self, ruta, texto, **extra):
+        archivo = SimpleUploadedFile("paradas.csv", texto.encode(), content_type="text/csv")
+        return self.client.post(
+            "/api/paradas/importar/", {"ruta": ruta.id, "archivo": archivo, **extra}, format="multipart"
+        )
+
+    def importar(self, ruta, texto, **extra):
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.subir_csv(ruta, texto, **extra)
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        return respuesta, len(consultas)
+
+    def test_csv_masivo_y_reimportacion(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1", capacidad_activa=10)
+        filas = "\n".join(f"P{i},Calle {i},11.{i:04d},-72.9" for i in range(500))
+        respuesta, consultas = self.importar(ruta, "nombre,direccion,lat,lng\n" + filas)
+        # Sentencias masivas: solo crecen con los lotes que exige el límite de parámetros del motor
+        self.assertLess(consultas, 50)
+        self.assertEqual(respuesta.data["creadas"], 500)
+        ultima = Parada.objects.get(ruta=ruta, nombre="P499")
+        self.assertEqual(ultima.orden, 500)
+        self.assertEqual(ultima.geohash, geohash(11.0499, -72.9))
+        self.assertGreater(ultima.distancia_acumulada_m, 0)
+
+        # Reimportar invierte el orden por nombre y reemplaza las que faltan
+        texto = "nombre,lat,lng,orden\nP1,11.0001,-72.9,2\nP0,11,-72.9,1\nNueva,11.1,-72.9,3\n"
+        respuesta, consultas = self.importar(ruta, texto, reemplazar="true")
+        self.assertEqual((respuesta.data["creadas"], respuesta.data["actualizadas"], respuesta.data["eliminadas"]),
+                         (1, 2, 498))
+        self.assertLess(consultas, 50)
+        self.assertEqual(list(Parada.objects.filter(ruta=ruta).order_by("orden").values_list("nombre", flat=True)),
+                         ["P0", "P1", "Nueva"])
+        self.assertEqual(RegistroCambio.objects.filter(modelo="paradas.parada", operacion="eliminado").count(), 498)
+
+    def test_lee_las_paradas_con_la_ruta_bloqueada_y_sube_la_version(self):
+        ruta, paradas = self.crear_ruta([(0, 0), (0, 0.01)])
+        ruta.refresh_from_db()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.subir_csv(ruta, "nombre,lat,lng\nP2,0,0.01\nP1,0,0\n")
+        self.assertEqual(respuesta.data["version"], ruta.version + 1)
+        sentencias = [consulta["sql"] for consulta in consultas]
+        inicio = next(i for i, sql in enumerate(sentencias) if sql.startswith("SAVEPOINT"))
+        lectura = next(i for i, sql in enumerate(sentencias) if 'FROM "paradas_parada"' in sql)
+        self.assertLess(inicio, lectura)
+
+        # Quien editaba con la versión anterior recibe 409
+        respuesta = self.client.post("/api/paradas/secuencia/", {
+            "ruta": ruta.id, "version": ruta.version,
+            "operaciones": [{"op": "mover", "parada": paradas[0].id, "posicion": 1}],
+        }, format="json")
+        self.assertEqual(respuesta.status_code, 409)
+
+    def test_geojson_con_errores_no_escribe(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1", capacidad_activa=10)
+        geojson = {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [-72.9, 11.5]},
+             "properties": {"nombre": "Centro"}},
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [-72.9, 95]},
+             "properties": {"nombre": "Norte"}},
+        ]}
+        respuesta = self.client.post(f"/api/paradas/importar/?ruta={ruta.id}", geojson, format="json")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data["errores"][0]["indice"], 1)
+        self.assertIn("coordenada_lat", respuesta.data["errores"][0]["errores"])
+        self.assertFalse(Parada.objects.filter(ruta=ruta).exists())
+
+        del geojson["features"][1]
+        respuesta = self.client.post(f"/api/paradas/importar/?ruta={ruta.id}", geojson, format="json")
+        self.assertEqual(respuesta.data["creadas"], 1)
+        self.assertEqual(Parada.objects.get(ruta=ruta).coordenadas, {"lat": 11.5, "lng": -72.9})
+
+
+class SecuenciaTests(ParadasTestCase):
+    def test_lote_de_operaciones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ruta, paradas = self.crear_ruta([(0, 0), (0, 0.01), (0, 0.02)])
+        ruta.refresh_from_db()
+        version = ruta.version
+        operaciones = [
+            {"op": "mover", "parada": paradas[2].id, "posicion": 1},
+            {"op": "eliminar", "parada": paradas[1].id},
+            {"op": "insertar", "posicion": 2, "nombre": "Nueva", "coordenada_lat": 0, "coordenada_lng": 0.005},
+            {"op": "alternar", "parada": paradas[0].id},
+        ]
+        respuesta = self.client.post(
+            "/api/paradas/secuencia/", {"ruta": ruta.id, "version": version, "operaciones": operaciones}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(respuesta.data["version"], version + 1)
+        self.assertEqual([p["nombre"] for p in respuesta.data["paradas"]], ["P3", "Nueva", "P1"])
+        self.assertEqual([p["orden"] for p in respuesta.data["paradas"]], [1, 2, 3])
+        self.assertFalse(respuesta.data["paradas"][2]["activa"])
+        ruta.refresh_from_db()
+        self.assertEqual(ruta.version, version + 1)
+        nueva = Parada.objects.get(nombre="Nueva")
+        self.assertAlmostEqual(nueva.distancia_acumulada_m, haversine_m(0, 0.02, 0, 0.005), places=3)
+
+        # Versión vieja: conflicto sin cambios
+        respuesta = self.client.post(
+            "/api/paradas/secuencia/", {"ruta": ruta.id, "version": version, "operaciones": operaciones}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 409)
+
+    def test_eliminar_en_bloque_sin_senales_por_parada(self):
+        def eliminar(ruta, paradas):
+            operaciones = [{"op": "eliminar", "parada": parada.id} for parada in paradas]
+            with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+                respuesta = self.client.post(
+                    "/api/paradas/secuencia/", {"ruta": ruta.id, "operaciones": operaciones}, format="json"
+                )
+            self.assertEqual(respuesta.status_code, 200, respuesta.data)
+            return len(consultas)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            una, paradas_una = self.crear_ruta([(0, 0.001 * i) for i in range(5)], nombre="Una")
+            varias, paradas_varias = self.crear_ruta([(0, 0.001 * i) for i in range(25)], nombre="Varias")
+        TiempoSegmento.objects.create(
+            ruta=varias, parada_origen=paradas_varias[0], parada_destino=paradas_varias[1], dia_semana=0, hora=8
+        )
+        self.assertEqual(eliminar(una, paradas_una[:1]), eliminar(varias, paradas_varias[:20]))
+        self.assertFalse(TiempoSegmento.objects.exists())
+        self.assertEqual(
+            set(RegistroCambio.objects.filter(modelo="paradas.parada", operacion="eliminado")
+                .values_list("objeto_id", flat=True)),
+            {parada.id for parada in paradas_una[:1] + paradas_varias[:20]},
+        )
+
+    def test_operacion_invalida_no_escribe(self):
+        ruta, paradas = self.crear_ruta([(0, 0), (0, 0.01)])
+        respuesta = self.client.post("/api/paradas/secuencia/", {"ruta": ruta.id, "operaciones": [
+            {"op": "mover", "parada": paradas[1].id, "posicion": 1},
+            {"op": "mover", "parada": paradas[0].id, "posicion": 9},
+        ]}, format="json")
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data["errores"][0]["indice"], 1)
+        self.assertEqual(list(Parada.objects.filter(ruta=ruta).order_by("orden").values_list("id", flat=True)),
+                         [paradas[0].id, paradas[1].id])
+
+
+def leer_mensaje(datos):
+    """Campos de un mensaje protobuf: lista de (número, valor) para varints y delimitados."""
+    campos, pos = [], 0
+    while pos < len(datos):
+        clave, pos = leer_varint(datos, pos)
+        numero, tipo = clave >> 3, clave & 7
+        if tipo == 0:
+            valor, pos = leer_varint(datos, pos)
+        elif tipo == 2:
+            largo, pos = leer_varint(datos, pos)
+            valor, pos = datos[pos:pos + largo], pos + largo
+        else:
+            valor, pos = datos[pos:pos + 8], pos + 8
+        campos.append((numero, valor))
+    return campos
+
+
+class MapaTests(ParadasTestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ruta, self.paradas = self.crear_ruta([(11.5, -72.9), (11.51, -72.9), (11.52, -72.89)])
+
+    def test_geojson_comprimido_con_etag(self):
+        respuesta = self.client.get(f"/api/paradas/geojson/?ruta={self.ruta.id}", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta["Content-Encoding"], "gzip")
+        coleccion = json.loads(gzip.decompress(respuesta.content))
+        self.assertEqual(coleccion["features"][0]["geometry"]["type"], "LineString")
+        self.assertEqual(len(coleccion["features"][0]["geometry"]["coordinates"]), 3)
+        self.assertEqual([f["id"] for f in coleccion["features"][1:]], [p.id for p in self.paradas])
+
+        etag = respuesta["ETag"]
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(
+                f"/api/paradas/geojson/?ruta={self.ruta.id}", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(respuesta.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/paradas/secuencia/", {"ruta": self.ruta.id, "operaciones": [
+                {"op": "alternar", "parada": self.paradas[1].id},
+            ]}, format="json")
+        respuesta = self.client.get(
+            f"/api/paradas/geojson/?ruta={self.ruta.id}", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta["ETag"], etag)
+
+    def test_tesela_vectorial(self):
+        z = 12
+        x = int((-72.9 + 180) / 360 * 2 ** z)
+        y = int((1 - math.asinh(math.tan(math.radians(11.5))) / math.pi) / 2 * 2 ** z)
+        respuesta = self.client.get(f"/api/paradas/tiles/{z}/{x}/{y}.mvt")
+        self.assertEqual(respuesta.status_code, 200)
+        capas = {}
+        for numero, capa in leer_mensaje(respuesta.content):
+            self.assertEqual(numero, 3)
+            campos = leer_mensaje(capa)
+            nombre = next(bytes(v).decode() for n, v in campos if n == 1)
+            capas[nombre] = [leer_mensaje(v) for n, v in campos if n == 2]
+        self.assertEqual(len(capas["rutas"]), 1)
+        self.assertIn(self.paradas[0].id, [dict(entidad)[1] for entidad in capas["paradas"]])
+
+        vacia = self.client.get("/api/paradas/tiles/12/0/0.mvt", HTTP_ACCEPT="application/vnd.mapbox-vector-tile")
+        self.assertEqual((vacia.status_code, vacia.content), (200, b""))
+        self.assertEqual(self.client.get("/api/paradas/tiles/1/5/0.mvt").status_code, 400)
+
+    def test_requiere_autenticacion_como_el_viewset(self):
+        anonimo = APIClient()
+        for url in (f"/api/paradas/geojson/?ruta={self.ruta.id}", "/api/paradas/tiles/1/0/0.mvt", "/api/paradas/cercanas/"):
+            self.assertEqual(anonimo.get(url).status_code, 403, url)
+
+
+class PlanificadorTests(ParadasTestCase):
+    def test_viaje_con_transbordo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            # Ruta A hacia el este por el ecuador; ruta B sube al norte desde su final
+            ruta_a, paradas_a = self.crear_ruta([(0, 0), (0, 0.02), (0, 0.04)], nombre="A")
+            ruta_b, paradas_b = self.crear_ruta([(0.001, 0.04), (0.02, 0.04), (0.04, 0.04)], nombre="B")
+        url = "/api/paradas/planificar/?origen_lat=0&origen_lng=-0.001&destino_lat=0.041&destino_lng=0.04"
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        buses = [tramo for tramo in respuesta.data["tramos"] if tramo["tipo"] == "bus"]
+        self.assertEqual([tramo["ruta"] for tramo in buses], [ruta_a.id, ruta_b.id])
+        self.assertEqual(buses[0]["desde"]["id"], paradas_a[0].id)
+        self.assertEqual(buses[1]["hasta"]["id"], paradas_b[2].id)
+        self.assertEqual(respuesta.data["transbordos"], 1)
+        self.assertEqual(respuesta.data["tramos"][0]["tipo"], "caminar")
+
+        # Con el grafo compilado la consulta no toca la base de datos
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        # Lejos de toda parada no hay viaje
+        respuesta = self.client.get("/api/paradas/planificar/?origen_lat=5&origen_lng=5&destino_lat=0&destino_lng=0")
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class OptimizacionTests(ParadasTestCase):
+    def puntos(self, n):
+        aleatorio = random.Random(5)
+        return [(11 + aleatorio.random() * 0.1, -73 + aleatorio.random() * 0.1) for _ in range(n)]
+
+    def test_doscientas_paradas(self):
+        puntos = self.puntos(200)
+        orden = optimizar_orden(puntos, fijar_inicio=True, fijar_fin=True)
+        self.assertEqual(sorted(orden), list(range(200)))
+        self.assertEqual((orden[0], orden[-1]), (0, 199))
+        matriz = matriz_distancias(puntos)
+        self.assertLess(longitud(orden, matriz), longitud(list(range(200)), matriz) / 2)
+
+    def test_plazo_se_revisa_dentro_de_la_pasada(self):
+        # Reloj simulado: el plazo vence en la primera posición de la primera pasada
+        lecturas = iter([0.0, 0.0])
+        puntos = self.puntos(200)
+        with mock.patch("paradas.optimizacion.time.perf_counter", lambda: next(lecturas, 10.0)):
+            orden = optimizar_orden(puntos, tiempo_max=1)
+        # Sin ninguna jugada aplicada queda el orden de partida
+        self.assertEqual(orden, optimizar_orden(puntos, tiempo_max=0))
+
+    def test_propuesta_y_aplicacion(self):
+        # Paradas sobre una línea recta, numeradas en zigzag
+        ruta, paradas = self.crear_ruta([(0, 0), (0, 0.03), (0, 0.01), (0, 0.04), (0, 0.02), (0, 0.05)])
+        respuesta = self.client.get(f"/api/paradas/optimizar/?ruta={ruta.id}&fijar_inicio=true&fijar_fin=true")
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        esperado = [paradas[i].id for i in (0, 2, 4, 1, 3, 5)]
+        self.assertEqual(respuesta.data["orden"], esperado)
+        self.assertAlmostEqual(respuesta.data["distancia_propuesta_m"], haversine_m(0, 0, 0, 0.05), delta=1)
+        self.assertGreater(respuesta.data["ahorro_m"], 0)
+
+        respuesta = self.client.post("/api/paradas/optimizar/", {"ruta": ruta.id, "fijar_inicio": True}, format="json")
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(
+            list(Parada.objects.filter(ruta=ruta).order_by("orden").values_list("id", flat=True)), esperado
+        )
+
+    def test_aplica_el_orden_revisado_sin_mover_inactivas(self):
+        ruta, paradas = self.crear_ruta([(0, 0), (0, 0.03), (0, 0.01), (0, 0.04), (0, 0.02)])
+        Parada.objects.filter(pk=paradas[1].pk).update(activa=False)
+        revisado = [paradas[i].id for i in (0, 4, 2, 3)]
+        respuesta = self.client.post(
+            "/api/paradas/optimizar/", {"ruta": ruta.id, "orden": revisado}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 200, respuesta.data)
+        self.assertEqual(respuesta.data["orden"], revisado)
+        self.assertEqual(
+            list(Parada.objects.filter(ruta=ruta).order_by("orden").values_list("id", flat=True)),
+            [paradas[i].id for i in (0, 1, 4, 2, 3)],
+        )
+
+        respuesta = self.client.post(
+            "/api/paradas/optimizar/", {"ruta": ruta.id, "orden": revisado[:3]}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 400)
+
+    def accion_admin(self, ruta):
+        modelo_admin = ParadaAdmin(Parada, admin.site)
+        mensajes = []
+        modelo_admin.message_user = lambda request, mensaje, nivel=messages.INFO: mensajes.append((nivel, mensaje))
+        modelo_admin.optimizar_orden_rutas(RequestFactory().post("/admin/"), Parada.objects.filter(ruta=ruta))
+        return mensajes
+
+    def test_admin_no_mueve_inactivas(self):
+        ruta, paradas = self.crear_ruta([(0, 0), (0, 0.03), (0, 0.01), (0, 0.04), (0, 0.02), (0, 0.05)])
+        Parada.objects.filter(pk=paradas[1].pk).update(activa=False)
+        mensajes = self.accion_admin(ruta)
+        self.assertEqual(mensajes[0][0], messages.SUCCESS)
+        self.assertEqual(
+            list(Parada.objects.filter(ruta=ruta).order_by("orden").values_list("id", flat=True)),
+            [paradas[i].id for i in (0, 1, 2, 4, 3, 5)],
+        )
+
+    def test_admin_reporta_errores(self):
+        ruta, _ = self.crear_ruta([(0, 0), (0, 0.03), (0, 0.01), (0, 0.04), (0, 0.02), (0, 0.05)])
+        fallo = {"errores": [{"indice": 0, "errores": {"operacion": ["x"]}}], "version": 1}
+        with mock.patch("paradas.admin.aplicar_operaciones", return_value=fallo):
+            mensajes = self.accion_admin(ruta)
+        self.assertEqual(mensajes[0][0], messages.ERROR)
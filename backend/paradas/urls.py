@@ -1,10 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .mapa import GeoJSONParadasView, TeselaParadasView
 from .views import ParadaViewSet
 
 router = DefaultRouter()
 router.register(r"", ParadaViewSet, basename="parada")
 
 urlpatterns = [
+    path("geojson/", GeoJSONParadasView.as_view(), name="paradas-geojson"),
+    path("tiles/<int:z>/<int:x>/<int:y>.mvt", TeselaParadasView.as_view(), name="paradas-tesela"),
     path("", include(router.urls)),
 ]
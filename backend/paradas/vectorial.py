@@ -0,0 +1,158 @@
+"""Codificación de teselas vectoriales Mapbox Vector Tile (MVT 2.1) sin dependencias.
+
+Solo cubre lo que necesitan las capas de paradas y rutas: puntos y
+polilíneas con propiedades simples (texto, enteros, reales y booleanos),
+proyectados en Web Mercator sobre la extensión de la tesela.
+"""
+import math
+import struct
+
+from gps.codificacion import escribir_varint, zigzag
+
+
+EXTENSION = 4096
+PUNTO = 1
+LINEA = 2
+
+_MOVER = 1
+_TRAZAR = 2
+
+# Tipo de cable de protobuf
+_VARINT = 0
+_FIJO64 = 1
+_DELIMITADO = 2
+
+
+def _campo(buf, numero, tipo):
+    escribir_varint(buf, (numero << 3) | tipo)
+
+
+def _delimitado(buf, numero, contenido):
+    _campo(buf, numero, _DELIMITADO)
+    escribir_varint(buf, len(contenido))
+    buf.extend(contenido)
+
+
+def _empaquetado(buf, numero, enteros):
+    contenido = bytearray()
+    for n in enteros:
+        escribir_varint(contenido, n)
+    _delimitado(buf, numero, contenido)
+
+
+def _comando(identificador, cantidad):
+    return (identificador & 0x7) | (cantidad << 3)
+
+
+def _valor(valor):
+    buf = bytearray()
+    if isinstance(valor, bool):
+        _campo(buf, 7, _VARINT)
+        escribir_varint(buf, int(valor))
+    elif isinstance(valor, int):
+        _campo(buf, 6, _VARINT)
+        escribir_varint(buf, zigzag(valor))
+    elif isinstance(valor, float):
+        _campo(buf, 3, _FIJO64)
+        buf.extend(struct.pack("<d", valor))
+    else:
+        _delimitado(buf, 1, str(valor).encode())
+    return bytes(buf)
+
+
+def proyectar(lat, lng, z, x, y, extension=EXTENSION):
+    """Coordenadas (enteras) dentro de la tesela z/x/y; pueden caer fuera de [0, extension)."""
+    lat = max(min(lat, 85.0511), -85.0511)
+    n = 1 << z
+    mx = (lng + 180.0) / 360.0 * n
+    my = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return int(round((mx - x) * extension)), int(round((my - y) * extension))
+
+
+def limites_tesela(z, x, y):
+    """`(lat_min, lng_min, lat_max, lng_max)` de la tesela."""
+    n = 1 << z
+
+    def latitud(fila):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * fila / n))))
+
+    return latitud(y + 1), x / n * 360.0 - 180.0, latitud(y), (x + 1) / n * 360.0 - 180.0
+
+
+class Capa:
+    """Capa de una tesela; los nombres y valores de propiedades se deduplican."""
+
+    def __init__(self, nombre, extension=EXTENSION):
+        self.nombre = nombre
+        self.extension = extension
+        self._claves = {}
+        self._valores = {}
+        self._entidades = []
+
+    def _etiquetas(self, propiedades):
+        etiquetas = []
+        for clave, valor in propiedades.items():
+            if valor is None:
+                continue
+            etiquetas.append(self._claves.setdefault(clave, len(self._claves)))
+            codificado = _valor(valor)
+            etiquetas.append(self._valores.setdefault(codificado, len(self._valores)))
+        return etiquetas
+
+    def _agregar(self, identificador, tipo, geometria, propiedades):
+        buf = bytearray()
+        if identificador is not None:
+            _campo(buf, 1, _VARINT)
+            escribir_varint(buf, identificador)
+        etiquetas = self._etiquetas(propiedades)
+        if etiquetas:
+            _empaquetado(buf, 2, etiquetas)
+        _campo(buf, 3, _VARINT)
+        escribir_varint(buf, tipo)
+        _empaquetado(buf, 4, geometria)
+        self._entidades.append(bytes(buf))
+
+    def punto(self, identificador, px, py, propiedades):
+        self._agregar(identificador, PUNTO, [_comando(_MOVER, 1), zigzag(px), zigzag(py)], propiedades)
+
+    def linea(self, identificador, tramos, propiedades):
+        """`tramos`: lista de listas de puntos (px, py) con al menos dos puntos cada una."""
+        geometria = []
+        cx = cy = 0
+        for tramo in tramos:
+            for indice, (px, py) in enumerate(tramo):
+                if indice == 0:
+                    geometria.append(_comando(_MOVER, 1))
+                elif indice == 1:
+                    geometria.append(_comando(_TRAZAR, len(tramo) - 1))
+                geometria.extend((zigzag(px - cx), zigzag(py - cy)))
+                cx, cy = px, py
+        if geometria:
+            self._agregar(identificador, LINEA, geometria, propiedades)
+
+    def __len__(self):
+        return len(self._entidades)
+
+    def codificar(self):
+        buf = bytearray()
+        _campo(buf, 15, _VARINT)
+        escribir_varint(buf, 2)
+        _delimitado(buf, 1, self.nombre.encode())
+        for entidad in self._entidades:
+            _delimitado(buf, 2, entidad)
+        for clave in self._claves:
+            _delimitado(buf, 3, clave.encode())
+        for valor in self._valores:
+            _delimitado(buf, 4, valor)
+        _campo(buf, 5, _VARINT)
+        escribir_varint(buf, self.extension)
+        return bytes(buf)
+
+
+def codificar_tesela(capas):
+    """Bytes de la tesela con las capas no vacías."""
+    buf = bytearray()
+    for capa in capas:
+        if len(capa):
+            _delimitado(buf, 3, capa.codificar())
+    return bytes(buf)
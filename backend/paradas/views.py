@@ -1,7 +1,14 @@
+from django.conf import settings
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from rutas.models import Ruta
+from . import eta, importacion, planificador, secuencia
+from .optimizacion import distancia_recorrido, proponer_orden
+from .busqueda import buscar_cercanas
+from .indice import indice_paradas
 from .models import Parada
 from .serializers import (
     ParadaSerializer,
@@ -23,7 +30,15 @@ class ParadaViewSet(viewsets.ModelViewSet):
     - DELETE /api/paradas/{id}/ - Elimina una parada
     - GET /api/paradas/por-ruta/?ruta_id={id} - Lista paradas por ruta
     - GET /api/paradas/activas/ - Lista solo paradas activas
-    - GET /api/paradas/cercanas/?lat={lat}&lng={lng}&radio={km} - Busca paradas cercanas
+    - GET /api/paradas/cercanas/?lat={lat}&lng={lng}&radio={km}&limit={n} - Paradas más cercanas
+    - GET /api/paradas/{id}/eta/ - Tiempo estimado de llegada de los buses de la ruta
+    - POST /api/paradas/importar/ - Carga masiva de las paradas de una ruta (CSV o GeoJSON)
+    - POST /api/paradas/secuencia/ - Edición por lotes del orden de las paradas de una ruta
+    - GET /api/paradas/planificar/?origen_lat=&origen_lng=&destino_lat=&destino_lng= - Viaje de A a B
+    - GET|POST /api/paradas/optimizar/?ruta={id} - Orden de paradas más corto (POST lo aplica)
+
+    Las capas de mapa (`/api/paradas/geojson/` y `/api/paradas/tiles/`) se
+    sirven desde `paradas.mapa`, fuera del router.
     """
     
     queryset = Parada.objects.all().select_related("ruta")
@@ -67,12 +82,12 @@ class ParadaViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def cercanas(self, request):
         """
-        Busca paradas cercanas a una ubicación dada.
-        Parámetros: lat, lng, radio (en kilómetros, default=5)
+        Busca paradas activas cercanas a una ubicación, ordenadas por distancia.
+        Parámetros: lat, lng, radio (en kilómetros; sin radio se buscan los
+        `limit` vecinos más cercanos), limit (default=20, máximo=100)
         """
         lat = request.query_params.get("lat")
         lng = request.query_params.get("lng")
-        radio = float(request.query_params.get("radio", 5))
         
         if not lat or not lng:
             return Response(
@@ -83,26 +98,35 @@ class ParadaViewSet(viewsets.ModelViewSet):
         try:
             lat = float(lat)
             lng = float(lng)
+            radio = request.query_params.get("radio")
+            radio = float(radio) if radio else None
+            limite = min(int(request.query_params.get("limit", 20)), 100)
         except ValueError:
             return Response(
-                {"error": "Las coordenadas deben ser números válidos."},
+                {"error": "Las coordenadas, 'radio' y 'limit' deben ser números válidos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or limite < 1 or (radio is not None and radio <= 0):
+            return Response(
+                {"error": "Coordenadas fuera de rango o 'radio'/'limit' no positivos."},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Cálculo aproximado de rango en grados (1 grado ≈ 111 km)
-        delta = radio / 111.0
-        
-        paradas = self.queryset.filter(
-            coordenada_lat__range=(lat - delta, lat + delta),
-            coordenada_lng__range=(lng - delta, lng + delta),
-            activa=True
-        )
-        
-        serializer = ParadaListSerializer(paradas, many=True)
+        radio_m = radio * 1000 if radio is not None else None
+        if settings.PARADAS_INDICE_EN_MEMORIA:
+            resultados = indice_paradas.cercanas(
+                lat, lng, radio_m=radio_m or settings.PARADAS_CERCANAS_RADIO_MAX_M, limite=limite
+            )
+            paradas = [dict(datos, distancia_m=round(distancia, 1)) for distancia, datos in resultados]
+        else:
+            resultados = buscar_cercanas(self.queryset.filter(activa=True), lat, lng, radio_m=radio_m, limite=limite)
+            paradas = ParadaListSerializer([parada for _, parada in resultados], many=True).data
+            for item, (distancia, _) in zip(paradas, resultados):
+                item["distancia_m"] = round(distancia, 1)
         return Response({
             "radio_km": radio,
             "centro": {"lat": lat, "lng": lng},
-            "paradas": serializer.data
+            "paradas": paradas
         })
 
     @action(detail=True, methods=["patch"])
@@ -114,3 +138,199 @@ class ParadaViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(parada)
         return Response(serializer.data)
+
+    @action(detail=True, methods=["get"])
+    def eta(self, request, pk=None):
+        """Distancia restante y tiempo estimado de llegada de cada bus activo."""
+        parada = self.get_object()
+        resultado = eta.eta_parada(parada)
+        if resultado is None:
+            return Response(
+                {"error": "La parada no está activa en la secuencia de su ruta."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(resultado)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        parser_classes=[MultiPartParser, FormParser, JSONParser],
+    )
+    def importar(self, request):
+        """
+        Importa las paradas de una ruta en una sola transacción.
+
+        - multipart: `ruta`, `archivo` (.csv o .geojson), `formato` y `reemplazar` opcionales
+        - JSON: una FeatureCollection en el cuerpo y `?ruta={id}` en la URL
+        """
+        datos = request.data
+        archivo = request.FILES.get("archivo")
+        ruta_id = request.query_params.get("ruta") or (datos.get("ruta") if archivo else None)
+        if not ruta_id:
+            return Response(
+                {"error": "El parámetro 'ruta' es requerido."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ruta = Ruta.objects.get(pk=int(ruta_id))
+        except (ValueError, Ruta.DoesNotExist):
+            return Response({"error": "La ruta no existe."}, status=status.HTTP_400_BAD_REQUEST)
+        if not ruta.capacidad_activa:
+            return Response({"error": "La ruta no está activa."}, status=status.HTTP_400_BAD_REQUEST)
+
+        parametros = datos if archivo else request.query_params
+        reemplazar = str(parametros.get("reemplazar", "")).lower() in importacion.VERDADEROS
+        try:
+            if archivo is not None:
+                formato = parametros.get("formato") or importacion.detectar_formato(archivo.name)
+                filas = importacion.leer(archivo.read(), formato)
+            else:
+                filas = importacion.leer_geojson(datos)
+        except (importacion.ErrorFormato, UnicodeDecodeError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if len(filas) > settings.PARADAS_IMPORTACION_MAX_FILAS:
+            return Response(
+                {"error": f"El archivo supera el máximo de {settings.PARADAS_IMPORTACION_MAX_FILAS} paradas."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultado = importacion.importar_paradas(ruta, filas, reemplazar=reemplazar)
+        resultado["recibidas"] = len(filas)
+        return Response(
+            resultado,
+            status=status.HTTP_400_BAD_REQUEST if resultado["errores"] else status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=["post"], url_path="secuencia")
+    def editar_secuencia(self, request):
+        """
+        Aplica un lote de operaciones (insertar, mover, eliminar, alternar) a
+        la secuencia de paradas de una ruta, todo o nada.
+
+        Cuerpo: `{"ruta": id, "version": n (opcional), "operaciones": [...]}`.
+        Con `version` responde 409 si la ruta cambió desde entonces.
+        """
+        ruta_id = request.data.get("ruta")
+        operaciones = request.data.get("operaciones")
+        version = request.data.get("version")
+        if not isinstance(ruta_id, int) or isinstance(ruta_id, bool):
+            return Response(
+                {"error": "El campo 'ruta' es requerido y debe ser un entero."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not isinstance(operaciones, list) or not operaciones:
+            return Response(
+                {"error": "El campo 'operaciones' debe ser una lista no vacía."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+            return Response({"error": "El campo 'version' debe ser un entero."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resultado = secuencia.aplicar_operaciones(ruta_id, operaciones, version=version)
+        except Ruta.DoesNotExist:
+            return Response({"error": "La ruta no existe."}, status=status.HTTP_400_BAD_REQUEST)
+        except secuencia.VersionDesactualizada as exc:
+            return Response({"error": str(exc), "version": exc.actual}, status=status.HTTP_409_CONFLICT)
+        if resultado["errores"]:
+            return Response(resultado, status=status.HTTP_400_BAD_REQUEST)
+
+        paradas = self.queryset.filter(ruta_id=ruta_id).order_by("orden")
+        resultado["paradas"] = ParadaListSerializer(paradas, many=True).data
+        return Response(resultado)
+
+    @action(detail=False, methods=["get"])
+    def planificar(self, request):
+        """Mejor combinación de caminatas y buses entre dos coordenadas."""
+        nombres = ["origen_lat", "origen_lng", "destino_lat", "destino_lng"]
+        try:
+            origen_lat, origen_lng, destino_lat, destino_lng = (
+                float(request.query_params[nombre]) for nombre in nombres
+            )
+        except KeyError:
+            return Response(
+                {"error": f"Los parámetros {', '.join(nombres)} son requeridos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError:
+            return Response(
+                {"error": "Las coordenadas deben ser números válidos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(-90 <= lat <= 90 for lat in (origen_lat, destino_lat)) or \
+                not all(-180 <= lng <= 180 for lng in (origen_lng, destino_lng)):
+            return Response({"error": "Coordenadas fuera de rango."}, status=status.HTTP_400_BAD_REQUEST)
+
+        viaje = planificador.planificar((origen_lat, origen_lng), (destino_lat, destino_lng))
+        if viaje is None:
+            return Response(
+                {"error": "No hay paradas a distancia de caminata que conecten el origen con el destino."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(viaje)
+
+    @action(detail=False, methods=["get", "post"])
+    def optimizar(self, request):
+        """
+        Propone un orden más corto para las paradas activas de una ruta.
+
+        Parámetros: ruta, fijar_inicio y fijar_fin (mantienen la primera y la
+        última parada). Con POST se aplica, como un lote de `secuencia`, el
+        `orden` revisado que envíe el cliente (ids de todas las paradas
+        activas) o, sin él, la propuesta recién calculada; acepta `version`
+        para detectar ediciones concurrentes. Las paradas inactivas conservan
+        su posición.
+        """
+        parametros = request.query_params if request.method == "GET" else request.data
+        try:
+            ruta_id = int(parametros.get("ruta"))
+            version = parametros.get("version")
+            version = int(version) if version is not None else None
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "El parámetro 'ruta' es requerido y, como 'version', debe ser un entero."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        fijar_inicio = str(parametros.get("fijar_inicio", "")).lower() in importacion.VERDADEROS
+        fijar_fin = str(parametros.get("fijar_fin", "")).lower() in importacion.VERDADEROS
+        if not Ruta.objects.filter(pk=ruta_id).exists():
+            return Response({"error": "La ruta no existe."}, status=status.HTTP_400_BAD_REQUEST)
+
+        todas = list(self.queryset.filter(ruta_id=ruta_id).order_by("orden", "id"))
+        paradas = [parada for parada in todas if parada.activa]
+        revisado = parametros.get("orden") if request.method == "POST" else None
+        if revisado is not None:
+            por_id = {parada.id: parada for parada in paradas}
+            if (
+                not isinstance(revisado, list)
+                or not all(isinstance(parada_id, int) for parada_id in revisado)
+                or len(revisado) != len(por_id)
+                or set(revisado) != set(por_id)
+            ):
+                return Response(
+                    {"error": "'orden' debe listar una vez cada parada activa de la ruta."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            propuesta = [por_id[parada_id] for parada_id in revisado]
+            actual, nueva = distancia_recorrido(paradas), distancia_recorrido(propuesta)
+        else:
+            propuesta, actual, nueva = proponer_orden(paradas, fijar_inicio=fijar_inicio, fijar_fin=fijar_fin)
+        datos = {
+            "ruta": ruta_id,
+            "distancia_actual_m": round(actual, 1),
+            "distancia_propuesta_m": round(nueva, 1),
+            "ahorro_m": round(actual - nueva, 1),
+            "ahorro_porcentaje": round((actual - nueva) / actual * 100, 1) if actual else 0.0,
+            "orden": [parada.id for parada in propuesta],
+            "paradas": ParadaListSerializer(propuesta, many=True).data,
+        }
+        if request.method == "POST":
+            operaciones = secuencia.reordenar_activas(todas, propuesta)
+            try:
+                resultado = secuencia.aplicar_operaciones(ruta_id, operaciones, version=version)
+            except secuencia.VersionDesactualizada as exc:
+                return Response({"error": str(exc), "version": exc.actual}, status=status.HTTP_409_CONFLICT)
+            if resultado["errores"]:
+                return Response({"errores": resultado["errores"]}, status=status.HTTP_400_BAD_REQUEST)
+            datos["version"] = resultado["version"]
+        return Response(datos)
@@ -1,14 +1,23 @@
-from django.contrib import admin
-from .models import Ruta, Bus, TipoEstado
+from django.contrib import admin, messages
+from . import asignacion
+from .consultas import rutas_con_resumen
+from .models import Ruta, Bus, TipoEstado, Viaje
 
 
 @admin.register(Ruta)
 class RutaAdmin(admin.ModelAdmin):
-    list_display = ("nombre_ruta", "capacidad_activa", "capacidad_espera", "mostrar_buses")
+    list_display = (
+        "nombre_ruta", "capacidad_activa", "capacidad_espera", "mostrar_buses", "paradas_activas", "desvios_abiertos"
+    )
     search_fields = ("nombre_ruta",)
     list_filter = ("capacidad_activa", "capacidad_espera")
     ordering = ("nombre_ruta",)
     filter_horizontal = ("buses",)  # Esto sirve para editar el ManyToMany fácilmente en admin
+    actions = ["asignar_buses_por_demanda"]
+
+    def get_queryset(self, request):
+        # Buses precargados y conteos anotados: sin una consulta por fila
+        return rutas_con_resumen(super().get_queryset(request))
 
     def mostrar_buses(self, obj):
         # Muestra todas las placas de los buses asociados
@@ -16,6 +25,29 @@ class RutaAdmin(admin.ModelAdmin):
 
     mostrar_buses.short_description = "Buses asignados"
 
+    @admin.display(description="Paradas activas", ordering="paradas_activas")
+    def paradas_activas(self, obj):
+        return obj.paradas_activas
+
+    @admin.display(description="Desvíos abiertos", ordering="desvios_abiertos")
+    def desvios_abiertos(self, obj):
+        return obj.desvios_abiertos
+
+    @admin.action(description="Reasignar buses de las rutas seleccionadas según la demanda de reservas")
+    def asignar_buses_por_demanda(self, request, queryset):
+        problema = asignacion.cargar_problema(Ruta.objects.filter(pk__in=queryset.values("pk")))
+        plan = asignacion.resolver(problema)
+        agregadas, quitadas = asignacion.aplicar(plan, problema)
+        if not agregadas and not quitadas:
+            self.message_user(request, "La asignación actual ya es la mejor encontrada.")
+            return
+        self.message_user(
+            request,
+            f"Estudiantes sin cupo: {plan.espera_antes} -> {plan.espera_despues} "
+            f"({agregadas} asignaciones agregadas, {quitadas} quitadas).",
+            messages.SUCCESS,
+        )
+
 @admin.register(Bus)
 class BusAdmin(admin.ModelAdmin):
     list_display = ("placa", "marca", "modelo", "estado_bus")
@@ -40,3 +72,11 @@ class TipoEstadoAdmin(admin.ModelAdmin):
     list_filter = ("ruta",)
     ordering = ("nombre_estado",)
     list_select_related = ("ruta",)
+
+
+@admin.register(Viaje)
+class ViajeAdmin(admin.ModelAdmin):
+    list_display = ("ruta", "hora_salida", "dias_semana", "bus", "activo")
+    list_filter = ("activo", "ruta")
+    ordering = ("ruta", "hora_salida")
+    list_select_related = ("ruta", "bus")
@@ -0,0 +1,251 @@
+"""Asignación de buses a rutas según la demanda de reservas.
+
+La demanda de cada ruta es la suma de sus reservas vigentes (reservadas y
+en espera, de los contadores de `gestion_cupo.OcupacionRuta`). Cada bus
+disponible (estado en `RUTAS_ASIGNACION_ESTADOS_BUS` y con capacidad) se
+asigna a una sola ruta o a ninguna, buscando, en este orden:
+
+1. el menor número de estudiantes sin cupo (demanda que excede la suma de
+   capacidades de los buses de la ruta);
+2. el menor número de buses que cambian de ruta respecto a lo vigente.
+
+Se parte del mejor entre la asignación vigente y una voraz (buses de mayor
+a menor capacidad hacia la ruta con más déficit) y se mejora con búsqueda
+local: mover un bus de ruta e intercambiar dos buses, hasta que ninguna
+jugada mejora o se agota el tiempo. El resultado se aplica como un único
+diff sobre la tabla intermedia `Ruta.buses`.
+
+Un bus que hoy sirve a varias rutas no se mueve: queda fuera del problema
+y su capacidad cuenta como fija en cada una de sus rutas, igual antes que
+después, así que ni se le quitan rutas ni cambia la espera que se reporta.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+from sincronizacion.registro import registrar_cambios
+
+from .models import Bus, Ruta
+from .snapshot import invalidar_al_confirmar
+
+
+# `fija`: {ruta_id: capacidad de los buses compartidos, que no se mueven}
+Problema = namedtuple("Problema", "demandas capacidades actual fija", defaults=(None,))
+Plan = namedtuple("Plan", "asignacion espera_antes espera_despues cambios")
+
+
+def _espera(demanda, carga):
+    return max(demanda - carga, 0)
+
+
+def _cambio(actual, bus_id, ruta_id):
+    """1 si dejar el bus en `ruta_id` (None: sin ruta) cambia su asignación vigente."""
+    if ruta_id is None:
+        return int(bool(actual[bus_id]))
+    return int(ruta_id not in actual[bus_id])
+
+
+def cargar_problema(rutas=None):
+    """
+    Demanda por ruta, buses disponibles y su asignación vigente.
+
+    Con un subconjunto de rutas solo entran los buses que no sirven a
+    ninguna ruta fuera de él, para no quitárselos a las demás. Los buses
+    que sirven a varias rutas pasan a `fija`.
+    """
+    rutas = Ruta.objects.all() if rutas is None else rutas
+    demandas = dict(
+        rutas.annotate(
+            demanda=Coalesce(F("ocupacion__reservados"), Value(0)) + Coalesce(F("ocupacion__en_espera"), Value(0))
+        ).values_list("id", "demanda")
+    )
+    estados = Q()
+    for estado in settings.RUTAS_ASIGNACION_ESTADOS_BUS:
+        estados |= Q(estado_bus__iexact=estado)
+    buses = Bus.objects.filter(estados, capacidad__gt=0)
+    if len(demandas) < Ruta.objects.count():
+        buses = buses.exclude(rutas__in=Ruta.objects.exclude(pk__in=demandas))
+    capacidades = dict(buses.values_list("id", "capacidad"))
+
+    actual = {bus_id: set() for bus_id in capacidades}
+    filas = Ruta.buses.through.objects.filter(bus_id__in=capacidades, ruta_id__in=demandas)
+    for ruta_id, bus_id in filas.values_list("ruta_id", "bus_id"):
+        actual[bus_id].add(ruta_id)
+
+    fija = dict.fromkeys(demandas, 0)
+    for bus_id in [bus_id for bus_id, rutas in actual.items() if len(rutas) > 1]:
+        for ruta_id in actual.pop(bus_id):
+            fija[ruta_id] += capacidades[bus_id]
+        del capacidades[bus_id]
+    return Problema(demandas, capacidades, actual, fija)
+
+
+def _sin_fija(demandas, fija):
+    """Demanda que queda por cubrir con los buses movibles."""
+    fija = fija or {}
+    return {ruta_id: max(demanda - fija.get(ruta_id, 0), 0) for ruta_id, demanda in demandas.items()}
+
+
+def espera_total(demandas, capacidades, asignacion, fija=None):
+    """Estudiantes sin cupo; `asignacion`: {bus_id: conjunto de rutas}."""
+    demandas = _sin_fija(demandas, fija)
+    carga = dict.fromkeys(demandas, 0)
+    for bus_id, rutas in asignacion.items():
+        for ruta_id in rutas:
+            carga[ruta_id] += capacidades[bus_id]
+    return sum(_espera(demandas[ruta_id], carga[ruta_id]) for ruta_id in demandas)
+
+
+def _voraz(demandas, capacidades, actual):
+    deficit = dict(demandas)
+    asignacion = {}
+    for bus_id in sorted(capacidades, key=lambda b: (-capacidades[b], b)):
+        capacidad = capacidades[bus_id]
+        mejor = max(
+            deficit,
+            key=lambda r: (min(capacidad, deficit[r]), r in actual[bus_id], deficit[r], -r),
+            default=None,
+        )
+        if mejor is None or deficit[mejor] <= 0:
+            # No reduce la espera en ninguna ruta: se queda donde estaba
+            mejor = min(actual[bus_id], default=None)
+        else:
+            deficit[mejor] -= capacidad
+        asignacion[bus_id] = mejor
+    return asignacion
+
+
+def _costo(demandas, capacidades, actual, asignacion):
+    carga = dict.fromkeys(demandas, 0)
+    for bus_id, ruta_id in asignacion.items():
+        if ruta_id is not None:
+            carga[ruta_id] += capacidades[bus_id]
+    espera = sum(_espera(demandas[r], carga[r]) for r in demandas)
+    cambios = sum(_cambio(actual, bus_id, ruta_id) for bus_id, ruta_id in asignacion.items())
+    return espera, cambios, carga
+
+
+def _busqueda_local(demandas, capacidades, actual, asignacion, limite):
+    _, _, carga = _costo(demandas, capacidades, actual, asignacion)
+    destinos = [*demandas, None]
+    buses = sorted(asignacion)
+
+    def delta_espera(ruta_id, cambio):
+        if ruta_id is None:
+            return 0
+        return _espera(demandas[ruta_id], carga[ruta_id] + cambio) - _espera(demandas[ruta_id], carga[ruta_id])
+
+    def mover(bus_id, ruta_id):
+        anterior = asignacion[bus_id]
+        if anterior is not None:
+            carga[anterior] -= capacidades[bus_id]
+        if ruta_id is not None:
+            carga[ruta_id] += capacidades[bus_id]
+        asignacion[bus_id] = ruta_id
+
+    mejoro = True
+    while mejoro and time.perf_counter() < limite:
+        mejoro = False
+        for bus_id in buses:
+            origen, capacidad = asignacion[bus_id], capacidades[bus_id]
+            for destino in destinos:
+                if destino == origen:
+                    continue
+                delta = (
+                    delta_espera(origen, -capacidad) + delta_espera(destino, capacidad),
+                    _cambio(actual, bus_id, destino) - _cambio(actual, bus_id, origen),
+                )
+                if delta < (0, 0):
+                    mover(bus_id, destino)
+                    origen = destino
+                    mejoro = True
+        for i, bus_a in enumerate(buses):
+            if time.perf_counter() >= limite:
+                break
+            for bus_b in buses[i + 1:]:
+                ruta_a, ruta_b = asignacion[bus_a], asignacion[bus_b]
+                if ruta_a == ruta_b:
+                    continue
+                diferencia = capacidades[bus_b] - capacidades[bus_a]
+                if diferencia == 0:
+                    continue
+                delta = (
+                    delta_espera(ruta_a, diferencia) + delta_espera(ruta_b, -diferencia),
+                    _cambio(actual, bus_a, ruta_b) + _cambio(actual, bus_b, ruta_a)
+                    - _cambio(actual, bus_a, ruta_a) - _cambio(actual, bus_b, ruta_b),
+                )
+                if delta < (0, 0):
+                    mover(bus_a, ruta_b)
+                    mover(bus_b, ruta_a)
+                    mejoro = True
+    return asignacion
+
+
+def resolver(problema, tiempo_max=None):
+    """Plan de asignación `{bus_id: ruta_id o None}` para el problema dado."""
+    demandas, capacidades, actual, fija = problema
+    demandas = _sin_fija(demandas, fija)
+    tiempo_max = settings.RUTAS_ASIGNACION_TIEMPO_MAX_S if tiempo_max is None else tiempo_max
+    limite = time.perf_counter() + tiempo_max
+
+    # Los buses compartidos ya están en `fija`: aquí cada bus tiene a lo sumo una ruta
+    vigente = {bus_id: min(rutas, default=None) for bus_id, rutas in actual.items()}
+    candidatas = [vigente, _voraz(demandas, capacidades, actual)]
+    mejor = None
+    for inicial in candidatas:
+        asignacion = _busqueda_local(demandas, capacidades, actual, dict(inicial), limite)
+        costo = _costo(demandas, capacidades, actual, asignacion)[:2]
+        if mejor is None or costo < mejor[0]:
+            mejor = (costo, asignacion)
+
+    (espera, cambios), asignacion = mejor
+    return Plan(asignacion, espera_total(demandas, capacidades, actual), espera, cambios)
+
+
+def aplicar(plan, problema):
+    """
+    Lleva la tabla intermedia a la asignación del plan con un solo borrado y
+    una sola inserción. Solo toca filas entre las rutas y buses del problema.
+    Devuelve `(agregadas, quitadas)`.
+    """
+    Intermedia = Ruta.buses.through
+    with transaction.atomic():
+        vigentes = {
+            (ruta_id, bus_id): pk
+            for pk, ruta_id, bus_id in Intermedia.objects.filter(
+                ruta_id__in=problema.demandas, bus_id__in=problema.capacidades
+            ).values_list("id", "ruta_id", "bus_id")
+        }
+        objetivo = {(ruta_id, bus_id) for bus_id, ruta_id in plan.asignacion.items() if ruta_id is not None}
+        quitar = [pk for par, pk in vigentes.items() if par not in objetivo]
+        agregar = sorted(objetivo - vigentes.keys())
+        Intermedia.objects.filter(pk__in=quitar).delete()
+        Intermedia.objects.bulk_create([Intermedia(ruta_id=ruta_id, bus_id=bus_id) for ruta_id, bus_id in agregar])
+
+        # Las escrituras masivas no emiten m2m_changed
+        rutas = {ruta_id for ruta_id, _ in objetivo.symmetric_difference(vigentes)}
+        registrar_cambios(Ruta, rutas)
+        invalidar_al_confirmar(rutas)
+    return len(agregar), len(quitar)
+
+
+def resumen_por_ruta(plan, problema):
+    """Filas `(ruta_id, demanda, capacidad antes, capacidad después)` de las rutas que cambian."""
+    fija = problema.fija or {}
+    antes = {ruta_id: fija.get(ruta_id, 0) for ruta_id in problema.demandas}
+    despues = dict(antes)
+    for bus_id, rutas in problema.actual.items():
+        for ruta_id in rutas:
+            antes[ruta_id] += problema.capacidades[bus_id]
+    for bus_id, ruta_id in plan.asignacion.items():
+        if ruta_id is not None:
+            despues[ruta_id] += problema.capacidades[bus_id]
+    return [
+        (ruta_id, problema.demandas[ruta_id], antes[ruta_id], despues[ruta_id])
+        for ruta_id in sorted(problema.demandas)
+        if antes[ruta_id] != despues[ruta_id]
+    ]
@@ -0,0 +1,37 @@
+"""Modelo de lectura de rutas: buses precargados y conteos agregados.
+
+Los conteos se anotan con subconsultas correlacionadas (una por relación)
+en lugar de `Count` sobre joins, que multiplicarían las filas entre sí.
+Las reservas por estado se leen de los contadores de `OcupacionRuta`
+(un LEFT JOIN uno a uno) en lugar de contarse en cada listado.
+Con `prefetch_related("buses")` un listado cuesta un número fijo de
+consultas sin importar cuántas rutas tenga la página.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Ruta
+
+
+def _conteo(queryset, campo="ruta"):
+    """Subconsulta con el número de filas de `queryset` por ruta (0 si no hay)."""
+    conteo = (
+        queryset.filter(**{campo: OuterRef("pk")}).order_by().values(campo)
+        .annotate(total=Count("pk")).values("total")
+    )
+    return Coalesce(Subquery(conteo, output_field=IntegerField()), Value(0))
+
+
+def rutas_con_resumen(queryset=None):
+    from gps.desvios import ESTADO_ABIERTO
+    from gps.models import EventoDesvio
+    from paradas.models import Parada
+
+    queryset = Ruta.objects.all() if queryset is None else queryset
+    return queryset.prefetch_related("buses").annotate(
+        paradas_activas=_conteo(Parada.objects.filter(activa=True)),
+        buses_asignados=_conteo(Ruta.buses.through.objects.all()),
+        reservas_reservadas=Coalesce(F("ocupacion__reservados"), Value(0)),
+        reservas_en_espera=Coalesce(F("ocupacion__en_espera"), Value(0)),
+        desvios_abiertos=_conteo(EventoDesvio.objects.filter(estado=ESTADO_ABIERTO)),
+    )
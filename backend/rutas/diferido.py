@@ -0,0 +1,43 @@
+"""Tareas diferidas al confirmar la transacción, sin duplicados.
+
+Varias escrituras en la misma transacción (p. ej. editar muchas paradas de
+una ruta desde el admin) pueden pedir el mismo recálculo; `al_confirmar`
+lo agenda una sola vez por clave y lo ejecuta tras el commit. Fuera de un
+bloque atómico se ejecuta de inmediato, como `transaction.on_commit`.
+"""
+import threading
+
+from django.db import transaction
+
+
+_estado = threading.local()
+
+
+def _pendientes():
+    if not hasattr(_estado, "tareas"):
+        _estado.tareas = {}
+        _estado.callback = None
+    return _estado.tareas
+
+
+def _ejecutar():
+    tareas = _pendientes()
+    _estado.callback = None
+    while tareas:
+        _, (funcion, args) = tareas.popitem()
+        funcion(*args)
+
+
+def al_confirmar(clave, funcion, *args, using=None):
+    """Agenda `funcion(*args)` para después del commit, una vez por `clave`."""
+    _pendientes()[clave] = (funcion, args)
+    conexion = transaction.get_connection(using)
+    # Un callback por lote de tareas; si un rollback lo descartó, se registra otro
+    if not any(callback is _estado.callback for _, callback, _ in conexion.run_on_commit):
+        _estado.callback = lambda: _ejecutar()
+        transaction.on_commit(_estado.callback, using=using)
+
+
+def descartar(clave):
+    """Cancela una tarea pendiente, p. ej. si quien la agendó ya hizo el trabajo."""
+    _pendientes().pop(clave, None)
@@ -0,0 +1,126 @@
+"""Horarios de las rutas: índice en memoria de las salidas por parada.
+
+Cada `Viaje` sale de la primera parada activa de su ruta a `hora_salida` en
+sus días de operación; la hora de paso por las demás paradas se deriva de
+la secuencia (`Parada.distancia_acumulada_m` a `RUTAS_HORARIOS_VELOCIDAD_KMH`
+más `RUTAS_HORARIOS_DETENCION_S` por parada anterior).
+
+Para cada parada se guarda una lista ordenada de segundos desde el lunes
+00:00 (hora local), con el viaje en una lista paralela; "próximas N salidas
+después de T" es una búsqueda binaria más N pasos, dando la vuelta a la
+semana si hace falta. El índice se reconstruye solo cuando cambian los
+viajes o la secuencia de paradas de una ruta: la versión compartida de
+`rutas.versiones` avisa a todos los procesos.
+"""
+import threading
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import versiones
+from .models import Viaje
+
+
+CLAVE_VERSION = "rutas:horarios:version"
+DIA = 24 * 3600
+SEMANA = 7 * DIA
+
+
+def _segundos(hora):
+    return hora.hour * 3600 + hora.minute * 60 + hora.second
+
+
+def dias_de(texto):
+    """Días de operación (0 = lunes) a partir de `Viaje.dias_semana`."""
+    return sorted({int(d) for d in texto if d in "0123456"})
+
+
+def _inicio_semana(local):
+    """Lunes 00:00 de la semana de `local` (hora local)."""
+    return (local - timedelta(days=local.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class IndiceHorarios:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos = None
+        self._version = None
+
+    def _cargar(self):
+        from paradas.models import Parada
+
+        viajes = {
+            pk: {"id": pk, "ruta": ruta_id, "ruta_nombre": nombre, "bus": bus_id, "hora_salida": hora, "dias": dias}
+            for pk, ruta_id, nombre, bus_id, hora, dias in Viaje.objects.filter(activo=True).values_list(
+                "id", "ruta_id", "ruta__nombre_ruta", "bus_id", "hora_salida", "dias_semana"
+            )
+        }
+        velocidad = settings.RUTAS_HORARIOS_VELOCIDAD_KMH / 3.6
+        detencion = settings.RUTAS_HORARIOS_DETENCION_S
+        desfases = {}  # ruta -> [(parada_id, segundos desde la salida)]
+        filas = (
+            Parada.objects.filter(activa=True, ruta_id__in={v["ruta"] for v in viajes.values()})
+            .order_by("ruta_id", "orden", "id").values_list("ruta_id", "id", "distancia_acumulada_m")
+        )
+        for ruta_id, parada_id, distancia in filas:
+            paradas = desfases.setdefault(ruta_id, [])
+            paradas.append((parada_id, round((distancia or 0) / velocidad + detencion * len(paradas))))
+
+        salidas = {}
+        for viaje in viajes.values():
+            for dia in dias_de(viaje["dias"]):
+                base = dia * DIA + _segundos(viaje["hora_salida"])
+                for parada_id, desfase in desfases.get(viaje["ruta"], []):
+                    salidas.setdefault(parada_id, []).append(((base + desfase) % SEMANA, viaje["id"]))
+
+        por_parada = {}
+        for parada_id, lista in salidas.items():
+            lista.sort()
+            por_parada[parada_id] = ([t for t, _ in lista], [v for _, v in lista])
+        self._datos = (por_parada, viajes, desfases)
+
+    def _preparado(self):
+        with self._lock:
+            version = versiones.actual(CLAVE_VERSION)
+            if self._datos is None or version != self._version:
+                self._cargar()
+                self._version = version
+            return self._datos
+
+    def proximas_salidas(self, parada_id, desde=None, limite=5):
+        """Lista de `(hora de paso, viaje)` por la parada a partir de `desde`, en orden."""
+        por_parada, viajes, _ = self._preparado()
+        tiempos, ids = por_parada.get(parada_id, ((), ()))
+        if not tiempos:
+            return []
+        local = timezone.localtime(desde)
+        inicio = _inicio_semana(local)
+        actual = local.weekday() * DIA + _segundos(local) + local.microsecond / 1e6
+        i = bisect_left(tiempos, actual)
+        resultado = []
+        for k in range(i, i + min(limite, len(tiempos))):
+            semanas, j = divmod(k, len(tiempos))
+            resultado.append((inicio + timedelta(seconds=tiempos[j] + semanas * SEMANA), viajes[ids[j]]))
+        return resultado
+
+    def horario_viaje(self, viaje_id):
+        """`[(parada_id, segundos desde la salida)]` del viaje, o `None` si no está activo."""
+        _, viajes, desfases = self._preparado()
+        if viaje_id not in viajes:
+            return None
+        return desfases.get(viajes[viaje_id]["ruta"], [])
+
+    def invalidar(self):
+        with self._lock:
+            self._datos = None
+            versiones.avanzar(CLAVE_VERSION)
+
+
+indice_horarios = IndiceHorarios()
+
+
+def invalidar_al_confirmar():
+    transaction.on_commit(indice_horarios.invalidar)
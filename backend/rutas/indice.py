@@ -0,0 +1,143 @@
+"""Índice espacial en memoria de los trazados de las rutas.
+
+`Ruta.trazado` guarda la polilínea codificada (precisión 6) de sus paradas
+activas en orden; la mantiene `paradas.geometria.recalcular_geometria`.
+Cada proceso decodifica los trazados una vez, precalcula la caja
+envolvente de cada segmento y las agrupa en un R-tree empaquetado (STR),
+de modo que "qué rutas pasan cerca de este punto" solo mide la distancia
+a los pocos segmentos cuya caja toca el radio de búsqueda.
+
+La versión compartida de `rutas.versiones` permite que todos los procesos
+recarguen cuando cambia algún trazado.
+"""
+import math
+import threading
+
+from gps.codificacion import codificar_polyline, decodificar_polyline
+
+from . import versiones
+
+
+CLAVE_VERSION = "rutas:trazados:version"
+PRECISION = 6
+RADIO_TIERRA_M = 6371008.8
+METROS_POR_GRADO = math.pi * RADIO_TIERRA_M / 180
+
+
+def codificar_trazado(puntos):
+    """Polilínea de una secuencia de `(lat, lng)`; vacía si no hay al menos un segmento."""
+    return codificar_polyline(puntos, precision=PRECISION) if len(puntos) >= 2 else ""
+
+
+def decodificar_trazado(texto):
+    return decodificar_polyline(texto, precision=PRECISION) if texto else []
+
+
+class ArbolR:
+    """R-tree estático de cajas `(lat_min, lng_min, lat_max, lng_max, dato)`, empaquetado por STR."""
+
+    def __init__(self, cajas, capacidad=16):
+        self.capacidad = capacidad
+        nivel = [(*caja[:4], caja[4], True) for caja in cajas]
+        while len(nivel) > capacidad:
+            nivel = self._empaquetar(nivel)
+        self.raiz = self._nodo(nivel) if nivel else None
+
+    @staticmethod
+    def _nodo(hijos):
+        return (
+            min(h[0] for h in hijos), min(h[1] for h in hijos),
+            max(h[2] for h in hijos), max(h[3] for h in hijos),
+            hijos, False,
+        )
+
+    def _empaquetar(self, elementos):
+        # Sort-Tile-Recursive: franjas verticales por longitud, luego grupos por latitud
+        grupos = math.ceil(len(elementos) / self.capacidad)
+        por_franja = math.ceil(math.sqrt(grupos)) * self.capacidad
+        elementos = sorted(elementos, key=lambda e: e[1] + e[3])
+        nodos = []
+        for inicio in range(0, len(elementos), por_franja):
+            franja = sorted(elementos[inicio:inicio + por_franja], key=lambda e: e[0] + e[2])
+            for desde in range(0, len(franja), self.capacidad):
+                nodos.append(self._nodo(franja[desde:desde + self.capacidad]))
+        return nodos
+
+    def buscar(self, lat_min, lng_min, lat_max, lng_max):
+        """Datos de las cajas que intersecan la caja dada."""
+        if self.raiz is None:
+            return []
+        encontrados = []
+        pila = [self.raiz]
+        while pila:
+            nodo = pila.pop()
+            if nodo[0] > lat_max or nodo[2] < lat_min or nodo[1] > lng_max or nodo[3] < lng_min:
+                continue
+            if nodo[5]:
+                encontrados.append(nodo[4])
+            else:
+                pila.extend(nodo[4])
+        return encontrados
+
+
+def distancia_segmento_m(lat, lng, lat1, lng1, lat2, lng2):
+    """Distancia aproximada (proyección equirectangular local) de un punto a un segmento."""
+    escala = math.cos(math.radians(lat))
+    ax, ay = (lng1 - lng) * escala, lat1 - lat
+    bx, by = (lng2 - lng) * escala, lat2 - lat
+    dx, dy = bx - ax, by - ay
+    largo2 = dx * dx + dy * dy
+    t = 0.0 if largo2 == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / largo2))
+    return math.hypot(ax + t * dx, ay + t * dy) * METROS_POR_GRADO
+
+
+class IndiceRutas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._arbol = None
+        self._rutas = {}
+        self._version = None
+
+    def _cargar(self):
+        from .models import Ruta
+
+        rutas, cajas = {}, []
+        for pk, nombre, trazado in Ruta.objects.exclude(trazado="").values_list("id", "nombre_ruta", "trazado"):
+            puntos = decodificar_trazado(trazado)
+            rutas[pk] = {"id": pk, "nombre_ruta": nombre, "trazado": trazado}
+            for (lat1, lng1), (lat2, lng2) in zip(puntos, puntos[1:]):
+                cajas.append((
+                    min(lat1, lat2), min(lng1, lng2), max(lat1, lat2), max(lng1, lng2),
+                    (pk, lat1, lng1, lat2, lng2),
+                ))
+        self._rutas = rutas
+        self._arbol = ArbolR(cajas)
+
+    def _preparado(self):
+        with self._lock:
+            version = versiones.actual(CLAVE_VERSION)
+            if self._arbol is None or version != self._version:
+                self._cargar()
+                self._version = version
+            return self._arbol, self._rutas
+
+    def cercanas(self, lat, lng, radio_m, limite=20):
+        """Rutas cuyo trazado pasa a menos de `radio_m`: lista de `(distancia_m, datos)` ordenada."""
+        arbol, rutas = self._preparado()
+        dlat = radio_m / METROS_POR_GRADO
+        dlng = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        mejores = {}
+        for ruta_id, lat1, lng1, lat2, lng2 in arbol.buscar(lat - dlat, lng - dlng, lat + dlat, lng + dlng):
+            distancia = distancia_segmento_m(lat, lng, lat1, lng1, lat2, lng2)
+            if distancia <= radio_m and distancia < mejores.get(ruta_id, math.inf):
+                mejores[ruta_id] = distancia
+        ordenadas = sorted((distancia, ruta_id) for ruta_id, distancia in mejores.items())[:limite]
+        return [(distancia, rutas[ruta_id]) for distancia, ruta_id in ordenadas]
+
+    def invalidar(self):
+        with self._lock:
+            self._arbol = None
+            versiones.avanzar(CLAVE_VERSION)
+
+
+indice_rutas = IndiceRutas()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rutas import asignacion
+from rutas.models import Ruta
+
+
+class Command(BaseCommand):
+    help = "Propone (y con --aplicar, aplica) la asignación de buses a rutas que deja menos estudiantes sin cupo"
+
+    def add_arguments(self, parser):
+        parser.add_argument("rutas", nargs="*", type=int, help="IDs de las rutas (por defecto, todas)")
+        parser.add_argument("--aplicar", action="store_true", help="Guarda la asignación propuesta")
+        parser.add_argument("--tiempo-max", type=float, help="Segundos de búsqueda (por defecto, RUTAS_ASIGNACION_TIEMPO_MAX_S)")
+
+    def handle(self, *args, **options):
+        rutas = None
+        if options["rutas"]:
+            rutas = Ruta.objects.filter(pk__in=options["rutas"])
+            faltantes = set(options["rutas"]) - set(rutas.values_list("pk", flat=True))
+            if faltantes:
+                raise CommandError(f"No existen las rutas {sorted(faltantes)}.")
+
+        problema = asignacion.cargar_problema(rutas)
+        plan = asignacion.resolver(problema, tiempo_max=options["tiempo_max"])
+        for ruta_id, demanda, antes, despues in asignacion.resumen_por_ruta(plan, problema):
+            self.stdout.write(f"Ruta {ruta_id}: demanda {demanda}, capacidad {antes} -> {despues}")
+        self.stdout.write(
+            f"Estudiantes sin cupo: {plan.espera_antes} -> {plan.espera_despues}; buses que cambian: {plan.cambios}"
+        )
+
+        if not options["aplicar"]:
+            self.stdout.write("Sin cambios guardados (use --aplicar).")
+            return
+        agregadas, quitadas = asignacion.aplicar(plan, problema)
+        self.stdout.write(self.style.SUCCESS(f"Asignaciones agregadas: {agregadas}, quitadas: {quitadas}"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rutas', '0004_remove_bus_ruta_ruta_buses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ruta',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Se incrementa con cada cambio en la secuencia de paradas de la ruta', verbose_name='Versión'),
+        ),
+    ]
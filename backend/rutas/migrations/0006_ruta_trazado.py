@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:53
+
+from django.db import migrations, models
+
+from rutas.indice import codificar_trazado
+
+
+def calcular_trazados(apps, schema_editor):
+    Ruta = apps.get_model("rutas", "Ruta")
+    Parada = apps.get_model("paradas", "Parada")
+    puntos = {}
+    activas = Parada.objects.filter(activa=True).order_by("ruta_id", "orden", "id")
+    for ruta_id, lat, lng in activas.values_list("ruta_id", "coordenada_lat", "coordenada_lng"):
+        puntos.setdefault(ruta_id, []).append((float(lat), float(lng)))
+    rutas = list(Ruta.objects.filter(pk__in=puntos))
+    for ruta in rutas:
+        ruta.trazado = codificar_trazado(puntos[ruta.pk])
+    Ruta.objects.bulk_update(rutas, ["trazado"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paradas', '0004_parada_geometria'),
+        ('rutas', '0005_ruta_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ruta',
+            name='trazado',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Polilínea codificada (precisión 6) de las paradas activas en orden', verbose_name='Trazado'),
+        ),
+        migrations.RunPython(calcular_trazados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rutas', '0006_ruta_trazado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Viaje',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora_salida', models.TimeField(help_text='Salida desde la primera parada activa', verbose_name='Hora de salida')),
+                ('dias_semana', models.CharField(default='01234', help_text='Dígitos de los días en que opera: 0 = lunes ... 6 = domingo', max_length=7, verbose_name='Días de la semana')),
+                ('activo', models.BooleanField(default=True, verbose_name='Activo')),
+                ('bus', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='viajes', to='rutas.bus', verbose_name='Bus')),
+                ('ruta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='viajes', to='rutas.ruta', verbose_name='Ruta')),
+            ],
+            options={
+                'verbose_name': 'Viaje',
+                'verbose_name_plural': 'Viajes',
+                'ordering': ['ruta', 'hora_salida'],
+            },
+        ),
+    ]
@@ -5,6 +5,19 @@ class Ruta(models.Model):
     nombre_ruta = models.CharField(max_length=100, verbose_name="Nombre de la ruta")
     capacidad_activa = models.IntegerField(blank=True, null=True, verbose_name="Capacidad activa")
     capacidad_espera = models.IntegerField(blank=True, null=True, verbose_name="Capacidad de espera")
+    version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Versión",
+        help_text="Se incrementa con cada cambio en la secuencia de paradas de la ruta"
+    )
+    trazado = models.TextField(
+        blank=True,
+        default="",
+        editable=False,
+        verbose_name="Trazado",
+        help_text="Polilínea codificada (precisión 6) de las paradas activas en orden"
+    )
 
     # Relación muchos a muchos con Bus
     buses = models.ManyToManyField(
@@ -50,3 +63,33 @@ class TipoEstado(models.Model):
     class Meta:
         verbose_name = "Tipo de Estado"
         verbose_name_plural = "Tipos de Estado"
+
+
+class Viaje(models.Model):
+    """Salida programada de una ruta; la hora de paso por cada parada se deriva de su secuencia."""
+
+    ruta = models.ForeignKey(Ruta, on_delete=models.CASCADE, related_name="viajes", verbose_name="Ruta")
+    hora_salida = models.TimeField(verbose_name="Hora de salida", help_text="Salida desde la primera parada activa")
+    dias_semana = models.CharField(
+        max_length=7,
+        default="01234",
+        verbose_name="Días de la semana",
+        help_text="Dígitos de los días en que opera: 0 = lunes ... 6 = domingo"
+    )
+    bus = models.ForeignKey(
+        Bus,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="viajes",
+        verbose_name="Bus"
+    )
+    activo = models.BooleanField(default=True, verbose_name="Activo")
+
+    def __str__(self):
+        return f"{self.ruta} - {self.hora_salida:%H:%M}"
+
+    class Meta:
+        verbose_name = "Viaje"
+        verbose_name_plural = "Viajes"
+        ordering = ["ruta", "hora_salida"]
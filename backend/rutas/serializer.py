@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Ruta, Bus, TipoEstado
+from .models import Ruta, Bus, TipoEstado, Viaje
 
 
 class BusSerializer(serializers.ModelSerializer):
@@ -17,8 +17,29 @@ class RutaSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class RutaResumenSerializer(RutaSerializer):
+    """Ruta con los conteos anotados por `rutas.consultas.rutas_con_resumen`."""
+
+    paradas_activas = serializers.IntegerField(read_only=True)
+    buses_asignados = serializers.IntegerField(read_only=True)
+    reservas_reservadas = serializers.IntegerField(read_only=True)
+    reservas_en_espera = serializers.IntegerField(read_only=True)
+    desvios_abiertos = serializers.IntegerField(read_only=True)
+
+
 class TipoEstadoSerializer(serializers.ModelSerializer):
     class Meta:
         model = TipoEstado
         fields = '__all__'
 
+
+
+class ViajeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Viaje
+        fields = '__all__'
+
+    def validate_dias_semana(self, value):
+        if not value or any(d not in "0123456" for d in value) or len(set(value)) != len(value):
+            raise serializers.ValidationError("Use dígitos distintos del 0 (lunes) al 6 (domingo).")
+        return "".join(sorted(value))
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import horarios
+from .indice import indice_rutas
+from .models import Bus, Ruta, TipoEstado, Viaje
+from .snapshot import invalidar_al_confirmar
+
+
+@receiver(post_save, sender=Ruta)
+def invalidar_indice_ruta(sender, instance, created, **kwargs):
+    # El índice guarda el nombre de la ruta; las rutas nuevas aún no tienen trazado
+    if not created:
+        transaction.on_commit(indice_rutas.invalidar)
+
+
+@receiver(post_delete, sender=Ruta)
+def retirar_indice_ruta(sender, instance, **kwargs):
+    transaction.on_commit(indice_rutas.invalidar)
+
+
+# Vista completa de la ruta (`rutas.snapshot`). Los cambios de paradas la
+# invalidan desde `paradas.secuencia.incrementar_version`.
+
+@receiver([post_save, post_delete], sender=Ruta)
+def invalidar_snapshot_ruta(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidar_al_confirmar([instance.pk])
+
+
+@receiver(pre_save, sender=TipoEstado)
+def recordar_ruta_tipo_estado(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._ruta_anterior_id = (
+            TipoEstado.objects.filter(pk=instance.pk).values_list("ruta_id", flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=TipoEstado)
+def invalidar_snapshot_tipo_estado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidar_al_confirmar({instance.ruta_id, getattr(instance, "_ruta_anterior_id", None)} - {None})
+
+
+@receiver(post_save, sender=Bus)
+def invalidar_snapshot_bus(sender, instance, created, raw=False, **kwargs):
+    # Un bus recién creado todavía no está en ninguna ruta
+    if not created and not raw:
+        invalidar_al_confirmar(instance.rutas.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Bus)
+def invalidar_snapshot_bus_eliminado(sender, instance, **kwargs):
+    # El borrado en cascada de la tabla intermedia no emite m2m_changed
+    invalidar_al_confirmar(instance.rutas.values_list("id", flat=True))
+
+
+@receiver(m2m_changed, sender=Ruta.buses.through)
+def invalidar_snapshot_buses_ruta(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith("post_"):
+            invalidar_al_confirmar([instance.pk])
+    elif action == "pre_clear":
+        # `bus.rutas.clear()` no informa qué rutas perdieron el bus
+        invalidar_al_confirmar(instance.rutas.values_list("id", flat=True))
+    elif action in ("post_add", "post_remove"):
+        invalidar_al_confirmar(pk_set or [])
+
+
+# Índice de horarios (`rutas.horarios`). Los cambios de paradas lo
+# invalidan desde `paradas.secuencia.incrementar_version`.
+
+@receiver([post_save, post_delete], sender=Viaje)
+def invalidar_horarios_viaje(sender, instance, raw=False, **kwargs):
+    if not raw:
+        horarios.invalidar_al_confirmar()
+
+
+@receiver(post_save, sender=Ruta)
+def invalidar_horarios_ruta(sender, instance, created, raw=False, **kwargs):
+    # El índice guarda el nombre de la ruta; una ruta nueva aún no tiene viajes
+    if not created and not raw:
+        horarios.invalidar_al_confirmar()
+
+
+@receiver(pre_delete, sender=Bus)
+def invalidar_horarios_bus_eliminado(sender, instance, **kwargs):
+    # `on_delete=SET_NULL` actualiza los viajes sin emitir señales
+    if instance.viajes.exists():
+        horarios.invalidar_al_confirmar()
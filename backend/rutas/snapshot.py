@@ -0,0 +1,71 @@
+"""Vista completa de una ruta para la app: ruta con buses, paradas activas y estados.
+
+La parte estable se serializa una vez y se guarda en la caché bajo una
+versión propia de la ruta, que `invalidar_snapshot` avanza tras confirmar
+cualquier escritura sobre la ruta, sus buses, sus paradas o sus tipos de
+estado (ver `rutas.signals` y `paradas.secuencia.incrementar_version`).
+Las posiciones en vivo no se guardan: se leen de `gps.ultimas` en cada
+petición y se agregan a la copia cacheada.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from gps import ultimas
+
+from . import versiones
+from .models import Ruta
+
+
+def clave_version(ruta_id):
+    return f"rutas:snapshot:version:{ruta_id}"
+
+
+def version_snapshot(ruta_id):
+    return versiones.actual(clave_version(ruta_id))
+
+
+def invalidar_snapshot(ruta_id):
+    versiones.avanzar(clave_version(ruta_id))
+
+
+def invalidar_al_confirmar(ruta_ids):
+    """Avanza la versión de cada ruta tras el commit (repetirlo no cuesta más que un `incr`)."""
+    for ruta_id in set(ruta_ids):
+        transaction.on_commit(lambda ruta_id=ruta_id: invalidar_snapshot(ruta_id))
+
+
+def _generar(ruta_id):
+    from paradas.serializers import ParadaListSerializer
+
+    from .serializer import RutaSerializer, TipoEstadoSerializer
+
+    ruta = Ruta.objects.prefetch_related("buses").filter(pk=ruta_id).first()
+    if ruta is None:
+        return None
+    paradas = ruta.paradas_gestionadas.filter(activa=True).select_related("ruta").order_by("orden", "id")
+    return {
+        "ruta": RutaSerializer(ruta).data,
+        "paradas": ParadaListSerializer(paradas, many=True).data,
+        "tipos_estado": TipoEstadoSerializer(ruta.tipos_estado.order_by("id"), many=True).data,
+    }
+
+
+def snapshot_ruta(ruta_id):
+    """Parte cacheada de la vista de la ruta, o `None` si la ruta no existe."""
+    version = version_snapshot(ruta_id)
+    clave = f"rutas:snapshot:{ruta_id}:{version}"
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _generar(ruta_id)
+        if datos is None:
+            return None
+        datos["version"] = version
+        cache.set(clave, datos, settings.RUTAS_SNAPSHOT_CACHE_SEGUNDOS)
+    return datos
+
+
+def posiciones_en_vivo(ruta_id):
+    registros = ultimas.obtener_backend().por_ruta(ruta_id)
+    registros.sort(key=lambda r: r["usuario"] or 0)
+    return [{k: v for k, v in r.items() if k != "ts"} for r in registros]
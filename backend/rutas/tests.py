@@ -0,0 +1,408 @@
+import random
+import tempfile
+from datetime import datetime, time, timedelta
+from io import StringIO
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from gestion_cupo.models import OcupacionRuta, ReservaCupo
+from gps import ultimas
+from gps.models import EventoDesvio
+from paradas.models import Parada
+from sincronizacion.models import RegistroCambio
+
+from . import asignacion, horarios, versiones
+from .admin import RutaAdmin
+from .indice import ArbolR, decodificar_trazado, distancia_segmento_m, indice_rutas
+from .horarios import indice_horarios
+from .models import Bus, Ruta, TipoEstado, Viaje
+from .snapshot import version_snapshot
+
+User = get_user_model()
+
+# Caché en memoria para las pruebas: `cache.clear()` no debe tocar la caché en disco
+CACHES_PRUEBA = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas"},
+    "versiones": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas-versiones"},
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class RutasTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        indice_rutas.invalidar()
+
+    def crear_ruta(self, nombre, puntos):
+        ruta = Ruta.objects.create(nombre_ruta=nombre, capacidad_activa=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, (lat, lng) in enumerate(puntos, start=1):
+                Parada.objects.create(
+                    nombre=f"{nombre}{i}", direccion="-", coordenada_lat=lat, coordenada_lng=lng, ruta=ruta, orden=i
+                )
+        ruta.refresh_from_db()
+        return ruta
+
+
+class TrazadoTests(RutasTestCase):
+    def test_arbol_r_coincide_con_fuerza_bruta(self):
+        aleatorio = random.Random(3)
+        cajas = []
+        for i in range(500):
+            lat, lng = aleatorio.uniform(0, 1), aleatorio.uniform(0, 1)
+            cajas.append((lat, lng, lat + aleatorio.uniform(0, 0.05), lng + aleatorio.uniform(0, 0.05), i))
+        arbol = ArbolR(cajas)
+        consulta = (0.3, 0.3, 0.4, 0.45)
+        esperado = {
+            c[4] for c in cajas
+            if not (c[0] > consulta[2] or c[2] < consulta[0] or c[1] > consulta[3] or c[3] < consulta[1])
+        }
+        self.assertEqual(set(arbol.buscar(*consulta)), esperado)
+
+    def test_rutas_cercanas_por_trazado(self):
+        este = self.crear_ruta("Este", [(0, 0), (0, 0.05)])
+        norte = self.crear_ruta("Norte", [(0.01, 0.1), (0.05, 0.1)])
+        self.assertEqual(decodificar_trazado(este.trazado), [(0.0, 0.0), (0.0, 0.05)])
+
+        # A mitad del segmento de "Este", lejos de sus paradas
+        respuesta = self.client.get("/api/rutas/rutas/cercanas/?lat=0.002&lng=0.025&radio=1")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([r["id"] for r in respuesta.data["rutas"]], [este.id])
+        self.assertAlmostEqual(
+            respuesta.data["rutas"][0]["distancia_m"], distancia_segmento_m(0.002, 0.025, 0, 0, 0, 0.05), places=0
+        )
+
+        with self.assertNumQueries(0):
+            respuesta = self.client.get("/api/rutas/rutas/cercanas/?lat=0.005&lng=0.07&radio=5")
+        self.assertEqual([r["id"] for r in respuesta.data["rutas"]], [este.id, norte.id])
+
+        # Mover una parada actualiza el trazado y el índice
+        with self.captureOnCommitCallbacks(execute=True):
+            Parada.objects.filter(ruta=norte, orden=1).update(coordenada_lat=0.3)
+            parada = Parada.objects.get(ruta=norte, orden=1)
+            parada.save()
+        respuesta = self.client.get("/api/rutas/rutas/cercanas/?lat=0.005&lng=0.07&radio=5")
+        self.assertEqual([r["id"] for r in respuesta.data["rutas"]], [este.id])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get("/api/rutas/rutas/cercanas/?lat=0").status_code, 400)
+        self.assertEqual(self.client.get("/api/rutas/rutas/cercanas/?lat=0&lng=0&radio=-1").status_code, 400)
+
+
+class ResumenRutasTests(RutasTestCase):
+    def poblar(self, cantidad):
+        for i in range(cantidad):
+            ruta = Ruta.objects.create(nombre_ruta=f"Ruta {i}", capacidad_activa=10)
+            for j in range(2):
+                bus = Bus.objects.create(placa=f"B{i}{j}", marca="M", modelo="X", estado_bus="activo")
+                ruta.buses.add(bus)
+                Parada.objects.create(
+                    nombre=f"P{j}", direccion="-", coordenada_lat=0, coordenada_lng=j, ruta=ruta, orden=j, activa=j == 0
+                )
+            for j, estado in enumerate(["RESERVADO", "RESERVADO", "EN_ESPERA", "CANCELADO"]):
+                usuario = User.objects.create(username=f"u{i}{j}", email=f"u{i}{j}@example.com")
+                ReservaCupo.objects.create(usuario=usuario, ruta=ruta, estado=estado)
+            EventoDesvio.objects.create(ruta=ruta, fecha_hora=timezone.now(), tipo_desvio="x", estado="abierto")
+            EventoDesvio.objects.create(ruta=ruta, fecha_hora=timezone.now(), tipo_desvio="x", estado="cerrado")
+
+    def test_listado_con_conteos_en_consultas_fijas(self):
+        self.poblar(5)
+        with self.assertNumQueries(3):  # conteo de la página, rutas anotadas y buses
+            respuesta = self.client.get("/api/rutas/rutas/")
+        ruta = respuesta.data["results"][0]
+        self.assertEqual(len(ruta["buses"]), 2)
+        self.assertEqual(
+            {clave: ruta[clave] for clave in (
+                "paradas_activas", "buses_asignados", "reservas_reservadas", "reservas_en_espera", "desvios_abiertos"
+            )},
+            {"paradas_activas": 1, "buses_asignados": 2, "reservas_reservadas": 2,
+             "reservas_en_espera": 1, "desvios_abiertos": 1},
+        )
+
+    def test_changelist_del_admin_sin_n_mas_1(self):
+        self.poblar(4)
+        modelo_admin = RutaAdmin(Ruta, admin.site)
+        solicitud = RequestFactory().get("/admin/rutas/ruta/")
+        solicitud.user = User.objects.create_superuser(username="admin", email="admin@example.com", password="x")
+        with self.assertNumQueries(2):  # rutas anotadas y buses
+            filas = [
+                (modelo_admin.mostrar_buses(ruta), modelo_admin.paradas_activas(ruta))
+                for ruta in modelo_admin.get_queryset(solicitud)
+            ]
+        self.assertEqual(len(filas), 4)
+        self.assertIn((", ".join(["B00", "B01"]), 1), filas)
+
+
+class SnapshotRutaTests(RutasTestCase):
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        ajustes = override_settings(GPS_DATA_DIR=tmp.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.ruta = self.crear_ruta("Centro", [(0, 0), (0, 0.01)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bus = Bus.objects.create(placa="ABC1", marca="M", modelo="X", estado_bus="activo")
+            self.ruta.buses.add(self.bus)
+            TipoEstado.objects.create(nombre_estado="Operando", ruta=self.ruta)
+        self.url = f"/api/rutas/rutas/{self.ruta.id}/snapshot/"
+
+    def test_snapshot_completo_y_cacheado(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual([b["placa"] for b in respuesta.data["ruta"]["buses"]], ["ABC1"])
+        self.assertEqual([p["nombre"] for p in respuesta.data["paradas"]], ["Centro1", "Centro2"])
+        self.assertEqual([t["nombre_estado"] for t in respuesta.data["tipos_estado"]], ["Operando"])
+        self.assertEqual(respuesta.data["posiciones"], [])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data, respuesta.data)
+        self.assertEqual(self.client.get("/api/rutas/rutas/999999/snapshot/").status_code, 404)
+
+    def test_posiciones_en_vivo_sin_invalidar(self):
+        version = self.client.get(self.url).data["version"]
+        ultimas.obtener_backend().guardar({
+            "id": 1, "ruta": self.ruta.id, "usuario": None, "latitud": 0.0, "longitud": 0.005,
+            "velocidad": 30.0, "fecha_hora": timezone.now().isoformat(), "ts": timezone.now().timestamp(),
+        })
+        with self.assertNumQueries(0):
+            respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.data["version"], version)
+        self.assertEqual([p["longitud"] for p in respuesta.data["posiciones"]], [0.005])
+        self.assertNotIn("ts", respuesta.data["posiciones"][0])
+
+    def test_escrituras_cambian_la_version(self):
+        def renombrar_bus():
+            self.bus.marca = "N"
+            self.bus.save()
+
+        escrituras = [
+            lambda: Ruta.objects.get(pk=self.ruta.pk).save(),
+            renombrar_bus,
+            lambda: self.ruta.buses.add(Bus.objects.create(placa="ABC2", marca="M", modelo="X", estado_bus="activo")),
+            lambda: self.bus.rutas.clear(),
+            lambda: TipoEstado.objects.create(nombre_estado="Detenida", ruta=self.ruta),
+            lambda: Parada.objects.filter(ruta=self.ruta).first().save(),
+        ]
+        versiones = [self.client.get(self.url).data["version"]]
+        for escribir in escrituras:
+            with self.captureOnCommitCallbacks(execute=True):
+                escribir()
+            versiones.append(self.client.get(self.url).data["version"])
+        self.assertEqual(len(set(versiones)), len(versiones))
+        datos = self.client.get(self.url).data
+        self.assertEqual([b["placa"] for b in datos["ruta"]["buses"]], ["ABC2"])
+        self.assertEqual(len(datos["tipos_estado"]), 2)
+
+    def test_otra_ruta_no_invalida(self):
+        version = self.client.get(self.url).data["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            otra = Ruta.objects.create(nombre_ruta="Otra")
+            TipoEstado.objects.create(nombre_estado="Operando", ruta=otra)
+        self.assertEqual(self.client.get(self.url).data["version"], version)
+
+
+class VersionesTests(RutasTestCase):
+    def test_clave_perdida_no_repite_versiones(self):
+        vista = versiones.actual("prueba")
+        caches[versiones.ALIAS].clear()
+        nueva = versiones.avanzar("prueba")
+        self.assertGreater(nueva, vista)
+        caches[versiones.ALIAS].clear()
+        self.assertGreater(versiones.avanzar("prueba"), nueva)
+
+    def test_indice_recarga_aunque_se_pierda_la_version(self):
+        ruta = self.crear_ruta("Centro", [(0, 0), (0, 0.01)])
+        self.assertEqual(len(indice_horarios.proximas_salidas(Parada.objects.filter(ruta=ruta).first().id)), 0)
+        Viaje.objects.create(ruta=ruta, hora_salida=time(7, 0), dias_semana="0123456")
+        # Otro proceso invalida después de que la clave fue desalojada
+        caches[versiones.ALIAS].clear()
+        versiones.avanzar(horarios.CLAVE_VERSION)
+        self.assertEqual(len(indice_horarios.proximas_salidas(Parada.objects.filter(ruta=ruta).first().id)), 5)
+
+
+class AsignacionBusesTests(RutasTestCase):
+    def test_resolver_sin_espera_y_con_pocos_cambios(self):
+        # Ruta 1 desborda con 20 de capacidad; la 2 tiene 50 para 10 estudiantes
+        problema = asignacion.Problema(
+            demandas={1: 50, 2: 10},
+            capacidades={"a": 40, "b": 20, "c": 10},
+            actual={"a": {2}, "b": {1}, "c": {2}},
+        )
+        plan = asignacion.resolver(problema)
+        self.assertEqual((plan.espera_antes, plan.espera_despues, plan.cambios), (30, 0, 1))
+        self.assertEqual(plan.asignacion, {"a": 1, "b": 1, "c": 2})
+
+    def test_resolver_nunca_empeora_la_vigente(self):
+        aleatorio = random.Random(5)
+        for _ in range(20):
+            demandas = {r: aleatorio.randint(0, 120) for r in range(1, 6)}
+            capacidades = {b: aleatorio.choice([20, 30, 40, 45]) for b in range(12)}
+            actual = {b: {aleatorio.randint(1, 5)} for b in capacidades}
+            plan = asignacion.resolver(asignacion.Problema(demandas, capacidades, actual))
+            self.assertLessEqual(plan.espera_despues, plan.espera_antes)
+            nueva = {b: {r} if r is not None else set() for b, r in plan.asignacion.items()}
+            self.assertEqual(plan.espera_despues, asignacion.espera_total(demandas, capacidades, nueva))
+            self.assertEqual(plan.espera_antes, asignacion.espera_total(demandas, capacidades, actual))
+
+    def crear_bus(self, placa, capacidad, estado="activo"):
+        return Bus.objects.create(placa=placa, marca="M", modelo="X", estado_bus=estado, capacidad=capacidad)
+
+    def test_aplicar_como_diff_de_la_tabla_intermedia(self):
+        llena = Ruta.objects.create(nombre_ruta="Llena")
+        vacia = Ruta.objects.create(nombre_ruta="Vacía")
+        OcupacionRuta.objects.create(ruta=llena, reservados=30, en_espera=20)
+        OcupacionRuta.objects.create(ruta=vacia, reservados=10)
+        grande, chico = self.crear_bus("G", 45), self.crear_bus("C", 10)
+        taller = self.crear_bus("T", 60, estado="Mantenimiento")
+        vacia.buses.add(grande, taller)
+        llena.buses.add(chico)
+        version = version_snapshot(llena.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("asignar_buses", "--aplicar", stdout=StringIO())
+
+        self.assertEqual(set(llena.buses.values_list("placa", flat=True)), {"G"})
+        # El bus en mantenimiento no entra en la asignación y se deja como está
+        self.assertEqual(set(vacia.buses.values_list("placa", flat=True)), {"C", "T"})
+        self.assertEqual(
+            set(RegistroCambio.objects.filter(modelo="rutas.ruta").values_list("objeto_id", flat=True)),
+            {llena.id, vacia.id},
+        )
+        self.assertNotEqual(version_snapshot(llena.id), version)
+
+    def test_subconjunto_no_toma_buses_de_otras_rutas(self):
+        elegida = Ruta.objects.create(nombre_ruta="Elegida")
+        otra = Ruta.objects.create(nombre_ruta="Otra")
+        OcupacionRuta.objects.create(ruta=elegida, reservados=40)
+        otra.buses.add(self.crear_bus("O", 40))
+        libre = self.crear_bus("L", 30)
+
+        salida = StringIO()
+        call_command("asignar_buses", str(elegida.id), stdout=salida)
+        self.assertIn("Estudiantes sin cupo: 40 -> 10", salida.getvalue())
+        self.assertFalse(elegida.buses.exists())  # sin --aplicar no se guarda nada
+
+        modelo_admin = RutaAdmin(Ruta, admin.site)
+        solicitud = RequestFactory().post("/admin/rutas/ruta/")
+        modelo_admin.message_user = lambda *args, **kwargs: None
+        modelo_admin.asignar_buses_por_demanda(solicitud, Ruta.objects.filter(pk=elegida.pk))
+        self.assertEqual(list(elegida.buses.all()), [libre])
+        self.assertEqual(otra.buses.count(), 1)
+
+    def test_bus_compartido_no_se_mueve(self):
+        norte = Ruta.objects.create(nombre_ruta="Norte")
+        sur = Ruta.objects.create(nombre_ruta="Sur")
+        OcupacionRuta.objects.create(ruta=norte, reservados=50)
+        OcupacionRuta.objects.create(ruta=sur, reservados=10)
+        compartido = self.crear_bus("S", 30)
+        norte.buses.add(compartido)
+        sur.buses.add(compartido, self.crear_bus("L", 20))
+
+        problema = asignacion.cargar_problema()
+        self.assertNotIn(compartido.id, problema.capacidades)
+        self.assertEqual(problema.fija, {norte.id: 30, sur.id: 30})
+        plan = asignacion.resolver(problema)
+        # El compartido cubre 30 en cada ruta; el libre pasa a la que sigue sin cupo
+        self.assertEqual((plan.espera_antes, plan.espera_despues), (20, 0))
+        asignacion.aplicar(plan, problema)
+        self.assertEqual(set(compartido.rutas.all()), {norte, sur})
+        self.assertEqual(set(norte.buses.values_list("placa", flat=True)), {"S", "L"})
+
+
+class HorariosTests(RutasTestCase):
+    def setUp(self):
+        super().setUp()
+        indice_horarios.invalidar()
+        # 0.01° de longitud en el ecuador ≈ 1113 m: 200 s a 20 km/h, más 30 s de detención
+        self.ruta = self.crear_ruta("Centro", [(0, 0), (0, 0.01), (0, 0.02)])
+        self.paradas = list(Parada.objects.filter(ruta=self.ruta).order_by("orden"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.temprano = Viaje.objects.create(ruta=self.ruta, hora_salida=time(7, 0), dias_semana="01234")
+            self.lunes = Viaje.objects.create(ruta=self.ruta, hora_salida=time(8, 0), dias_semana="0")
+        self.lunes_0730 = timezone.make_aware(datetime(2025, 1, 6, 7, 30))  # un lunes
+
+    def test_proximas_salidas_por_busqueda_binaria(self):
+        salidas = indice_horarios.proximas_salidas(self.paradas[1].id, self.lunes_0730, limite=3)
+        self.assertEqual([viaje["id"] for _, viaje in salidas], [self.lunes.id, self.temprano.id, self.temprano.id])
+        self.assertEqual(salidas[0][0], self.lunes_0730.replace(hour=8, minute=0) + timedelta(seconds=230))
+        self.assertEqual(salidas[1][0], self.lunes_0730.replace(hour=7, minute=0) + timedelta(days=1, seconds=230))
+        with self.assertNumQueries(0):
+            indice_horarios.proximas_salidas(self.paradas[2].id, self.lunes_0730)
+
+    def test_da_la_vuelta_a_la_semana(self):
+        domingo = self.lunes_0730 + timedelta(days=6)
+        salidas = indice_horarios.proximas_salidas(self.paradas[0].id, domingo, limite=7)
+        self.assertEqual(salidas[0][0], self.lunes_0730.replace(hour=7, minute=0) + timedelta(days=7))
+        self.assertEqual(len(salidas), 6)  # todas las salidas de la semana, sin repetir
+
+    def test_coincide_con_recorrido_completo(self):
+        aleatorio = random.Random(11)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(30):
+                Viaje.objects.create(
+                    ruta=self.ruta,
+                    hora_salida=time(aleatorio.randint(0, 23), aleatorio.choice([0, 15, 30, 45])),
+                    dias_semana="".join(sorted(aleatorio.sample("0123456", 3))),
+                )
+        parada = self.paradas[2]
+        pasos = []
+        for semana in (0, 1):
+            for viaje in Viaje.objects.all():
+                for dia in map(int, viaje.dias_semana):
+                    salida = self.lunes_0730.replace(hour=viaje.hora_salida.hour, minute=viaje.hora_salida.minute)
+                    pasos.append(salida + timedelta(days=dia + 7 * semana, seconds=460))
+        for _ in range(20):
+            desde = self.lunes_0730 + timedelta(minutes=aleatorio.randint(0, 7 * 24 * 60))
+            esperado = sorted(p for p in pasos if p >= desde)[:10]
+            obtenido = [hora for hora, _ in indice_horarios.proximas_salidas(parada.id, desde, limite=10)]
+            self.assertEqual(obtenido, esperado)
+
+    def test_se_reconstruye_solo_al_cambiar_el_horario(self):
+        indice_horarios.proximas_salidas(self.paradas[0].id, self.lunes_0730)
+        with self.captureOnCommitCallbacks(execute=True):
+            Bus.objects.create(placa="X1", marca="M", modelo="X", estado_bus="activo")
+        with self.assertNumQueries(0):
+            indice_horarios.proximas_salidas(self.paradas[0].id, self.lunes_0730)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lunes.hora_salida = time(7, 45)
+            self.lunes.save()
+        hora, viaje = indice_horarios.proximas_salidas(self.paradas[0].id, self.lunes_0730, limite=1)[0]
+        self.assertEqual((hora.hour, hora.minute, viaje["id"]), (7, 45, self.lunes.id))
+
+        # Quitar la parada intermedia acorta el desfase de la última
+        with self.captureOnCommitCallbacks(execute=True):
+            self.paradas[1].delete()
+        hora, _ = indice_horarios.proximas_salidas(self.paradas[2].id, self.lunes_0730, limite=1)[0]
+        self.assertEqual(hora, self.lunes_0730.replace(hour=7, minute=45) + timedelta(seconds=430))
+
+    def test_endpoints(self):
+        desde = self.lunes_0730.isoformat().replace("+", "%2B")
+        respuesta = self.client.get(f"/api/rutas/viajes/proximas-salidas/?parada={self.paradas[0].id}&desde={desde}&limit=2")
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(
+            [(s["viaje"], s["hora_salida"]) for s in respuesta.data["salidas"]],
+            [(self.lunes.id, "08:00:00"), (self.temprano.id, "07:00:00")],
+        )
+        self.assertEqual(self.client.get("/api/rutas/viajes/proximas-salidas/").status_code, 400)
+        self.assertEqual(self.client.get("/api/rutas/viajes/proximas-salidas/?parada=1&desde=ayer").status_code, 400)
+
+        respuesta = self.client.get(f"/api/rutas/viajes/{self.lunes.id}/horario/")
+        self.assertEqual([p["desfase_s"] for p in respuesta.data["paradas"]], [0, 230, 460])
+
+        respuesta = self.client.post(
+            "/api/rutas/viajes/", {"ruta": self.ruta.id, "hora_salida": "09:00", "dias_semana": "60"}, format="json"
+        )
+        self.assertEqual((respuesta.status_code, respuesta.data["dias_semana"]), (201, "06"))
+        respuesta = self.client.post(
+            "/api/rutas/viajes/", {"ruta": self.ruta.id, "hora_salida": "09:00", "dias_semana": "7"}, format="json"
+        )
+        self.assertEqual(respuesta.status_code, 400)
@@ -1,5 +1,5 @@
 from rest_framework.routers import DefaultRouter
-from .views import RutaViewSet, BusViewSet, TipoEstadoViewSet
+from .views import RutaViewSet, BusViewSet, TipoEstadoViewSet, ViajeViewSet
 
 
 
@@ -7,5 +7,6 @@ router = DefaultRouter()
 router.register(r'rutas', RutaViewSet)
 router.register(r'buses', BusViewSet)
 router.register(r'tipos_estado', TipoEstadoViewSet) 
+router.register(r'viajes', ViajeViewSet)
 
 urlpatterns = router.urls
\ No newline at end of file
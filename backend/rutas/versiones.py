@@ -0,0 +1,53 @@
+"""Versiones compartidas entre procesos de los datos derivados en memoria y en caché.
+
+Los índices en memoria (paradas, trazados, horarios, grafo del planificador),
+la generación de las capas del mapa y las vistas completas de ruta guardan la
+versión con la que se construyeron y la comparan con la que hay aquí para
+saber si otro proceso cambió los datos.
+
+Las versiones viven en su propio alias de caché (`versiones`, ver
+`settings.CACHES`), separado de los contenidos grandes para que estos no las
+desalojen. Además no son contadores desde 1 sino marcas de tiempo en
+microsegundos que solo crecen: si una clave se pierde, la siguiente versión
+sigue siendo distinta de cualquiera que un proceso tenga en memoria.
+"""
+import threading
+import time
+
+from django.core.cache import caches
+
+
+ALIAS = "versiones"
+
+_lock = threading.Lock()
+_ultima = 0
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _siguiente(previa=0):
+    """Marca en microsegundos mayor que `previa` y que la última dada por este proceso."""
+    global _ultima
+    with _lock:
+        _ultima = max(time.time_ns() // 1000, previa + 1, _ultima + 1)
+        return _ultima
+
+
+def actual(clave):
+    """Versión vigente de `clave`; si no existe se crea una nueva."""
+    cache = _cache()
+    valor = cache.get(clave)
+    if valor is None:
+        cache.add(clave, _siguiente(), None)
+        valor = cache.get(clave)
+    return valor
+
+
+def avanzar(clave):
+    """Guarda y devuelve una versión nueva, mayor que la vigente."""
+    cache = _cache()
+    valor = _siguiente(cache.get(clave) or 0)
+    cache.set(clave, valor, None)
+    return valor
@@ -1,7 +1,18 @@
-from rest_framework import viewsets
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
-from .models import Ruta, Bus, TipoEstado
-from .serializer import RutaSerializer, BusSerializer, TipoEstadoSerializer
+from rest_framework.response import Response
+from .consultas import rutas_con_resumen
+from .horarios import indice_horarios
+from .indice import indice_rutas
+from .models import Ruta, Bus, TipoEstado, Viaje
+from .snapshot import posiciones_en_vivo, snapshot_ruta
+from .serializer import RutaSerializer, RutaResumenSerializer, BusSerializer, TipoEstadoSerializer, ViajeSerializer
 
 
 class RutaViewSet(viewsets.ModelViewSet):
@@ -9,6 +20,68 @@ class RutaViewSet(viewsets.ModelViewSet):
     serializer_class = RutaSerializer
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        if self.action in ["list", "retrieve"]:
+            return rutas_con_resumen(self.queryset).order_by("id")
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action in ["list", "retrieve"]:
+            return RutaResumenSerializer
+        return super().get_serializer_class()
+
+    @action(detail=True, methods=["get"])
+    def snapshot(self, request, pk=None):
+        """
+        Todo lo que necesita la pantalla de una ruta en una sola respuesta:
+        ruta con sus buses, paradas activas en orden, tipos de estado y
+        últimas posiciones GPS (estas se leen en cada petición, el resto sale
+        de la caché mientras no cambie la ruta).
+        """
+        try:
+            ruta_id = int(pk)
+        except ValueError:
+            return Response({"error": "La ruta no existe."}, status=status.HTTP_404_NOT_FOUND)
+        datos = snapshot_ruta(ruta_id)
+        if datos is None:
+            return Response({"error": "La ruta no existe."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({**datos, "posiciones": posiciones_en_vivo(ruta_id)})
+
+    @action(detail=False, methods=["get"])
+    def cercanas(self, request):
+        """
+        Rutas cuyo trazado pasa cerca de una ubicación, ordenadas por distancia.
+        Parámetros: lat, lng, radio (en kilómetros), limit (default=20, máximo=100)
+        """
+        try:
+            lat = float(request.query_params["lat"])
+            lng = float(request.query_params["lng"])
+            radio = float(request.query_params.get("radio", settings.RUTAS_CERCANAS_RADIO_KM))
+            limite = min(int(request.query_params.get("limit", 20)), 100)
+        except KeyError:
+            return Response(
+                {"error": "Los parámetros 'lat' y 'lng' son requeridos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError:
+            return Response(
+                {"error": "Las coordenadas, 'radio' y 'limit' deben ser números válidos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or not 0 < radio <= settings.RUTAS_CERCANAS_RADIO_MAX_KM \
+                or limite < 1:
+            return Response(
+                {"error": "Coordenadas fuera de rango o 'radio'/'limit' no válidos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        resultados = indice_rutas.cercanas(lat, lng, radio * 1000, limite=limite)
+        return Response({
+            "radio_km": radio,
+            "centro": {"lat": lat, "lng": lng},
+            "rutas": [dict(datos, distancia_m=round(distancia, 1)) for distancia, datos in resultados],
+        })
+
 
 class BusViewSet(viewsets.ModelViewSet):
     queryset = Bus.objects.all()
@@ -21,3 +94,75 @@ class TipoEstadoViewSet(viewsets.ModelViewSet):
     serializer_class = TipoEstadoSerializer
     permission_classes = [AllowAny]
 
+
+class ViajeViewSet(viewsets.ModelViewSet):
+    """
+    Viajes programados de las rutas.
+
+    Endpoints adicionales:
+    - GET /api/rutas/viajes/proximas-salidas/?parada={id}&desde={ISO 8601}&limit={n} - Próximos pasos por una parada
+    - GET /api/rutas/viajes/{id}/horario/ - Hora de paso del viaje por cada parada
+    """
+
+    queryset = Viaje.objects.select_related("ruta").all()
+    serializer_class = ViajeSerializer
+    permission_classes = [AllowAny]
+
+    @action(detail=False, methods=["get"], url_path="proximas-salidas")
+    def proximas_salidas(self, request):
+        """Próximos viajes que pasan por una parada después de `desde` (por defecto, ahora)."""
+        try:
+            parada_id = int(request.query_params["parada"])
+            limite = min(int(request.query_params.get("limit", 5)), 50)
+        except KeyError:
+            return Response(
+                {"error": "El parámetro 'parada' es requerido."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError:
+            return Response(
+                {"error": "'parada' y 'limit' deben ser enteros."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        desde = None
+        if "desde" in request.query_params:
+            desde = parse_datetime(request.query_params["desde"])
+            if desde is None:
+                return Response(
+                    {"error": "'desde' debe ser una fecha ISO 8601."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde, dt_timezone.utc)
+        if limite < 1:
+            return Response({"error": "'limit' debe ser mayor que 0."}, status=status.HTTP_400_BAD_REQUEST)
+
+        salidas = indice_horarios.proximas_salidas(parada_id, desde, limite=limite)
+        return Response({
+            "parada": parada_id,
+            "salidas": [
+                {
+                    "hora": hora.isoformat(),
+                    "viaje": viaje["id"],
+                    "ruta": viaje["ruta"],
+                    "ruta_nombre": viaje["ruta_nombre"],
+                    "bus": viaje["bus"],
+                    "hora_salida": viaje["hora_salida"].strftime("%H:%M:%S"),
+                }
+                for hora, viaje in salidas
+            ],
+        })
+
+    @action(detail=True, methods=["get"])
+    def horario(self, request, pk=None):
+        """Segundos desde la salida del viaje hasta su paso por cada parada activa."""
+        viaje = self.get_object()
+        horario = indice_horarios.horario_viaje(viaje.id)
+        if horario is None:
+            return Response({"error": "El viaje no está activo."}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "viaje": viaje.id,
+            "ruta": viaje.ruta_id,
+            "hora_salida": viaje.hora_salida.strftime("%H:%M:%S"),
+            "paradas": [{"parada": parada_id, "desfase_s": segundos} for parada_id, segundos in horario],
+        })
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from .models import RegistroCambio
+
+
+@admin.register(RegistroCambio)
+class RegistroCambioAdmin(admin.ModelAdmin):
+    list_display = ["id", "modelo", "objeto_id", "operacion", "fecha"]
+    list_filter = ["modelo", "operacion"]
+    search_fields = ["objeto_id"]
+    readonly_fields = ["modelo", "objeto_id", "operacion", "fecha"]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:44
+
+from django.db import migrations, models
+
+
+MODELOS = [("rutas", "ruta"), ("rutas", "bus"), ("rutas", "tipoestado"), ("paradas", "parada")]
+
+
+def registrar_existentes(apps, schema_editor):
+    """Los objetos previos a la bitácora entran como cambios, para que `since=0` los traiga."""
+    RegistroCambio = apps.get_model("sincronizacion", "RegistroCambio")
+    for app_label, modelo in MODELOS:
+        ids = apps.get_model(app_label, modelo).objects.order_by("id").values_list("id", flat=True)
+        RegistroCambio.objects.bulk_create(
+            [RegistroCambio(modelo=f"{app_label}.{modelo}", objeto_id=pk, operacion="guardado") for pk in ids],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("paradas", "0004_parada_geometria"),
+        ("rutas", "0004_remove_bus_ruta_ruta_buses"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=50, verbose_name='Modelo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='ID del objeto')),
+                ('operacion', models.CharField(choices=[('guardado', 'Creado o modificado'), ('eliminado', 'Eliminado')], max_length=10, verbose_name='Operación')),
+                ('fecha', models.DateTimeField(auto_now_add=True, verbose_name='Fecha del cambio')),
+            ],
+            options={
+                'verbose_name': 'Registro de cambio',
+                'verbose_name_plural': 'Registros de cambios',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['modelo', 'objeto_id'], name='sync_cambio_objeto_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_existentes, migrations.RunPython.noop),
+    ]
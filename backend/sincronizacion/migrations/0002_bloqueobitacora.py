@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:15
+
+from django.db import migrations, models
+
+
+def crear_bloqueo(apps, schema_editor):
+    apps.get_model("sincronizacion", "BloqueoBitacora").objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sincronizacion', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloqueoBitacora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Bloqueo de la bitácora',
+                'verbose_name_plural': 'Bloqueo de la bitácora',
+            },
+        ),
+        migrations.RunPython(crear_bloqueo, migrations.RunPython.noop),
+    ]
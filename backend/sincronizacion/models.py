@@ -0,0 +1,51 @@
+from django.db import models
+
+
+class RegistroCambio(models.Model):
+    """
+    Bitácora de escrituras sobre los catálogos que sincronizan los clientes.
+
+    El `id` autoincremental es la versión monótona: un cliente que ya vio la
+    versión N solo necesita los registros con `id > N`. Para que eso valga,
+    los ids deben hacerse visibles en orden: las escrituras en la bitácora
+    se serializan con `BloqueoBitacora` (ver `sincronizacion.registro`).
+    Se conserva un único
+    registro por objeto (el más reciente), así que la bitácora crece con el
+    número de objetos y no con el de escrituras.
+    """
+
+    OPERACION_GUARDADO = "guardado"
+    OPERACION_ELIMINADO = "eliminado"
+    OPERACIONES = [
+        (OPERACION_GUARDADO, "Creado o modificado"),
+        (OPERACION_ELIMINADO, "Eliminado"),
+    ]
+
+    modelo = models.CharField(max_length=50, verbose_name="Modelo")
+    objeto_id = models.BigIntegerField(verbose_name="ID del objeto")
+    operacion = models.CharField(max_length=10, choices=OPERACIONES, verbose_name="Operación")
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name="Fecha del cambio")
+
+    def __str__(self):
+        return f"v{self.id} {self.operacion} {self.modelo}#{self.objeto_id}"
+
+    class Meta:
+        verbose_name = "Registro de cambio"
+        verbose_name_plural = "Registros de cambios"
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["modelo", "objeto_id"], name="sync_cambio_objeto_idx"),
+        ]
+
+
+class BloqueoBitacora(models.Model):
+    """
+    Fila única que se bloquea (`SELECT ... FOR UPDATE`) antes de escribir en
+    la bitácora y hasta el commit. Sin ella, una transacción que toma el id
+    10 y confirma después de otra que tomó el 11 dejaría el 10 invisible
+    para un cliente que sincronizó entre ambas y ya avanzó a la versión 11.
+    """
+
+    class Meta:
+        verbose_name = "Bloqueo de la bitácora"
+        verbose_name_plural = "Bloqueo de la bitácora"
@@ -0,0 +1,42 @@
+"""Registro de cambios para la sincronización incremental de clientes.
+
+Las señales de `sincronizacion.signals` cubren las escrituras por ORM; las
+rutas masivas (`bulk_create`, `bulk_update`, `QuerySet.update`) no emiten
+señales y deben llamar a `registrar_cambios` con los ids afectados.
+
+Cada escritura toma primero el bloqueo de `BloqueoBitacora`, que se libera
+al terminar la transacción externa: así los ids de la bitácora se confirman
+en el mismo orden en que se asignan y un cliente nunca salta uno que aún
+no era visible. (SQLite ya serializa las transacciones de escritura.)
+"""
+from django.db import transaction
+
+from .models import BloqueoBitacora, RegistroCambio
+
+
+def etiqueta(modelo):
+    return modelo._meta.label_lower
+
+
+def _bloquear():
+    if not list(BloqueoBitacora.objects.select_for_update().filter(pk=1).values_list("pk", flat=True)):
+        # La crea la migración; si falta, insertarla también deja la fila bloqueada
+        BloqueoBitacora.objects.get_or_create(pk=1)
+
+
+def registrar_cambios(modelo, ids, operacion=RegistroCambio.OPERACION_GUARDADO):
+    """Anota que los objetos `ids` de `modelo` cambiaron, con una versión nueva cada uno."""
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    nombre = etiqueta(modelo)
+    with transaction.atomic():
+        _bloquear()
+        RegistroCambio.objects.filter(modelo=nombre, objeto_id__in=ids).delete()
+        RegistroCambio.objects.bulk_create(
+            [RegistroCambio(modelo=nombre, objeto_id=pk, operacion=operacion) for pk in ids]
+        )
+
+
+def registrar_eliminados(modelo, ids):
+    registrar_cambios(modelo, ids, RegistroCambio.OPERACION_ELIMINADO)
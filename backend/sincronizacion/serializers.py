@@ -0,0 +1,13 @@
+from rest_framework import serializers
+
+from rutas.models import Ruta
+
+
+class RutaSincronizacionSerializer(serializers.ModelSerializer):
+    """Ruta con los buses como ids: los buses viajan por separado en la sincronización."""
+
+    buses = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = Ruta
+        fields = '__all__'
@@ -0,0 +1,50 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from paradas.models import Parada
+from rutas.models import Bus, Ruta, TipoEstado
+
+from .registro import registrar_cambios, registrar_eliminados
+
+
+@receiver(post_save, sender=Ruta)
+@receiver(post_save, sender=Bus)
+@receiver(post_save, sender=Parada)
+@receiver(post_save, sender=TipoEstado)
+def registrar_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        registrar_cambios(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Ruta)
+@receiver(post_delete, sender=Bus)
+@receiver(post_delete, sender=Parada)
+@receiver(post_delete, sender=TipoEstado)
+def registrar_eliminacion(sender, instance, **kwargs):
+    registrar_eliminados(sender, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Ruta.buses.through)
+def registrar_buses_ruta(sender, instance, action, reverse, pk_set, **kwargs):
+    """La ruta serializa sus buses, así que asignarlos o quitarlos cambia la ruta."""
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        registrar_cambios(Ruta, [instance.pk])
+    elif pk_set:
+        registrar_cambios(Ruta, pk_set)
+    elif action == "post_clear":
+        # `bus.rutas.clear()` no informa qué rutas perdieron el bus
+        registrar_cambios(Ruta, getattr(instance, "_rutas_antes_de_limpiar", []))
+
+
+@receiver(m2m_changed, sender=Ruta.buses.through)
+def recordar_rutas_bus(sender, instance, action, reverse, **kwargs):
+    if action == "pre_clear" and reverse:
+        instance._rutas_antes_de_limpiar = list(instance.rutas.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=Bus)
+def registrar_rutas_bus_eliminado(sender, instance, **kwargs):
+    # El borrado en cascada de la tabla intermedia no emite m2m_changed
+    registrar_cambios(Ruta, instance.rutas.values_list("id", flat=True))
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from paradas.models import Parada
+from rutas.models import Bus, Ruta
+
+from .models import RegistroCambio
+from .registro import registrar_cambios
+
+User = get_user_model()
+
+# Caché en memoria para las pruebas: `cache.clear()` no debe tocar la caché en disco
+CACHES_PRUEBA = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas"},
+    "versiones": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "pruebas-versiones"},
+}
+
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class SincronizacionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(User.objects.create_user(username="ana", password="x"))
+
+    def sincronizar(self, desde=0, **params):
+        respuesta = self.client.get("/api/sync/", {"since": desde, **params})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def test_cambios_y_eliminaciones_desde_version(self):
+        ruta = Ruta.objects.create(nombre_ruta="Ruta 1")
+        bus = Bus.objects.create(placa="ABC123", marca="M", modelo="X", estado_bus="activo")
+        parada = Parada.objects.create(
+            nombre="P1", direccion="-", coordenada_lat=11, coordenada_lng=-72, ruta=ruta, orden=1
+        )
+        inicial = self.sincronizar()
+        self.assertEqual([r["id"] for r in inicial["cambios"]["rutas"]], [ruta.id])
+        self.assertEqual([p["id"] for p in inicial["cambios"]["paradas"]], [parada.id])
+
+        # Un cliente al día recibe una respuesta vacía con una sola consulta
+        with self.assertNumQueries(1):
+            vacia = self.sincronizar(inicial["version"])
+        self.assertEqual(vacia["version"], inicial["version"])
+        self.assertFalse(any(vacia["cambios"].values()) or any(vacia["eliminados"].values()))
+
+        ruta.buses.add(bus)
+        parada_id, bus_id = parada.id, bus.id
+        parada.delete()
+        delta = self.sincronizar(inicial["version"])
+        self.assertEqual(delta["cambios"]["rutas"][0]["buses"], [bus_id])
+        self.assertEqual(delta["eliminados"]["paradas"], [parada_id])
+        self.assertEqual(delta["cambios"]["paradas"], [])
+
+        bus.delete()
+        ultimo = self.sincronizar(delta["version"])
+        self.assertEqual(ultimo["eliminados"]["buses"], [bus_id])
+        self.assertEqual(ultimo["cambios"]["rutas"][0]["buses"], [])
+
+    def test_paginacion_por_limite(self):
+        for i in range(3):
+            Ruta.objects.create(nombre_ruta=f"Ruta {i}")
+        primera = self.sincronizar(limite=2)
+        self.assertTrue(primera["hay_mas"])
+        segunda = self.sincronizar(primera["version"], limite=2)
+        self.assertFalse(segunda["hay_mas"])
+        self.assertEqual(len(primera["cambios"]["rutas"]) + len(segunda["cambios"]["rutas"]), 3)
+
+    def test_parametros_invalidos(self):
+        respuesta = self.client.get("/api/sync/", {"since": "x"})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.data["error"], "'since' y 'limite' deben ser enteros.")
+
+    def test_escritura_en_bitacora_toma_el_bloqueo_antes_del_id(self):
+        with CaptureQueriesContext(connection) as consultas:
+            registrar_cambios(Ruta, [1])
+        sql = [c["sql"] for c in consultas]
+        bloqueo = next(i for i, q in enumerate(sql) if "sincronizacion_bloqueobitacora" in q)
+        insercion = next(i for i, q in enumerate(sql) if q.startswith("INSERT") and "sincronizacion_registrocambio" in q)
+        self.assertLess(bloqueo, insercion)
+        self.assertEqual(RegistroCambio.objects.filter(modelo="rutas.ruta", objeto_id=1).count(), 1)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .views import SincronizacionView
+
+
+urlpatterns = [
+    path("", SincronizacionView.as_view(), name="sincronizacion"),
+]
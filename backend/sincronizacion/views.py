@@ -0,0 +1,76 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from paradas.models import Parada
+from paradas.serializers import ParadaSerializer
+from rutas.models import Bus, Ruta, TipoEstado
+from rutas.serializer import BusSerializer, TipoEstadoSerializer
+
+from .models import RegistroCambio
+from .registro import etiqueta
+from .serializers import RutaSincronizacionSerializer
+
+
+# clave de respuesta -> (queryset, serializador)
+COLECCIONES = {
+    "rutas": (Ruta.objects.prefetch_related("buses"), RutaSincronizacionSerializer),
+    "buses": (Bus.objects.all(), BusSerializer),
+    "paradas": (Parada.objects.select_related("ruta"), ParadaSerializer),
+    "tipos_estado": (TipoEstado.objects.all(), TipoEstadoSerializer),
+}
+
+
+class SincronizacionView(APIView):
+    """
+    GET /api/sync/?since=<version>&limite=<n>
+
+    Devuelve los objetos creados o modificados y los ids eliminados desde
+    `since`. El cliente guarda `version` y la envía en la siguiente llamada;
+    si `hay_mas` es verdadero debe repetir la consulta de inmediato.
+    """
+
+    def get(self, request):
+        try:
+            desde = int(request.query_params.get("since", 0))
+            limite = int(request.query_params.get("limite", settings.SYNC_LIMITE))
+        except ValueError:
+            return Response(
+                {"error": "'since' y 'limite' deben ser enteros."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if desde < 0 or limite < 1:
+            return Response(
+                {"error": "'since' no puede ser negativo y 'limite' debe ser mayor que 0."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limite = min(limite, settings.SYNC_LIMITE_MAXIMO)
+
+        registros = list(
+            RegistroCambio.objects.filter(id__gt=desde).order_by("id")
+            .values_list("id", "modelo", "objeto_id", "operacion")[:limite + 1]
+        )
+        hay_mas = len(registros) > limite
+        registros = registros[:limite]
+
+        guardados, eliminados = {}, {}
+        for _, modelo, objeto_id, operacion in registros:
+            destino = eliminados if operacion == RegistroCambio.OPERACION_ELIMINADO else guardados
+            destino.setdefault(modelo, []).append(objeto_id)
+
+        cambios, bajas = {}, {}
+        for clave, (queryset, serializador) in COLECCIONES.items():
+            nombre = etiqueta(queryset.model)
+            ids = guardados.get(nombre)
+            cambios[clave] = (
+                serializador(queryset.filter(id__in=ids).order_by("id"), many=True).data if ids else []
+            )
+            bajas[clave] = eliminados.get(nombre, [])
+
+        return Response({
+            "version": registros[-1][0] if registros else desde,
+            "hay_mas": hay_mas,
+            "cambios": cambios,
+            "eliminados": bajas,
+        })